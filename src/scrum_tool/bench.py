@@ -0,0 +1,266 @@
+'''
+Benchmarks of scrum_tool.
+
+    python -m scrum_tool.bench [startup] [--runs N] [--budget MS]
+
+Imports each module of STARTUP_MODULES in fresh interpreters (python -X
+importtime) and reports the median cumulative import time. Exits non-zero
+when scrum_tool.task_graph takes longer than the budget or when importing
+it loads any of LAZY_MODULES, which must only load on first use.
+
+    python -m scrum_tool.bench suite [--db FILE] [--out results.json]
+        [--baseline baseline.json] [--tolerance 0.25] [--tasks N ...]
+
+Times the core TaskGraph operations against a synthetic project (see
+scrum_tool.synthetic), generated into --db unless that file exists. Results
+are written as JSON; with --baseline every operation is compared to the
+stored median and the run fails when one is slower by more than tolerance.
+
+Timings only compare on the same machine, so baselines are not kept in the
+repository. Record one from the commit to compare against, then check a
+change against it:
+
+    git checkout main
+    python -m scrum_tool.bench suite --out baseline.json
+    git checkout my-branch
+    python -m scrum_tool.bench suite --baseline baseline.json
+
+Refresh the baseline whenever the reference commit or the machine changes.
+The default spec pins its start date, so both runs time the same project.
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+#median milliseconds allowed for "import scrum_tool.task_graph"; numpy is
+#most of it, matplotlib alone would be several times this
+IMPORT_BUDGET_MS = 250.
+STARTUP_MODULES = ('scrum_tool.migrations', 'scrum_tool.task_graph')
+LAZY_MODULES = ('matplotlib', 'pylab', 'dask', 'multiprocessing')
+RUNS = 7
+#suite: runs per operation, tasks resolved per run, sprints measured, bulk writes
+REPEAT = 5
+SAMPLE = 1000
+SPRINT_SAMPLE = 10
+BULK = 200
+#allowed slowdown against the baseline before a run fails
+TOLERANCE = 0.25
+
+def _src_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_time(module):
+    '''
+    (milliseconds, lazy modules loaded) of importing module in a fresh
+    interpreter.
+    '''
+    code = 'import sys, {0}; print(",".join(m for m in {1!r} if m in sys.modules))'.format(module, LAZY_MODULES)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([_src_dir()] + [p for p in [env.get('PYTHONPATH')] if p])
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, env=env, check=True)
+    micros = None
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            micros = int(parts[1].strip())
+    if micros is None:
+        raise ValueError("No import time reported for {}".format(module))
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    return micros/1000., loaded
+
+def startup(runs=RUNS, modules=STARTUP_MODULES):
+    '''
+    {module: (median milliseconds, lazy modules loaded)}.
+    '''
+    res = {}
+    for module in modules:
+        times = []
+        loaded = set()
+        for _ in range(runs):
+            ms, lazy = import_time(module)
+            times.append(ms)
+            loaded.update(lazy)
+        res[module] = (statistics.median(times), sorted(loaded))
+    return res
+
+def _time(func, repeat):
+    '''
+    Milliseconds of each of repeat calls of func.
+    '''
+    res = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        res.append((time.perf_counter() - t0)*1000.)
+    return res
+
+def suite(filename, repeat=REPEAT, seed=0):
+    '''
+    {operation: [milliseconds per run]} of the core TaskGraph operations on
+    the project in filename. Writes go to a scratch copy of the file.
+    '''
+    import numpy as np
+    from scrum_tool.task_graph import TaskGraph
+    rng = np.random.default_rng(seed)
+    res = {}
+    with TaskGraph(filename) as tg:
+        labels = tg.tasks
+        sprints = tg.sprints
+        sample = [labels[i] for i in rng.choice(len(labels), min(SAMPLE, len(labels)), replace=False)]
+        names = [tg.get_task_name_from_task(t) for t in sample]
+        chosen = [sprints[i] for i in rng.choice(len(sprints), min(SPRINT_SAMPLE, len(sprints)), replace=False)]
+        goals = [list(sample[i:i+5]) for i in range(0, len(sample), 5)]
+
+        res['load_task_graph'] = _time(lambda: tg._load_task_graph(), repeat)
+        tg.get_task_graph()
+        res['resolve_task_label'] = _time(lambda: [tg.resolve_task(t) for t in sample], repeat)
+        res['resolve_task_name'] = _time(lambda: [tg.resolve_task(n) for n in names], repeat)
+        res['get_order_of_execution'] = _time(lambda: [tg.get_order_of_execution(g) for g in goals], repeat)
+        res['get_board'] = _time(lambda: tg.get_board(), repeat)
+        def _metrics():
+            for s in chosen:
+                snapshot = tg.sprint_snapshot(s)
+                (snapshot.expected_hours, snapshot.hours_burned, snapshot.ideal_burn, snapshot.actual_burn,
+                        snapshot.required_burn, snapshot.daily_gain, snapshot.suggested_task)
+        res['sprint_metrics'] = _time(_metrics, repeat)
+        def _burndown():
+            for s in chosen:
+                snapshot = tg.sprint_snapshot(s)
+                if len(snapshot.daily) > 0:
+                    tg.burndown_series_for_sprint(s, snapshot)
+        res['burndown_series'] = _time(_burndown, repeat)
+        res['critical_path_for_sprint'] = _time(lambda: [tg.get_critical_path_for_sprint(s) for s in chosen], repeat)
+        res['snapshot_frame'] = _time(lambda: tg.snapshot(), repeat)
+
+    scratch = tempfile.mkdtemp()
+    try:
+        copy = os.path.join(scratch, 'bench.db')
+        shutil.copyfile(filename, copy)
+        with TaskGraph(copy, allow_same_name=True) as tg:
+            tg.get_task_graph()
+            worker = tg.workers[0]
+            today = time.strftime('%Y-%m-%d')
+            def _add_tasks():
+                for i in range(BULK):
+                    tg.add_task("bench-{}".format(i), 1., worker, deps=sample[:2])
+            res['add_task_bulk'] = _time(_add_tasks, 1)
+            day = tg.to_datetime(today)
+            def _add_hours():
+                for t in sample[:BULK]:
+                    tg.add_hours(t, day, worker, 1.)
+            res['add_hours_bulk'] = _time(_add_hours, 1)
+            #the same writes through the batch APIs, one transaction each
+            res['add_tasks_batch'] = _time(lambda: tg.add_tasks(
+                [("batch-{}".format(i), 1., worker, sample[:2]) for i in range(BULK)]), 1)
+            res['add_hours_many'] = _time(lambda: tg.add_hours_many(
+                [(t, day, worker, 1.) for t in sample[:BULK]]), 1)
+            res['update_stat_bulk'] = _time(lambda: [tg.update_task_stat(t, 'new', day) for t in sample[:BULK]], 1)
+            res['update_stats_many'] = _time(lambda: tg.update_stats_many(
+                [(t, 'inprogress', day) for t in sample[:BULK]]), 1)
+            added = [t for t in tg.tasks if tg.get_task_name_from_task(t).startswith(('bench-', 'batch-'))]
+            res['rm_task'] = _time(lambda: [tg.rm_task(t) for t in added], 1)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return res
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+    [(operation, baseline ms, ms, ratio, regressed)] of the operations in
+    both result sets, by median.
+    '''
+    rows = []
+    for name, base in sorted(baseline['results'].items()):
+        if name not in results['results']:
+            continue
+        new = results['results'][name]['median_ms']
+        ratio = new/base['median_ms'] if base['median_ms'] > 0 else float('inf')
+        rows.append((name, base['median_ms'], new, ratio, ratio > 1. + tolerance))
+    return rows
+
+def run_suite(args):
+    from scrum_tool.synthetic import ProjectSpec, generate
+    spec = ProjectSpec(*[getattr(args, field) for field in ProjectSpec._fields])
+    scratch = None
+    filename = args.db
+    if filename is None:
+        scratch = tempfile.mkdtemp()
+        filename = os.path.join(scratch, 'synthetic.db')
+    try:
+        if not os.path.exists(filename):
+            t0 = time.perf_counter()
+            generate(filename, spec)
+            print("generated {} in {:.1f} s".format(filename, time.perf_counter() - t0))
+        times = suite(filename, args.repeat, spec.seed)
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    import numpy
+    results = {'meta': {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version, 'numpy': numpy.__version__, 'machine': platform.machine(),
+                'spec': spec._asdict(), 'db': args.db},
+            'results': dict((name, {'median_ms': statistics.median(t), 'min_ms': min(t), 'runs': len(t)})
+                for name, t in times.items())}
+    for name, r in sorted(results['results'].items()):
+        print("{:28s} {:10.2f} ms  (min {:.2f}, {} runs)".format(name, r['median_ms'], r['min_ms'], r['runs']))
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['meta'].get('spec') != results['meta']['spec']:
+        print("warning: baseline was run on a different project spec")
+    failed = False
+    print("\n{:28s} {:>10s} {:>10s} {:>7s}".format('operation', 'baseline', 'now', 'ratio'))
+    for name, base, new, ratio, regressed in compare(results, baseline, args.tolerance):
+        print("{:28s} {:10.2f} {:10.2f} {:7.2f}{}".format(name, base, new, ratio, '  REGRESSION' if regressed else ''))
+        failed = failed or regressed
+    return 1 if failed else 0
+
+def run_startup(args):
+    failed = False
+    for module, (ms, loaded) in startup(args.runs).items():
+        print("{:30s} {:8.1f} ms{}".format(module, ms, '  loads ' + ', '.join(loaded) if loaded else ''))
+        if module == 'scrum_tool.task_graph':
+            if ms > args.budget:
+                print("FAIL: import exceeds budget of {:.0f} ms".format(args.budget))
+                failed = True
+            if loaded:
+                print("FAIL: {} must be imported lazily".format(', '.join(loaded)))
+                failed = True
+    return 1 if failed else 0
+
+def main(argv=None):
+    from scrum_tool.synthetic import DEFAULT_SPEC, ProjectSpec
+    parser = argparse.ArgumentParser(description='Benchmarks of scrum_tool')
+    commands = parser.add_subparsers(dest='command')
+    startup_parser = commands.add_parser('startup', help='import time budget (default)')
+    suite_parser = commands.add_parser('suite', help='TaskGraph operations on a synthetic project')
+    for p in (parser, startup_parser):
+        p.add_argument('--runs', type=int, default=RUNS)
+        p.add_argument('--budget', type=float, default=IMPORT_BUDGET_MS, help='milliseconds for scrum_tool.task_graph')
+    suite_parser.add_argument('--db', default=None, help='project file, generated if missing')
+    suite_parser.add_argument('--out', default=None, help='write results as JSON')
+    suite_parser.add_argument('--baseline', default=None, help='JSON results to compare with')
+    suite_parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown, 0.25 is 25%%')
+    suite_parser.add_argument('--repeat', type=int, default=REPEAT)
+    for field in ProjectSpec._fields:
+        default = getattr(DEFAULT_SPEC, field)
+        suite_parser.add_argument('--' + field.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args(argv)
+    if args.command == 'suite':
+        return run_suite(args)
+    return run_startup(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+'''
+Date storage of TaskGraph files.
+
+Day resolution dates (hour entries, sprint bounds) are stored as integer
+days since 1970-01-01 and instants (task stat changes) as integer seconds
+since 1970-01-01 00:00, both of naive local time. These are exactly the
+integer views of numpy datetime64[D] and datetime64[s], so bulk reads
+convert without parsing.
+'''
+import numpy as np
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970,1,1)
+#int64 view of NaT
+NAT = np.iinfo(np.int64).min
+
+def day_text(column):
+    '''
+    SQL expression of a day column as YYYY-MM-DD text.
+    '''
+    return "date({}*86400, 'unixepoch')".format(column)
+
+def _datetime(date):
+    if isinstance(date, datetime):
+        return date
+    return datetime(date.year, date.month, date.day)
+
+def to_day(date):
+    if date is None:
+        return None
+    return (_datetime(date) - EPOCH).days
+
+def from_day(day):
+    if day is None:
+        return None
+    return EPOCH + timedelta(days=day)
+
+def to_epoch(date):
+    if date is None:
+        return None
+    delta = _datetime(date) - EPOCH
+    return delta.days*86400 + delta.seconds
+
+def from_epoch(seconds):
+    if seconds is None:
+        return None
+    return EPOCH + timedelta(seconds=seconds)
+
+def to_datetime64(values, unit='D'):
+    '''
+    Integer days (unit 'D') or seconds (unit 's') to a datetime64 array,
+    None becoming NaT.
+    '''
+    return np.array([NAT if v is None else v for v in values], dtype=np.int64).view('M8[{}]'.format(unit))
+
+def to_datetime(datetime_str):
+    '''
+    Parse the legacy text dates.
+    '''
+    if datetime_str is None:
+        return None
+    try:
+        return datetime.strptime(datetime_str,'%Y-%m-%d %H:%M:%S.%f')
+    except:
+        try:
+            return datetime.strptime(datetime_str,'%Y-%m-%d')
+        except:
+            return datetime.strptime(datetime_str,'%Y-%m-%d %H:%M:%S')
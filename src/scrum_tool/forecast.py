@@ -0,0 +1,196 @@
+'''
+Monte Carlo forecast of sprint completion.
+
+Every simulated outcome draws, for each unfinished task, a total effort of
+length times a ratio of logged hours to length observed on finished tasks,
+and a sequence of daily burns observed in the hours table. The sprint is done
+on the day the cumulative burn covers the effort still to be logged. Outcomes
+are simulated in batches of whole NumPy arrays, portfolio runs fan out over a
+process pool.
+'''
+import numpy as np
+from collections import namedtuple
+from datetime import datetime, timedelta
+from scrum_tool.dates import to_day
+
+N_SIMS = 20000
+#seed of the forecasts TaskGraph caches, the same data gives the same dates
+SEED = 0
+BATCH_SIZE = 4096
+#give up on outcomes that need more days than this
+MAX_DAYS = 3650
+#days of burn drawn per outcome at a time
+MAX_STEP = 365
+#fewer finished tasks than this and durations are taken at face value
+MIN_RATIOS = 3
+#elapsed sprint days needed before the sprint's own burn is trusted
+MIN_DAYS = 5
+
+Forecast = namedtuple('Forecast', ['p50', 'p85', 'p95', 'on_time', 'remaining', 'n_sims'])
+
+def simulate_completion(lengths, logged, ratios, daily, n_sims=N_SIMS, seed=None, batch_size=BATCH_SIZE):
+    '''
+    Days from today until the work is done, one float per simulated outcome,
+    0 meaning today and inf beyond MAX_DAYS.
+
+    lengths, logged: expected and already logged hours of unfinished tasks.
+    ratios: samples of logged hours / length from finished tasks.
+    daily: samples of hours burned per calendar day.
+    '''
+    rng = np.random.default_rng(seed)
+    lengths = np.asarray(lengths, dtype=float)
+    logged = np.asarray(logged, dtype=float)
+    ratios = np.asarray(ratios, dtype=float)
+    daily = np.asarray(daily, dtype=float)
+    days = np.empty(n_sims)
+    mean_burn = daily.mean()
+    for lo in range(0, n_sims, batch_size):
+        b = min(batch_size, n_sims - lo)
+        work = lengths * ratios[rng.integers(len(ratios), size=(b, len(lengths)))] - logged
+        work = np.clip(work, 0., None).sum(axis=1)
+        out = np.where(work > 0., np.inf, 0.)
+        todo = np.nonzero(work > 0.)[0]
+        burned = np.zeros(len(todo))
+        offset = 0
+        horizon = int(np.ceil(work.max() / mean_burn * 1.5)) + 1 if len(todo) > 0 else 0
+        while len(todo) > 0 and offset < MAX_DAYS:
+            horizon = min(horizon, MAX_STEP, MAX_DAYS - offset)
+            cum = burned[:, None] + np.cumsum(daily[rng.integers(len(daily), size=(len(todo), horizon))], axis=1)
+            done = cum >= work[todo, None]
+            finished = done[:, -1]
+            out[todo[finished]] = offset + done[finished].argmax(axis=1)
+            burned = cum[~finished, -1]
+            todo = todo[~finished]
+            offset += horizon
+        days[lo:lo + b] = out
+    return days
+
+def _day(date):
+    return datetime(date.year, date.month, date.day)
+
+def _daily_totals(rows, first, last):
+    '''
+    Hours per calendar day from first to last (inclusive, day numbers) given
+    (day, hours) rows, days without entries count as zero.
+    '''
+    n = last - first + 1
+    if len(rows) == 0 or n <= 0:
+        return np.zeros(0)
+    idx = np.array([r[0] for r in rows], dtype=np.int64) - first
+    keep = (idx >= 0) & (idx < n)
+    return np.bincount(idx[keep], weights=np.array([r[1] for r in rows], dtype=float)[keep], minlength=n)
+
+def get_duration_ratios(tg):
+    '''
+    Logged hours over expected length of every finished task with both.
+    '''
+    c = tg.cursor()
+    c.execute("SELECT sum(h.hours)/t.length FROM tasks t JOIN hours_daily h ON h.task_id=t.task_id \
+            WHERE t.stat='finished' AND t.length > 0 GROUP BY t.task_id HAVING sum(h.hours) > 0")
+    ratios = np.array([r[0] for r in c.fetchall()], dtype=float)
+    c.close()
+    return ratios
+
+def get_daily_burn(tg, task_ids=None, start=None, end=None):
+    '''
+    Hours burned per calendar day on the given tasks (all when None) between
+    start and end, defaulting to the first and last day with entries.
+    '''
+    query = 'SELECT date, sum(hours) FROM hours_daily'
+    cond = []
+    args = []
+    if start is not None:
+        cond.append('date >= ?')
+        args.append(to_day(start))
+    if end is not None:
+        cond.append('date <= ?')
+        args.append(to_day(end))
+    if task_ids is None:
+        c = tg.cursor()
+        c.execute(query + ''.join((' WHERE ' if i == 0 else ' AND ') + s for i, s in enumerate(cond))
+                + ' GROUP BY date', args)
+        rows = c.fetchall()
+        c.close()
+    else:
+        #one row per day and chunk of ids, _daily_totals adds them up
+        rows = tg._select_by_ids(query, 'task_id', task_ids,
+                ''.join(' AND ' + s for s in cond) + ' GROUP BY date', args)
+    rows = sorted(r for r in rows if r[0] is not None)
+    if len(rows) == 0:
+        return np.zeros(0)
+    return _daily_totals(rows, to_day(start) if start is not None else rows[0][0],
+            to_day(end) if end is not None else rows[-1][0])
+
+def forecast_sprint(tg, sprint, n_sims=N_SIMS, seed=None, today=None):
+    '''
+    Completion date percentiles of the sprint as a Forecast, or None when
+    there is no burn history to sample from. on_time is the fraction of
+    outcomes done by the end date.
+    '''
+    today = _day(datetime.today() if today is None else today)
+    sprint = tg.resolve_sprint(sprint)
+    dag = tg.get_task_graph()
+    task_ids = tg._get_sprint_task_ids(sprint, dag)
+    todo = [t for t in task_ids if dag.stats[t] != 'finished']
+    lengths = np.nan_to_num(tg.get_task_lengths(todo))
+    logged = tg.get_hours_for_tasks(todo)
+
+    ratios = get_duration_ratios(tg)
+    if len(ratios) < MIN_RATIOS:
+        ratios = np.ones(1)
+
+    start, end = tg.get_dates_from_sprint(sprint)
+    daily = np.zeros(0)
+    if (today - _day(start)).days >= MIN_DAYS and len(task_ids) > 0:
+        daily = get_daily_burn(tg, task_ids, start, min(today, _day(end)))
+    if daily.sum() <= 0.:
+        daily = get_daily_burn(tg)
+    if daily.sum() <= 0.:
+        return None
+
+    days = simulate_completion(lengths, logged, ratios, daily, n_sims=n_sims, seed=seed)
+    def _date(q):
+        d = np.percentile(days, q, method='higher')
+        return today + timedelta(days=int(d)) if np.isfinite(d) else None
+    return Forecast(_date(50), _date(85), _date(95),
+            float(np.mean(days <= (_day(end) - today).days)),
+            float(np.clip(lengths*np.median(ratios) - logged, 0., None).sum()), n_sims)
+
+def _forecast_in_process(filename, sprint, n_sims, seed, today):
+    from scrum_tool.task_graph import TaskGraph
+    with TaskGraph(filename) as tg:
+        return forecast_sprint(tg, sprint, n_sims=n_sims, seed=seed, today=today)
+
+def forecast_portfolio(filename, sprints=None, n_sims=N_SIMS, seed=None, max_workers=None, today=None):
+    '''
+    Forecast several sprints of the file in parallel, one process per sprint.
+    Returns {sprint: Forecast}, all sprints when sprints is None.
+    '''
+    if sprints is None:
+        from scrum_tool.task_graph import TaskGraph
+        with TaskGraph(filename) as tg:
+            sprints = tg.sprints
+    from concurrent.futures import ProcessPoolExecutor
+    seeds = np.random.SeedSequence(seed).spawn(len(sprints))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_forecast_in_process, filename, s, n_sims, ss, today)
+                for s, ss in zip(sprints, seeds)]
+        return dict(zip(sprints, [f.result() for f in futures]))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Monte Carlo forecast of sprint completion dates.')
+    parser.add_argument('filename')
+    parser.add_argument('sprints', nargs='*', help='sprint labels, all sprints when omitted')
+    parser.add_argument('--n-sims', type=int, default=N_SIMS)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    res = forecast_portfolio(args.filename, args.sprints if len(args.sprints) > 0 else None,
+            n_sims=args.n_sims, seed=args.seed, max_workers=args.workers)
+    for sprint, f in res.items():
+        if f is None:
+            print("{}: no hours logged to forecast from".format(sprint))
+        else:
+            print("{}: P50 {} P85 {} P95 {} ({:.0%} on time)".format(sprint,
+                *['{:%Y-%m-%d}'.format(d) if d is not None else 'never' for d in f[:3]], f.on_time))
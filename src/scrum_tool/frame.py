@@ -0,0 +1,134 @@
+'''
+Columnar in-memory copy of a whole project, see TaskGraph.snapshot().
+
+Every table becomes a NumPy structured array sorted by id, with dates as
+datetime64 views of the stored integers. Dependencies are CSR arrays over
+task rows: the deps of tasks[i] are
+tasks[dep_indices[dep_indptr[i]:dep_indptr[i+1]]]. Metrics over a
+ProjectFrame live in scrum_tool.metrics.
+'''
+import numpy as np
+from collections import namedtuple
+from datetime import datetime
+from scrum_tool.graph import _out_edges
+from scrum_tool.dates import to_datetime64
+
+TASK_DTYPE = np.dtype([('id', 'i8'), ('name', 'O'), ('stat', 'U10'), ('length', 'f8'),
+    ('backlog_date', 'M8[s]'), ('new_date', 'M8[s]'), ('inprogress_date', 'M8[s]'),
+    ('finished_date', 'M8[s]')])
+WORKER_DTYPE = np.dtype([('id', 'i8'), ('name', 'O')])
+SPRINT_DTYPE = np.dtype([('id', 'i8'), ('name', 'O'), ('start', 'M8[D]'), ('end', 'M8[D]')])
+ASSIGNMENT_DTYPE = np.dtype([('task', 'i8'), ('worker', 'i8')])
+SPRINT_TASK_DTYPE = np.dtype([('sprint', 'i8'), ('task', 'i8')])
+HOUR_DTYPE = np.dtype([('id', 'i8'), ('task', 'i8'), ('date', 'M8[D]'), ('worker', 'i8'), ('hours', 'f8')])
+
+def _structured(rows, dtype):
+    '''
+    Structured array from row tuples, None becoming NaT/nan where the
+    column allows it.
+    '''
+    res = np.empty(len(rows), dtype=dtype)
+    if len(rows) == 0:
+        return res
+    columns = list(zip(*rows))
+    for name, column in zip(dtype.names, columns):
+        kind = dtype[name].kind
+        if kind == 'M':
+            res[name] = to_datetime64(column, np.datetime_data(dtype[name])[0])
+        elif kind == 'f':
+            res[name] = np.array([np.nan if v is None else v for v in column], dtype=float)
+        elif kind == 'U':
+            res[name] = ['' if v is None else v for v in column]
+        else:
+            res[name] = column
+    return res
+
+class ProjectFrame(namedtuple('ProjectFrame', ['tasks', 'dep_indptr', 'dep_indices', 'workers',
+        'assignments', 'sprints', 'sprint_tasks', 'hours', 'loaded'])):
+    '''
+    assignments, sprint_tasks and hours refer to tasks, workers and sprints
+    by id. sprint_tasks holds the goal tasks of each sprint, in the order
+    they were added. loaded is when the frame was read.
+    '''
+    __slots__ = ()
+
+    def task_rows(self, task_ids):
+        '''
+        Rows of tasks for the given ids, -1 for unknown ids.
+        '''
+        ids = self.tasks['id']
+        task_ids = np.asarray(task_ids, dtype=np.int64)
+        rows = np.searchsorted(ids, task_ids)
+        found = rows < len(ids)
+        found[found] = ids[rows[found]] == task_ids[found]
+        return np.where(found, rows, -1)
+
+    def ancestors(self, rows):
+        '''
+        Boolean mask over tasks of rows and everything they depend on.
+        '''
+        mask = np.zeros(len(self.tasks), dtype=bool)
+        frontier = np.unique(np.asarray(rows, dtype=np.int64))
+        frontier = frontier[frontier >= 0]
+        while len(frontier) > 0:
+            mask[frontier] = True
+            nxt = self.dep_indices[_out_edges(self.dep_indptr, frontier)]
+            frontier = np.unique(nxt[~mask[nxt]])
+        return mask
+
+    def sprint_goals(self, sprint_id):
+        return self.task_rows(self.sprint_tasks['task'][self.sprint_tasks['sprint'] == sprint_id])
+
+    def sprint_mask(self, sprint_id):
+        '''
+        Boolean mask over tasks of the sprint's goals and their dependencies.
+        '''
+        return self.ancestors(self.sprint_goals(sprint_id))
+
+    def sprint(self, sprint_id):
+        rows = np.nonzero(self.sprints['id'] == sprint_id)[0]
+        if len(rows) == 0:
+            raise ValueError("Invalid sprint {}".format(sprint_id))
+        return self.sprints[rows[0]]
+
+def load_frame(db, cursor=None):
+    '''
+    Read the file behind connection db into a ProjectFrame inside a single
+    read transaction, one query per table. cursor, when given, returns the
+    cursors to use on db (TaskGraph.cursor, so a profiler sees the queries).
+    '''
+    began = not db.in_transaction
+    c = db.cursor() if cursor is None else cursor()
+    if began:
+        c.execute('BEGIN')
+    try:
+        loaded = np.datetime64(datetime.now(), 's')
+        c.execute('SELECT task_id, name, stat, length, backlog_date, new_date, inprogress_date, finished_date \
+                FROM tasks ORDER BY task_id')
+        tasks = _structured(c.fetchall(), TASK_DTYPE)
+        c.execute('SELECT task_id, dep_id FROM task_deps ORDER BY task_id, rowid')
+        deps = c.fetchall()
+        c.execute('SELECT worker_id, name FROM workers ORDER BY worker_id')
+        workers = _structured(c.fetchall(), WORKER_DTYPE)
+        c.execute('SELECT task_id, worker_id FROM task_workers ORDER BY task_id, rowid')
+        assignments = _structured(c.fetchall(), ASSIGNMENT_DTYPE)
+        c.execute('SELECT sprint_id, name, start_date, end_date FROM sprints ORDER BY sprint_id')
+        sprints = _structured(c.fetchall(), SPRINT_DTYPE)
+        c.execute('SELECT sprint_id, task_id FROM sprint_tasks ORDER BY sprint_id, rowid')
+        sprint_tasks = _structured(c.fetchall(), SPRINT_TASK_DTYPE)
+        c.execute('SELECT entry_id, task_id, date, worker_id, hours FROM hours ORDER BY entry_id')
+        hours = _structured(c.fetchall(), HOUR_DTYPE)
+    finally:
+        if began:
+            c.execute('COMMIT')
+        c.close()
+
+    frame = ProjectFrame(tasks, None, None, workers, assignments, sprints, sprint_tasks, hours, loaded)
+    deps = np.array(deps, dtype=np.int64).reshape(-1, 2)
+    src = frame.task_rows(deps[:, 0])
+    dst = frame.task_rows(deps[:, 1])
+    keep = (src >= 0) & (dst >= 0)
+    src, dst = src[keep], dst[keep]
+    indptr = np.zeros(len(tasks) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(tasks)), out=indptr[1:])
+    return frame._replace(dep_indptr=indptr, dep_indices=dst)
@@ -0,0 +1,539 @@
+'''
+In-memory dependency graph of tasks.
+
+Nodes are task ids. An edge dep -> task means dep has to be finished before
+task can start, so a valid order of execution lists every dep before the
+tasks depending on it.
+'''
+import heapq
+from collections import namedtuple
+import numpy as np
+
+#task_ids in topological order, the arrays are aligned with them, chain is
+#the zero slack tasks by earliest start and length the duration of the path
+CriticalPath = namedtuple('CriticalPath', ['task_ids', 'duration', 'earliest_start',
+    'latest_start', 'slack', 'chain', 'length'])
+
+def _out_edges(indptr, nodes):
+    '''
+    Positions of all edges leaving nodes in a CSR edge list.
+    '''
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(total) + offsets
+
+class CycleError(ValueError):
+    def __init__(self, path):
+        self.path = list(path)
+        super(CycleError, self).__init__("Dependency cycle {}".format(" -> ".join(str(p) for p in self.path)))
+
+class ReachabilityIndex(object):
+    '''
+    Transitive closure of a TaskDAG as one bitset row per node, bit j of row
+    i is set when node i (transitively) depends on node j. Rows are numpy
+    uint64 words so unions and column tests are vectorized.
+    '''
+    def __init__(self, dag, max_bytes):
+        self.dag = dag
+        self.max_bytes = max_bytes
+        self.index = {}
+        self.ids = []
+        self.free = []
+        self.bits = np.zeros((0,0), dtype=np.uint64)
+        self._grow(max(64, len(dag)))
+        for t in sorted(dag.deps, key=dag.rank.__getitem__):
+            i = self._allocate(t)
+            self.bits[i] = self._row(t)
+
+    @staticmethod
+    def _bit(i):
+        return i >> 6, np.uint64(1) << np.uint64(i & 63)
+
+    def _grow(self, capacity):
+        words = (capacity + 63) // 64
+        if capacity * words * 8 > self.max_bytes:
+            raise MemoryError("reachability index over {} bytes".format(self.max_bytes))
+        bits = np.zeros((capacity, words), dtype=np.uint64)
+        bits[:self.bits.shape[0], :self.bits.shape[1]] = self.bits
+        self.bits = bits
+
+    def _allocate(self, task_id):
+        if self.free:
+            i = self.free.pop()
+            self.ids[i] = task_id
+        else:
+            i = len(self.ids)
+            if i == self.bits.shape[0]:
+                self._grow(2 * i)
+            self.ids.append(task_id)
+        self.index[task_id] = i
+        return i
+
+    def _row(self, task_id):
+        row = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for d in self.dag.deps[task_id]:
+            j = self.index[d]
+            row |= self.bits[j]
+            w, m = self._bit(j)
+            row[w] |= m
+        return row
+
+    def _decode(self, row):
+        idx = np.flatnonzero(np.unpackbits(row.astype('<u8').view(np.uint8), bitorder='little'))
+        return set(self.ids[i] for i in idx)
+
+    def _descendant_mask(self, task_id):
+        w, m = self._bit(self.index[task_id])
+        return (self.bits[:, w] & m) != 0
+
+    def add_node(self, task_id):
+        i = self._allocate(task_id)
+        self.bits[i] = 0
+
+    def remove_node(self, task_id):
+        #edges are removed first so no row refers to it anymore
+        i = self.index.pop(task_id)
+        self.bits[i] = 0
+        self.ids[i] = None
+        self.free.append(i)
+
+    def insert_edge(self, task_id, dep_id):
+        rows = self._descendant_mask(task_id)
+        rows[self.index[task_id]] = True
+        j = self.index[dep_id]
+        row = self.bits[j].copy()
+        w, m = self._bit(j)
+        row[w] |= m
+        self.bits[rows] |= row
+
+    def remove_edge(self, task_id, dep_id):
+        #closure can shrink, recompute the affected rows in topological order
+        rank = self.dag.rank
+        affected = self.descendants([task_id])
+        affected.add(task_id)
+        for t in sorted(affected, key=rank.__getitem__):
+            self.bits[self.index[t]] = self._row(t)
+
+    def ancestors(self, task_ids):
+        row = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for t in task_ids:
+            row |= self.bits[self.index[t]]
+        return self._decode(row)
+
+    def descendants(self, task_ids):
+        mask = np.zeros(self.bits.shape[0], dtype=bool)
+        for t in task_ids:
+            mask |= self._descendant_mask(t)
+        return set(self.ids[i] for i in np.flatnonzero(mask))
+
+    def is_reachable(self, a, b):
+        w, m = self._bit(self.index[a])
+        return bool(self.bits[self.index[b], w] & m)
+
+class TaskDAG(object):
+    '''
+    Besides the adjacency lists the graph keeps a topological index, rank,
+    such that rank[dep] < rank[task] for every edge. It is built once with
+    Kahn's algorithm and then maintained incrementally on edge insertion
+    with the Pearce-Kelly algorithm, which only reorders the nodes between
+    the two endpoints. Removing edges or nodes never invalidates it.
+
+    Ancestor/descendant queries are answered from a ReachabilityIndex,
+    built on first use and maintained on edits. When it would need more
+    than max_reach_bytes the queries fall back to graph traversal.
+    '''
+    max_reach_bytes = 64 << 20
+
+    def __init__(self, task_ids=(), edges=()):
+        '''
+        task_ids: iterable of node ids
+        edges: iterable of (task_id, dep_id), edges to unknown nodes are dropped
+        '''
+        self.deps = {}
+        self.dependents = {}
+        #optional node attributes, filled by TaskGraph.get_task_graph
+        self.labels = {}
+        self.stats = {}
+        self.lengths = {}
+        self.rank = None
+        self._next_rank = 0
+        self.reach = None
+        self._reach_too_large = False
+        #set when the graph holds a cycle, cleared when edges are removed
+        self._cyclic = False
+        for task_id in task_ids:
+            self.add_node(task_id)
+        for task_id, dep_id in edges:
+            self.add_edge(task_id, dep_id)
+
+    def __len__(self):
+        return len(self.deps)
+
+    def __contains__(self, task_id):
+        return task_id in self.deps
+
+    def add_node(self, task_id):
+        if task_id not in self.deps:
+            self.deps[task_id] = []
+            self.dependents[task_id] = []
+            if self.rank is not None:
+                self.rank[task_id] = self._next_rank
+                self._next_rank += 1
+            if self.reach is not None:
+                try:
+                    self.reach.add_node(task_id)
+                except MemoryError:
+                    self.reach = None
+                    self._reach_too_large = True
+
+    def remove_node(self, task_id):
+        if task_id not in self.deps:
+            return
+        for d in list(self.deps[task_id]):
+            self.remove_edge(task_id, d)
+        for t in list(self.dependents[task_id]):
+            self.remove_edge(t, task_id)
+        del self.deps[task_id]
+        del self.dependents[task_id]
+        for attr in (self.labels, self.stats, self.lengths):
+            attr.pop(task_id, None)
+        if self.rank is not None:
+            del self.rank[task_id]
+        if self.reach is not None:
+            self.reach.remove_node(task_id)
+
+    def add_edge(self, task_id, dep_id):
+        '''
+        Add an edge without any check, used when loading a graph.
+        '''
+        if task_id in self.deps and dep_id in self.deps and task_id != dep_id:
+            self.deps[task_id].append(dep_id)
+            self.dependents[dep_id].append(task_id)
+            if self.rank is not None and self.rank[dep_id] > self.rank[task_id]:
+                self.rank = None
+                self.reach = None
+            if self.reach is not None:
+                self.reach.insert_edge(task_id, dep_id)
+
+    def remove_edge(self, task_id, dep_id):
+        if dep_id in self.deps.get(task_id, ()):
+            self.deps[task_id].remove(dep_id)
+            self.dependents[dep_id].remove(task_id)
+            self._cyclic = False
+            if self.reach is not None:
+                self.reach.remove_edge(task_id, dep_id)
+
+    def insert_edge(self, task_id, dep_id):
+        '''
+        Add the edge dep_id -> task_id keeping the topological index,
+        raises CycleError (leaving the graph unchanged) if the edge closes a
+        cycle.
+        '''
+        if task_id == dep_id:
+            raise CycleError([task_id, task_id])
+        if dep_id in self.deps[task_id]:
+            return
+        if not self._build_rank():
+            path = self._path(dep_id, task_id)
+            if path is not None:
+                raise CycleError([task_id] + path)
+            self.add_edge(task_id, dep_id)
+            return
+        rank = self.rank
+        lb = rank[task_id]
+        ub = rank[dep_id]
+        if ub < lb:
+            self.add_edge(task_id, dep_id)
+            return
+        #everything depending on task_id that is ranked before dep_id
+        parent = {task_id:None}
+        forward = [task_id]
+        stack = [task_id]
+        while stack:
+            n = stack.pop()
+            for m in self.dependents[n]:
+                if m == dep_id:
+                    path = [task_id, dep_id]
+                    while n is not None:
+                        path.append(n)
+                        n = parent[n]
+                    raise CycleError(path)
+                if m not in parent and rank[m] < ub:
+                    parent[m] = n
+                    forward.append(m)
+                    stack.append(m)
+        #everything dep_id depends on that is ranked after task_id
+        seen = set([dep_id])
+        backward = [dep_id]
+        stack = [dep_id]
+        while stack:
+            n = stack.pop()
+            for m in self.deps[n]:
+                if m not in seen and rank[m] > lb:
+                    seen.add(m)
+                    backward.append(m)
+                    stack.append(m)
+        backward.sort(key=rank.__getitem__)
+        forward.sort(key=rank.__getitem__)
+        moved = backward + forward
+        for n, r in zip(moved, sorted(rank[n] for n in moved)):
+            rank[n] = r
+        self.add_edge(task_id, dep_id)
+
+    def set_deps(self, task_id, dep_ids):
+        '''
+        Replace the dependencies of task_id, all or nothing: a dep closing a
+        cycle raises CycleError before the edges or the order are touched.
+        '''
+        dep_ids = [d for d in dep_ids if d in self.deps]
+        for d in dep_ids:
+            #a path from d back to task_id never uses task_id's own deps
+            if d == task_id or self.is_reachable(task_id, d):
+                raise CycleError([task_id] + self._path(d, task_id))
+        for d in list(self.deps[task_id]):
+            self.remove_edge(task_id, d)
+        for d in dep_ids:
+            self.insert_edge(task_id, d)
+
+    def _build_rank(self):
+        '''
+        Make sure the topological index exists, False if the graph has a cycle.
+        '''
+        if self.rank is not None:
+            return True
+        if self._cyclic:
+            return False
+        indegree = {}
+        ready = []
+        for n in self.deps:
+            indegree[n] = len(self.deps[n])
+            if indegree[n] == 0:
+                ready.append(n)
+        heapq.heapify(ready)
+        rank = {}
+        while ready:
+            n = heapq.heappop(ready)
+            rank[n] = len(rank)
+            for m in self.dependents[n]:
+                indegree[m] -= 1
+                if indegree[m] == 0:
+                    heapq.heappush(ready, m)
+        if len(rank) != len(self.deps):
+            self._cyclic = True
+            return False
+        self.rank = rank
+        self._next_rank = len(rank)
+        return True
+
+    def _path(self, src, dst):
+        '''
+        A dependency path src -> ... -> dst (following deps), or None.
+        '''
+        parent = {src:None}
+        stack = [src]
+        while stack:
+            n = stack.pop()
+            if n == dst:
+                path = []
+                while n is not None:
+                    path.append(n)
+                    n = parent[n]
+                return path[::-1]
+            for m in self.deps[n]:
+                if m not in parent:
+                    parent[m] = n
+                    stack.append(m)
+        return None
+
+    def _build_reach(self):
+        '''
+        The reachability index, or None for cyclic or too large graphs.
+        '''
+        if self.reach is None and not self._reach_too_large and self._build_rank():
+            try:
+                self.reach = ReachabilityIndex(self, self.max_reach_bytes)
+            except MemoryError:
+                self._reach_too_large = True
+        return self.reach
+
+    def is_reachable(self, a, b):
+        '''
+        True if b (transitively) depends on a.
+        '''
+        reach = self._build_reach()
+        if reach is not None:
+            return reach.is_reachable(a, b)
+        return a != b and self._path(b, a) is not None
+
+    def descendants(self, task_ids, include_self=True):
+        '''
+        All tasks that (transitively) depend on task_ids.
+        '''
+        task_ids = list(task_ids)
+        reach = self._build_reach()
+        if reach is not None:
+            seen = reach.descendants(task_ids)
+            if include_self:
+                seen.update(task_ids)
+            return seen
+        seen = set()
+        stack = list(task_ids)
+        if include_self:
+            seen.update(stack)
+        while stack:
+            for d in self.dependents[stack.pop()]:
+                if d not in seen:
+                    seen.add(d)
+                    stack.append(d)
+        return seen
+
+    def ancestors(self, task_ids, include_self=True):
+        '''
+        All tasks that task_ids (transitively) depend on.
+        '''
+        task_ids = list(task_ids)
+        reach = self._build_reach()
+        if reach is not None:
+            seen = reach.ancestors(task_ids)
+            if include_self:
+                seen.update(task_ids)
+            return seen
+        seen = set()
+        stack = list(task_ids)
+        if include_self:
+            seen.update(stack)
+        while stack:
+            for d in self.deps[stack.pop()]:
+                if d not in seen:
+                    seen.add(d)
+                    stack.append(d)
+        return seen
+
+    def find_cycle(self, task_ids=None):
+        '''
+        Return one cycle as a list of ids [a, b, ..., a], or None.
+        '''
+        if task_ids is None:
+            task_ids = self.deps.keys()
+        state = {}
+        for root in sorted(task_ids):
+            if root in state:
+                continue
+            path = [root]
+            state[root] = 1
+            iters = [iter(self.deps[root])]
+            while iters:
+                for d in iters[-1]:
+                    if state.get(d) == 1:
+                        return path[path.index(d):] + [d]
+                    if d not in state:
+                        state[d] = 1
+                        path.append(d)
+                        iters.append(iter(self.deps[d]))
+                        break
+                else:
+                    state[path.pop()] = 2
+                    iters.pop()
+        return None
+
+    def topological_sort(self, task_ids):
+        '''
+        task_ids sorted by the topological index, by id if the graph is cyclic.
+        '''
+        if self._build_rank():
+            return sorted(task_ids, key=self.rank.__getitem__)
+        return sorted(task_ids)
+
+    def order(self, task_ids):
+        '''
+        Order of execution of task_ids and everything they depend on.
+
+        The ancestors of task_ids sorted by the topological index. If the
+        graph holds a cycle, Kahn's algorithm restricted to the ancestors
+        (lowest id first among ready tasks) orders them or finds the cycle.
+        '''
+        nodes = self.ancestors(task_ids)
+        if self._build_rank():
+            return sorted(nodes, key=self.rank.__getitem__)
+        indegree = {}
+        ready = []
+        for n in nodes:
+            indegree[n] = len(self.deps[n])
+            if indegree[n] == 0:
+                ready.append(n)
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            n = heapq.heappop(ready)
+            order.append(n)
+            for m in self.dependents[n]:
+                if m in indegree:
+                    indegree[m] -= 1
+                    if indegree[m] == 0:
+                        heapq.heappush(ready, m)
+        if len(order) != len(nodes):
+            raise CycleError(self.find_cycle(nodes))
+        return order
+
+    def critical_path(self, task_ids, durations, tol=1e-9):
+        '''
+        Critical path method over task_ids and everything they depend on.
+
+        durations: {task_id: hours}, missing tasks take no time.
+        Earliest starts are propagated forward one topological level at a
+        time (Kahn frontiers) and latest starts backwards over the same
+        levels, each level being a single vectorized step over its edges.
+        '''
+        task_ids = list(task_ids)
+        nodes = self.topological_sort(self.ancestors(task_ids))
+        n = len(nodes)
+        pos = dict(zip(nodes, range(n)))
+        src = []
+        dst = []
+        for t in nodes:
+            i = pos[t]
+            for d in self.deps[t]:
+                src.append(pos[d])
+                dst.append(i)
+        src = np.array(src, dtype=np.int64)
+        dst = np.array(dst, dtype=np.int64)
+        perm = np.argsort(src, kind='stable')
+        src = src[perm]
+        dst = dst[perm]
+        indptr = np.searchsorted(src, np.arange(n + 1))
+        dur = np.array([durations.get(t, 0.) for t in nodes], dtype=float)
+
+        indegree = np.bincount(dst, minlength=n)
+        es = np.zeros(n)
+        levels = []
+        frontier = np.flatnonzero(indegree == 0)
+        while frontier.size > 0:
+            levels.append(frontier)
+            edges = _out_edges(indptr, frontier)
+            if edges.size == 0:
+                break
+            s_, d_ = src[edges], dst[edges]
+            np.maximum.at(es, d_, es[s_] + dur[s_])
+            np.subtract.at(indegree, d_, 1)
+            d_ = np.unique(d_)
+            frontier = d_[indegree[d_] == 0]
+        if sum(len(l) for l in levels) != n:
+            raise CycleError(self.find_cycle(nodes))
+        ef = es + dur
+        length = ef[[pos[t] for t in task_ids]].max() if len(task_ids) > 0 else 0.
+
+        lf = np.full(n, length)
+        for frontier in reversed(levels):
+            edges = _out_edges(indptr, frontier)
+            if edges.size > 0:
+                s_, d_ = src[edges], dst[edges]
+                np.minimum.at(lf, s_, lf[d_] - dur[d_])
+        ls = lf - dur
+        slack = ls - es
+        critical = np.flatnonzero(slack <= tol)
+        critical = critical[np.argsort(es[critical], kind='stable')]
+        return CriticalPath(nodes, dur, es, ls, slack, [nodes[i] for i in critical], float(length))
@@ -0,0 +1,64 @@
+'''
+In-process identity map of the rows of a table, id <-> name <-> label.
+'''
+import bisect
+
+def make_label(id, name):
+    return "{:03d}:{}".format(id, name)
+
+class IdentityMap(object):
+    '''
+    names: id -> name, ids: name -> ascending ids (names need not be
+    unique), labels: "003:name" -> id.
+    '''
+    def __init__(self, rows=()):
+        self.names = {}
+        self.ids = {}
+        self.labels = {}
+        self._sorted = None
+        for id, name in rows:
+            self.add(id, name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, label):
+        return label in self.labels
+
+    def add(self, id, name):
+        if id in self.names:
+            self.remove(id)
+        self.names[id] = name
+        self._sorted = None
+        bisect.insort(self.ids.setdefault(name, []), id)
+        self.labels[make_label(id, name)] = id
+
+    def remove(self, id):
+        if id not in self.names:
+            return
+        name = self.names.pop(id)
+        self._sorted = None
+        ids = self.ids[name]
+        ids.remove(id)
+        if len(ids) == 0:
+            del self.ids[name]
+        del self.labels[make_label(id, name)]
+
+    def get_label(self, id):
+        if id not in self.names:
+            return None
+        return make_label(id, self.names[id])
+
+    def find(self, name):
+        '''
+        (id, name) of every row called name.
+        '''
+        return [(id, name) for id in self.ids.get(name, ())]
+
+    def all_labels(self):
+        '''
+        Every label, by id.
+        '''
+        if self._sorted is None:
+            self._sorted = [make_label(id, self.names[id]) for id in sorted(self.names)]
+        return list(self._sorted)
@@ -0,0 +1,244 @@
+'''
+Opt-in instrumentation of a TaskGraph.
+
+    with tg.profile() as prof:
+        tg.get_board()
+    print(prof.report())
+
+While attached, a Profiler counts the SQL statements run through
+TaskGraph.cursor(), their rows fetched and time, and the connections
+opened. It also times every public TaskGraph method. A method's totals
+include the methods it calls; "own" figures exclude them. Statements
+slower than slow_ms are kept with their SQL text in a slow-query log.
+Profiling is meant for one thread at a time.
+'''
+import sqlite3 as sql
+import time
+from collections import deque
+
+#statements slower than this (milliseconds) go to the slow-query log
+SLOW_MS = 10.
+#most recent slow statements kept
+MAX_SLOW = 100
+#TaskGraph methods not worth timing on their own
+UNTIMED = ('profile', 'cursor')
+
+class MethodStats(object):
+    '''
+    Per method: calls, total and own (excluding nested public calls)
+    milliseconds, statements and rows.
+    '''
+    __slots__ = ('calls', 'total_ms', 'own_ms', 'statements', 'own_statements', 'rows', 'own_rows')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.
+        self.own_ms = 0.
+        self.statements = 0
+        self.own_statements = 0
+        self.rows = 0
+        self.own_rows = 0
+
+class ProfiledCursor(sql.Cursor):
+    '''
+    Cursor reporting its statements and fetched rows to profiler.
+    '''
+    profiler = None
+    _query = None
+    _elapsed = 0.
+
+    def _flush(self):
+        if self._query is not None:
+            self.profiler._statement(self._query, self._elapsed)
+            self._query = None
+
+    def _timed(self, func, *args):
+        t0 = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._elapsed += time.perf_counter() - t0
+
+    def execute(self, query, params=()):
+        self._flush()
+        self._query, self._elapsed = query, 0.
+        res = self._timed(super(ProfiledCursor, self).execute, query, params)
+        if self.description is None:
+            self._flush()
+        return res
+
+    def executemany(self, query, params):
+        self._flush()
+        self._query, self._elapsed = query, 0.
+        res = self._timed(super(ProfiledCursor, self).executemany, query, params)
+        self._flush()
+        return res
+
+    def fetchone(self):
+        row = self._timed(super(ProfiledCursor, self).fetchone)
+        if row is None:
+            self._flush()
+        else:
+            self.profiler._fetched(1)
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        rows = self._timed(super(ProfiledCursor, self).fetchmany, size)
+        self.profiler._fetched(len(rows))
+        if len(rows) < size:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super(ProfiledCursor, self).fetchall)
+        self.profiler._fetched(len(rows))
+        self._flush()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super(ProfiledCursor, self).__next__)
+        except StopIteration:
+            self._flush()
+            raise
+        self.profiler._fetched(1)
+        return row
+
+    def close(self):
+        self._flush()
+        super(ProfiledCursor, self).close()
+
+    def __del__(self):
+        try:
+            self._flush()
+        except:
+            pass
+
+class Profiler(object):
+    def __init__(self, slow_ms=SLOW_MS, max_slow=MAX_SLOW):
+        self.slow_ms = slow_ms
+        self.slow = deque(maxlen=max_slow)
+        self._tg = None
+        self._wrapped = []
+        self.reset()
+
+    def reset(self):
+        '''
+        Forget everything measured so far, keeps profiling.
+        '''
+        self.methods = {}
+        self.statements = 0
+        self.rows = 0
+        self.sql_ms = 0.
+        self.connections = 0
+        self.slow.clear()
+        self.started = time.perf_counter()
+        #active calls: [name, t0, statements, rows, nested ms, nested statements, nested rows]
+        self._stack = []
+
+    def attach(self, tg):
+        '''
+        Start profiling tg, returns self.
+        '''
+        if self._tg is not None:
+            raise ValueError("Profiler already attached")
+        if tg._profiler is not None:
+            raise ValueError("TaskGraph already profiled")
+        cls = type(tg)
+        for name in dir(cls):
+            if name.startswith('_') or name in UNTIMED or isinstance(getattr(cls, name), property):
+                continue
+            method = getattr(tg, name)
+            if callable(method):
+                setattr(tg, name, self._wrap(name, method))
+                self._wrapped.append(name)
+        tg._profiler = self
+        self._tg = tg
+        return self
+
+    def detach(self):
+        tg = self._tg
+        if tg is None:
+            return
+        for name in self._wrapped:
+            delattr(tg, name)
+        self._wrapped = []
+        tg._profiler = None
+        self._tg = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.detach()
+
+    def cursor(self, db):
+        c = db.cursor(ProfiledCursor)
+        c.profiler = self
+        return c
+
+    def connection_opened(self):
+        self.connections += 1
+
+    def _statement(self, query, seconds):
+        ms = seconds*1000.
+        self.statements += 1
+        self.sql_ms += ms
+        if ms >= self.slow_ms:
+            caller = self._stack[-1][0] if len(self._stack) > 0 else None
+            self.slow.append((ms, caller, ' '.join(query.split())))
+
+    def _fetched(self, rows):
+        self.rows += rows
+
+    def _wrap(self, name, method):
+        def profiled(*args, **kwargs):
+            frame = [name, time.perf_counter(), self.statements, self.rows, 0., 0, 0]
+            self._stack.append(frame)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._stack.pop()
+                ms = (time.perf_counter() - frame[1])*1000.
+                statements = self.statements - frame[2]
+                rows = self.rows - frame[3]
+                stats = self.methods.get(name)
+                if stats is None:
+                    stats = self.methods[name] = MethodStats()
+                stats.calls += 1
+                stats.own_ms += ms - frame[4]
+                stats.own_statements += statements - frame[5]
+                stats.own_rows += rows - frame[6]
+                #recursive calls are already inside the outer call's totals
+                if not any(f[0] == name for f in self._stack):
+                    stats.total_ms += ms
+                    stats.statements += statements
+                    stats.rows += rows
+                if len(self._stack) > 0:
+                    parent = self._stack[-1]
+                    parent[4] += ms
+                    parent[5] += statements
+                    parent[6] += rows
+        profiled.__name__ = name
+        profiled.__doc__ = method.__doc__
+        return profiled
+
+    def report(self, limit=25):
+        '''
+        Totals, the methods with the most time and the slow-query log as text.
+        '''
+        lines = ["{:.1f} ms profiled: {} statements, {} rows, {:.1f} ms in SQL, {} connections opened".format(
+            (time.perf_counter() - self.started)*1000., self.statements, self.rows, self.sql_ms, self.connections)]
+        lines.append("{:40s} {:>6s} {:>10s} {:>10s} {:>8s} {:>8s} {:>9s}".format(
+            'method', 'calls', 'total ms', 'own ms', 'stmts', 'own', 'rows'))
+        methods = sorted(self.methods.items(), key=lambda kv: -kv[1].total_ms)
+        for name, s in methods[:limit]:
+            lines.append("{:40s} {:6d} {:10.1f} {:10.1f} {:8d} {:8d} {:9d}".format(
+                name, s.calls, s.total_ms, s.own_ms, s.statements, s.own_statements, s.rows))
+        if len(self.slow) > 0:
+            lines.append("slow statements (>= {:.0f} ms):".format(self.slow_ms))
+            for ms, caller, query in sorted(self.slow, key=lambda s: -s[0])[:limit]:
+                lines.append("{:8.1f} ms {}: {}".format(ms, caller, query[:200]))
+        return '\n'.join(lines)
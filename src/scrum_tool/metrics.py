@@ -0,0 +1,124 @@
+'''
+Vectorized project metrics over a ProjectFrame (see TaskGraph.snapshot()).
+
+Figures match the per-sprint getters of TaskGraph, with days counted on the
+calendar (datetime64[D]) rather than from timestamps.
+'''
+import numpy as np
+from collections import namedtuple
+
+BurnRates = namedtuple('BurnRates', ['expected', 'burned', 'ideal', 'actual', 'required',
+    'projected_completion', 'daily_gain'])
+Burndown = namedtuple('Burndown', ['days', 'hours_left', 'hours_per_day', 'expected'])
+
+def _today(frame, today):
+    if today is None:
+        return frame.loaded.astype('M8[D]')
+    return np.datetime64(today, 'D')
+
+def task_hours(frame):
+    '''
+    Logged hours per task, aligned to frame.tasks.
+    '''
+    rows = frame.task_rows(frame.hours['task'])
+    keep = rows >= 0
+    return np.bincount(rows[keep], weights=frame.hours['hours'][keep], minlength=len(frame.tasks)).astype(float)
+
+def worker_totals(frame):
+    '''
+    Per worker, aligned to frame.workers: hours logged and expected hours
+    of the tasks assigned to them.
+    '''
+    ids = frame.workers['id']
+    def _rows(worker_ids):
+        rows = np.searchsorted(ids, worker_ids)
+        found = rows < len(ids)
+        found[found] = ids[rows[found]] == worker_ids[found]
+        return np.where(found, rows, -1)
+    res = np.zeros(len(ids), dtype=[('id', 'i8'), ('name', 'O'), ('hours', 'f8'), ('assigned', 'f8')])
+    res['id'] = ids
+    res['name'] = frame.workers['name']
+    rows = _rows(frame.hours['worker'])
+    keep = rows >= 0
+    res['hours'] = np.bincount(rows[keep], weights=frame.hours['hours'][keep], minlength=len(ids))
+    rows = _rows(frame.assignments['worker'])
+    tasks = frame.task_rows(frame.assignments['task'])
+    keep = (rows >= 0) & (tasks >= 0)
+    lengths = np.nan_to_num(frame.tasks['length'][tasks[keep]])
+    res['assigned'] = np.bincount(rows[keep], weights=lengths, minlength=len(ids))
+    return res
+
+def sprint_entries(frame, sprint_id, mask=None):
+    '''
+    Boolean mask over frame.hours of entries on the sprint's tasks dated
+    inside the sprint.
+    '''
+    sprint = frame.sprint(sprint_id)
+    if mask is None:
+        mask = frame.sprint_mask(sprint_id)
+    rows = frame.task_rows(frame.hours['task'])
+    dates = frame.hours['date']
+    return (rows >= 0) & mask[np.clip(rows, 0, None)] & (dates >= sprint['start']) & (dates <= sprint['end'])
+
+def expected_hours(frame, mask):
+    return np.nansum(frame.tasks['length'][mask])
+
+def burn_rates(frame, sprint_id, today=None):
+    '''
+    Expected and burned hours of the sprint with its ideal, actual and
+    required burn (hours/day), the projected completion date and the daily
+    gain (days saved per day).
+    '''
+    today = _today(frame, today)
+    sprint = frame.sprint(sprint_id)
+    start, end = sprint['start'], sprint['end']
+    mask = frame.sprint_mask(sprint_id)
+    entries = sprint_entries(frame, sprint_id, mask)
+    expected = expected_hours(frame, mask)
+    burned = frame.hours['hours'][entries & (frame.hours['date'] <= today)].sum()
+    num_days = (end - start).astype(int) + 1.
+    days_burned = (today - start).astype(int) + 1.
+    days_left = float((end - today).astype(int))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ideal = np.float64(expected)/num_days
+        actual = np.float64(burned)/days_burned
+        required = np.float64(expected - burned)/days_left
+        duration = np.float64(expected)/actual
+    if np.isfinite(duration):
+        projected = start.astype('M8[s]') + np.timedelta64(int(round(duration*86400.)), 's')
+        daily_gain = ((end + 1).astype('M8[s]') - projected).astype(float)/86400./num_days
+    else:
+        projected = np.datetime64('NaT', 's')
+        daily_gain = None
+    return BurnRates(expected, burned, ideal, actual, required, projected, daily_gain)
+
+def burndown_series(frame, sprint_id, today=None):
+    '''
+    Day by day over the sprint: hours left (zero after today) and hours
+    burned per day.
+    '''
+    today = _today(frame, today)
+    sprint = frame.sprint(sprint_id)
+    start, end = sprint['start'], sprint['end']
+    days = np.arange(start, end + 1)
+    mask = frame.sprint_mask(sprint_id)
+    entries = sprint_entries(frame, sprint_id, mask)
+    expected = expected_hours(frame, mask)
+    idx = (frame.hours['date'][entries] - start).astype(int)
+    per_day = np.bincount(idx, weights=frame.hours['hours'][entries], minlength=len(days)).astype(float)
+    hours_left = expected - np.cumsum(per_day)
+    hours_left[days > today] = 0.
+    return Burndown(days, hours_left, per_day, expected)
+
+def sprint_table(frame, today=None):
+    '''
+    burn_rates of every sprint as a structured array, one row per sprint.
+    '''
+    res = np.zeros(len(frame.sprints), dtype=[('id', 'i8'), ('name', 'O'), ('expected', 'f8'),
+        ('burned', 'f8'), ('ideal', 'f8'), ('actual', 'f8'), ('required', 'f8'),
+        ('projected_completion', 'M8[s]')])
+    for i, sprint_id in enumerate(frame.sprints['id']):
+        rates = burn_rates(frame, sprint_id, today)
+        res[i] = (sprint_id, frame.sprints['name'][i], rates.expected, rates.burned, rates.ideal,
+                rates.actual, rates.required, rates.projected_completion)
+    return res
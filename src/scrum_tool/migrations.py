@@ -0,0 +1,313 @@
+'''
+Ordered schema migrations for TaskGraph database files.
+
+Every file records the last applied migration in the schema_version table.
+migrate() applies the newer ones, in order, inside a single transaction so a
+failure leaves the file untouched. Conversions that need Python (unpickling)
+stream over the rows in batches of batch_size to keep memory bounded.
+'''
+import pickle
+import time
+import sqlite3 as sql
+
+BATCH_SIZE = 10000
+
+def _batches(c, query, batch_size):
+    '''
+    Keyset pagination over query, which must select the rowid key first and
+    take (last_key, limit) parameters.
+    '''
+    last = -1
+    while True:
+        c.execute(query,(last,batch_size))
+        rows = c.fetchall()
+        if len(rows) == 0:
+            return
+        yield rows
+        last = rows[-1][0]
+
+def _base_tables(c, batch_size):
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS workers\
+                    ( worker_id INTEGER PRIMARY KEY,\
+                    name TEXT)")
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS tasks\
+                    ( task_id INTEGER PRIMARY KEY,\
+                    name TEXT, \
+                    stat TEXT, \
+                    workers TEXT, \
+                    deps TEXT, \
+                    length REAL, \
+                    backlog_date TEXT, \
+                    new_date TEXT, \
+                    inprogress_date TEXT, \
+                    finished_date TEXT, \
+                    description TEXT, \
+                    category TEXT)")
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS hours\
+                    (entry_id INTEGER PRIMARY KEY,\
+                    task_id INTEGER, \
+                    date TEXT, \
+                    worker_id INTEGER, \
+                    hours REAL, \
+                    params TEXT)")
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS sprints\
+                    (sprint_id INTEGER PRIMARY KEY,\
+                    name TEXT, \
+                    tasks TEXT, \
+                    start_date TEXT, \
+                    end_date TEXT, \
+                    scrum_master INTEGER)")
+    return 0
+
+def _relation_tables(c, batch_size):
+    # many-to-many relations, ordered by rowid (insertion order)
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS task_workers\
+                    (task_id INTEGER, \
+                    worker_id INTEGER, \
+                    PRIMARY KEY (task_id, worker_id))")
+    c.execute("CREATE INDEX IF NOT EXISTS task_workers_by_worker ON task_workers(worker_id, task_id)")
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS task_deps\
+                    (task_id INTEGER, \
+                    dep_id INTEGER, \
+                    PRIMARY KEY (task_id, dep_id))")
+    c.execute("CREATE INDEX IF NOT EXISTS task_deps_by_dep ON task_deps(dep_id, task_id)")
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS sprint_tasks\
+                    (sprint_id INTEGER, \
+                    task_id INTEGER, \
+                    PRIMARY KEY (sprint_id, task_id))")
+    c.execute("CREATE INDEX IF NOT EXISTS sprint_tasks_by_task ON sprint_tasks(task_id, sprint_id)")
+
+    #legacy files keep these lists pickled in the owning row
+    rows = 0
+    w = c.connection.cursor()
+    for batch in _batches(c, 'SELECT task_id, workers, deps FROM tasks \
+            WHERE task_id > ? AND (workers IS NOT NULL OR deps IS NOT NULL) \
+            ORDER BY task_id LIMIT ?', batch_size):
+        workers = []
+        deps = []
+        for task_id, ws, ds in batch:
+            if ws is not None:
+                workers.extend([(task_id, x) for x in pickle.loads(ws)])
+            if ds is not None:
+                deps.extend([(task_id, x) for x in pickle.loads(ds) if x != task_id])
+        w.executemany('INSERT OR IGNORE INTO task_workers(task_id, worker_id) VALUES(?,?)', workers)
+        w.executemany('INSERT OR IGNORE INTO task_deps(task_id, dep_id) VALUES(?,?)', deps)
+        rows += len(batch)
+    c.execute('UPDATE tasks SET workers=NULL, deps=NULL WHERE workers IS NOT NULL OR deps IS NOT NULL')
+
+    for batch in _batches(c, 'SELECT sprint_id, tasks FROM sprints \
+            WHERE sprint_id > ? AND tasks IS NOT NULL \
+            ORDER BY sprint_id LIMIT ?', batch_size):
+        tasks = []
+        for sprint_id, ts in batch:
+            tasks.extend([(sprint_id, x) for x in pickle.loads(ts)])
+        w.executemany('INSERT OR IGNORE INTO sprint_tasks(sprint_id, task_id) VALUES(?,?)', tasks)
+        rows += len(batch)
+    c.execute('UPDATE sprints SET tasks=NULL WHERE tasks IS NOT NULL')
+    w.close()
+    return rows
+
+def _day_dates(c, batch_size):
+    '''
+    Hour entries and sprint bounds are day resolution but were written both
+    as dates and datetimes, store them all as YYYY-MM-DD so they compare in SQL.
+    '''
+    rows = 0
+    c.execute("UPDATE hours SET date=substr(date,1,10) WHERE length(date) > 10")
+    rows += c.rowcount
+    c.execute("UPDATE sprints SET start_date=substr(start_date,1,10) WHERE length(start_date) > 10")
+    rows += c.rowcount
+    c.execute("UPDATE sprints SET end_date=substr(end_date,1,10) WHERE length(end_date) > 10")
+    rows += c.rowcount
+    return rows
+
+def _lookup_indexes(c, batch_size):
+    c.execute("CREATE INDEX IF NOT EXISTS tasks_by_name ON tasks(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS workers_by_name ON workers(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS sprints_by_name ON sprints(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS hours_by_task ON hours(task_id, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS hours_by_worker ON hours(worker_id, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS hours_by_date ON hours(date)")
+    return 0
+
+def _integer_dates(c, batch_size):
+    '''
+    Rebuild the tables with INTEGER date columns: days since 1970-01-01 for
+    hour entries and sprint bounds, seconds since 1970-01-01 for task stat
+    changes (see scrum_tool.dates). The conversion runs inside SQLite.
+    '''
+    day = "CAST(julianday(substr({0},1,10)) - 2440587.5 AS INTEGER)"
+    epoch = "CAST(strftime('%s', substr({0},1,19)) AS INTEGER)"
+    rows = 0
+    c.execute(
+            "CREATE TABLE hours_new\
+                    (entry_id INTEGER PRIMARY KEY,\
+                    task_id INTEGER, \
+                    date INTEGER, \
+                    worker_id INTEGER, \
+                    hours REAL, \
+                    params TEXT)")
+    c.execute("INSERT INTO hours_new SELECT entry_id, task_id, {}, worker_id, hours, params FROM hours".format(
+        day.format('date')))
+    rows += c.rowcount
+    c.execute(
+            "CREATE TABLE sprints_new\
+                    (sprint_id INTEGER PRIMARY KEY,\
+                    name TEXT, \
+                    tasks TEXT, \
+                    start_date INTEGER, \
+                    end_date INTEGER, \
+                    scrum_master INTEGER)")
+    c.execute("INSERT INTO sprints_new SELECT sprint_id, name, tasks, {}, {}, scrum_master FROM sprints".format(
+        day.format('start_date'), day.format('end_date')))
+    rows += c.rowcount
+    c.execute(
+            "CREATE TABLE tasks_new\
+                    ( task_id INTEGER PRIMARY KEY,\
+                    name TEXT, \
+                    stat TEXT, \
+                    workers TEXT, \
+                    deps TEXT, \
+                    length REAL, \
+                    backlog_date INTEGER, \
+                    new_date INTEGER, \
+                    inprogress_date INTEGER, \
+                    finished_date INTEGER, \
+                    description TEXT, \
+                    category TEXT)")
+    c.execute("INSERT INTO tasks_new SELECT task_id, name, stat, workers, deps, length, {}, {}, {}, {}, \
+            description, category FROM tasks".format(*[epoch.format(col) for col in
+                ('backlog_date', 'new_date', 'inprogress_date', 'finished_date')]))
+    rows += c.rowcount
+    for table in ('hours', 'sprints', 'tasks'):
+        c.execute("DROP TABLE {}".format(table))
+        c.execute("ALTER TABLE {0}_new RENAME TO {0}".format(table))
+    _lookup_indexes(c, batch_size)
+    return rows
+
+def rebuild_rollups(c):
+    '''
+    Recompute hours_daily from the hours table, returns the rollup rows.
+    '''
+    c.execute("DELETE FROM hours_daily")
+    c.execute("INSERT INTO hours_daily(task_id, worker_id, date, hours, entries) \
+            SELECT IFNULL(task_id,0), IFNULL(worker_id,0), date, sum(hours), count(*) FROM hours \
+            WHERE date IS NOT NULL GROUP BY 1, 2, 3")
+    return c.rowcount
+
+def _hours_rollup(c, batch_size):
+    '''
+    hours_daily holds the hours per (task, worker, day), kept up to date by
+    triggers on hours whoever writes to the file.
+    '''
+    c.execute(
+            "CREATE TABLE IF NOT EXISTS hours_daily\
+                    (task_id INTEGER, \
+                    worker_id INTEGER, \
+                    date INTEGER, \
+                    hours REAL, \
+                    entries INTEGER, \
+                    PRIMARY KEY (task_id, worker_id, date)) WITHOUT ROWID")
+    c.execute("CREATE INDEX IF NOT EXISTS hours_daily_by_date ON hours_daily(date)")
+    add = "INSERT OR IGNORE INTO hours_daily(task_id, worker_id, date, hours, entries) \
+                VALUES(IFNULL(NEW.task_id,0), IFNULL(NEW.worker_id,0), NEW.date, 0, 0); \
+            UPDATE hours_daily SET hours=hours+IFNULL(NEW.hours,0), entries=entries+1 \
+                WHERE task_id=IFNULL(NEW.task_id,0) AND worker_id=IFNULL(NEW.worker_id,0) AND date=NEW.date;"
+    remove = "UPDATE hours_daily SET hours=hours-IFNULL(OLD.hours,0), entries=entries-1 \
+                WHERE task_id=IFNULL(OLD.task_id,0) AND worker_id=IFNULL(OLD.worker_id,0) AND date=OLD.date; \
+            DELETE FROM hours_daily WHERE entries <= 0 \
+                AND task_id=IFNULL(OLD.task_id,0) AND worker_id=IFNULL(OLD.worker_id,0) AND date=OLD.date;"
+    c.execute("CREATE TRIGGER IF NOT EXISTS hours_daily_insert AFTER INSERT ON hours \
+            WHEN NEW.date IS NOT NULL BEGIN {} END".format(add))
+    c.execute("CREATE TRIGGER IF NOT EXISTS hours_daily_delete AFTER DELETE ON hours \
+            WHEN OLD.date IS NOT NULL BEGIN {} END".format(remove))
+    c.execute("CREATE TRIGGER IF NOT EXISTS hours_daily_update_old AFTER UPDATE OF task_id, worker_id, date, hours ON hours \
+            WHEN OLD.date IS NOT NULL BEGIN {} END".format(remove))
+    c.execute("CREATE TRIGGER IF NOT EXISTS hours_daily_update_new AFTER UPDATE OF task_id, worker_id, date, hours ON hours \
+            WHEN NEW.date IS NOT NULL BEGIN {} END".format(add))
+    return rebuild_rollups(c)
+
+#(version, description, function(cursor, batch_size) -> rows converted)
+MIGRATIONS = [
+        (1, 'base tables', _base_tables),
+        (2, 'relation tables for task workers/deps and sprint tasks', _relation_tables),
+        (3, 'day resolution dates for hours and sprints', _day_dates),
+        (4, 'indexes on names and hour lookups', _lookup_indexes),
+        (5, 'integer day and epoch date columns', _integer_dates),
+        (6, 'daily hours rollup maintained by triggers', _hours_rollup),
+        ]
+
+def get_schema_version(db, cursor=None):
+    c = db.cursor() if cursor is None else cursor()
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schema_version'")
+    if len(c.fetchall()) == 0:
+        c.close()
+        return 0
+    c.execute('SELECT max(version) FROM schema_version')
+    version = c.fetchall()[0][0]
+    c.close()
+    return 0 if version is None else version
+
+def migrate(db, dry_run=False, batch_size=BATCH_SIZE, cursor=None):
+    '''
+    Bring the file behind connection db up to the latest schema.
+
+    Returns a list of dicts (version, description, rows, seconds), one per
+    applied migration. With dry_run the work is done and then rolled back.
+    cursor, when given, returns the cursors to use on db.
+    '''
+    if db.in_transaction:
+        db.commit()
+    c = db.cursor() if cursor is None else cursor()
+    c.execute('BEGIN')
+    report = []
+    try:
+        c.execute("CREATE TABLE IF NOT EXISTS schema_version\
+                (version INTEGER PRIMARY KEY, \
+                description TEXT, \
+                applied_date TEXT)")
+        current = get_schema_version(db, cursor)
+        for version, description, func in MIGRATIONS:
+            if version <= current:
+                continue
+            t0 = time.time()
+            rows = func(c, batch_size)
+            c.execute("INSERT INTO schema_version(version, description, applied_date) VALUES(?,?,datetime('now'))",
+                    (version, description))
+            report.append({'version':version, 'description':description,
+                'rows':rows, 'seconds':time.time() - t0})
+    except:
+        c.execute('ROLLBACK')
+        c.close()
+        raise
+    c.execute('ROLLBACK' if dry_run else 'COMMIT')
+    c.close()
+    return report
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Migrate a scrum_tool database to the latest schema.')
+    parser.add_argument('filename')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be done and roll back')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--rebuild-rollups', action='store_true', help='recompute hours_daily from hours')
+    args = parser.parse_args()
+    db = sql.connect(args.filename)
+    print("schema version {}".format(get_schema_version(db)))
+    for r in migrate(db, dry_run=args.dry_run, batch_size=args.batch_size):
+        print("{version:3d} {description}: {rows} rows in {seconds:.3f} s".format(**r))
+    if args.rebuild_rollups and not args.dry_run:
+        c = db.cursor()
+        print("rebuilt hours_daily: {} rows".format(rebuild_rollups(c)))
+        db.commit()
+        c.close()
+    if args.dry_run:
+        print("dry run, nothing written")
+    db.close()
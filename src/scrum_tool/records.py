@@ -0,0 +1,82 @@
+'''
+Typed records of the rows TaskGraph stores.
+
+Every TaskGraph method taking a task, worker or sprint accepts these as well
+as the "003:name" labels, which remain the display form used by the
+npyscreen widgets (str() of a record is its label).
+'''
+from scrum_tool.dates import from_day, from_epoch
+
+class Record(object):
+    __slots__ = ()
+
+    def __init__(self, *args):
+        for field, value in zip(self.__slots__, args):
+            setattr(self, field, value)
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self.id))
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__,
+                ', '.join('{}={!r}'.format(f, v) for f, v in zip(self.__slots__, self._values())))
+
+    @property
+    def label(self):
+        return "{:03d}:{}".format(self.id, self.name)
+
+    def __str__(self):
+        return self.label
+
+class Task(Record):
+    __slots__ = ('id', 'name', 'stat', 'length', 'backlog_date', 'new_date',
+            'inprogress_date', 'finished_date', 'description')
+
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Row of SELECT task_id, name, stat, length, backlog_date, new_date,
+        inprogress_date, finished_date, description.
+        '''
+        return cls(row[0], row[1], row[2], row[3], from_epoch(row[4]), from_epoch(row[5]),
+                from_epoch(row[6]), from_epoch(row[7]), row[8])
+
+class Worker(Record):
+    __slots__ = ('id', 'name')
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row[0], row[1])
+
+class Sprint(Record):
+    __slots__ = ('id', 'name', 'start', 'end')
+
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Row of SELECT sprint_id, name, start_date, end_date.
+        '''
+        return cls(row[0], row[1], from_day(row[2]), from_day(row[3]))
+
+class HourEntry(Record):
+    __slots__ = ('id', 'task_id', 'date', 'worker_id', 'hours')
+
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Row of SELECT entry_id, task_id, date, worker_id, hours.
+        '''
+        return cls(row[0], row[1], from_day(row[2]), row[3], row[4])
+
+    @property
+    def label(self):
+        return "{:%Y-%m-%d} {:.1f} hours".format(self.date, self.hours)
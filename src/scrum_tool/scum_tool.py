@@ -2,7 +2,12 @@ import numpy as np
 import npyscreen
 from datetime import datetime
 from scrum_tool.task_graph import TaskGraph
+from scrum_tool.graph import CycleError
 import os
+import sys
+
+#simulations behind the forecast on the sprint screen, enough for whole days
+SCREEN_SIMS = 2000
 
 class SwitchFormMultiLineAction(npyscreen.MultiLineAction):
     def __init__(self, *args, **keywords):
@@ -45,6 +50,7 @@ class RecordListDisplay(npyscreen.FormMutt):
         
         if os.path.exists(self.wCommand.value):
             if npyscreen.notify_yes_no("{} already exists, overwrite?".format(self.wCommand.value)):
+                self.parentApp.taskGraph.close()
                 os.unlink(self.wCommand.value)
                 self.parentApp.taskGraph.filename = self.wCommand.value
                 self.parentApp.taskGraph.setup()
@@ -204,11 +210,13 @@ class EditSprint(npyscreen.ActionForm):
         self.wgTaskGrid = self.add(npyscreen.SimpleGrid, column_width=48 ,columns=3,scroll_exit=True, max_height=5)
 
         self.wgCompletion = self.add(npyscreen.TitleText, name = "Completion:", editable=False)
+        self.wgCritical = self.add(npyscreen.TitleText, name = "Critical path:", editable=False)
 
         self.wgStart = self.add(npyscreen.TitleDateCombo, name = "Start Date:")
         self.wgEnd = self.add(npyscreen.TitleDateCombo, name = "End Date:")
         
         self.wgDaysLeft = self.add(npyscreen.TitleText, name = "Days left:", editable=False)
+        self.wgForecast = self.add(npyscreen.TitleText, name = "Forecast:", editable=False)
 
         self.wgEfficiency = self.add(npyscreen.TitleText, name = "Daily gain [Hours saved per day]:", editable=False)
         self.add_handlers({
@@ -238,8 +246,16 @@ class EditSprint(npyscreen.ActionForm):
                 "All modifcations are auto-saved")
 
     def when_burndown(self, *args, **kwargs):
-        if not self.parentApp.taskGraph.burndown_chart_for_sprint(self.value):
+        taskGraph = self.parentApp.taskGraph
+        filename = None
+        if os.environ.get('SCRUM_TOOL_CHART_DIR') or not (os.environ.get('DISPLAY') or sys.platform in ('darwin','win32')):
+            #headless, write the chart next to the project file instead of blocking on plt.show()
+            directory = os.environ.get('SCRUM_TOOL_CHART_DIR') or os.path.dirname(taskGraph.filename)
+            filename = os.path.join(directory, "burndown_{:03d}.png".format(taskGraph.get_sprint_id_from_sprint(self.value)))
+        if not taskGraph.burndown_chart_for_sprint(self.value, filename):
             npyscreen.notify_confirm("No entries to generate burndown from")
+        elif filename is not None:
+            npyscreen.notify_confirm("Burndown written to {}".format(filename))
 
     def when_remove_sprint(self, *args, **kwargs):
         if npyscreen.notify_yes_no("Are you sure you want to delete sprint '{}'".format(self.value)):
@@ -259,60 +275,53 @@ class EditSprint(npyscreen.ActionForm):
 
         
     def update(self):
-        self.wgId.value = "{:03d}".format(self.parentApp.taskGraph.get_sprint_id_from_sprint(self.value))
-        self.wgName.value = '{}'.format(self.parentApp.taskGraph.get_sprint_name_from_sprint(self.value))
-        self.wgWorkers.values = self.parentApp.taskGraph.get_workers_from_sprint(self.value)
+        snapshot = self.parentApp.taskGraph.sprint_snapshot(self.value)
+        self.wgId.value = "{:03d}".format(self.parentApp.taskGraph.get_sprint_id_from_sprint(snapshot.sprint))
+        self.wgName.value = '{}'.format(self.parentApp.taskGraph.get_sprint_name_from_sprint(snapshot.sprint))
+        self.wgWorkers.values = list(snapshot.workers)
         
 
-        self.wgGoalTasks.value = " ,".join(self.parentApp.taskGraph.get_goal_tasks_from_sprint(self.value))
-        tasks = self.parentApp.taskGraph.get_tasks_from_sprint(self.value)
-        self.wgSuggestedTask.value = self.parentApp.taskGraph.suggest_next_task_for_sprint(self.value)
+        self.wgGoalTasks.value = " ,".join(snapshot.goals)
+        self.wgSuggestedTask.value = snapshot.suggested_task
         
-        new = []
-        ip = []
-        f = []
-        for t in tasks:
-            stat = self.parentApp.taskGraph.get_task_stat(t)
-            if stat == 'backlog':
-                self.parentApp.taskGraph.update_task_stat(t,'new')
-                stat = 'new'
-            if stat == 'new':
-                new.append(t)
-            elif stat == 'inprogress':
-                ip.append(t)
-            elif stat == 'finished':
-                f.append(t)
-        max_size = max(len(new),len(ip),len(f))
-        new_ = ['']*max_size
-        for i,a in enumerate(new):
-            new_[i] = a
-        ip_ = ['']*max_size
-        for i,a in enumerate(ip):
-            ip_[i] = a
-        f_ = ['']*max_size
-        for i,a in enumerate(f):
-            f_[i] = a
-        values = []
-        for r,(b,c,d) in enumerate(zip(new_,ip_,f_)):
-            values.append([b,c,d])
+        backlog = [t for t,stat in zip(snapshot.tasks,snapshot.stats) if stat == 'backlog']
+        if len(backlog) > 0:
+            with self.parentApp.taskGraph.transaction():
+                self.parentApp.taskGraph.update_stats_many([(t,'new') for t in backlog])
+            snapshot = self.parentApp.taskGraph.sprint_snapshot(self.value)
+        values = snapshot.board(('new','inprogress','finished'))
         self.wgTaskGrid.values = values
         self.wgTaskGrid.update()
         
 
 
-        expected_hours = self.parentApp.taskGraph.get_expected_hours_for_sprint(self.value)
-        hours = self.parentApp.taskGraph.get_completed_hours_for_sprint(self.value)
+        expected_hours = snapshot.expected_hours
+        hours = snapshot.completed_hours
 
         self.wgCompletion.value = "{:.1f} of {:.1f} hours".format(hours,expected_hours)
-        days_left = self.parentApp.taskGraph.get_days_left_from_sprint(self.value)
-        start,end = self.parentApp.taskGraph.get_dates_from_sprint(self.value)
+        critical = self.parentApp.taskGraph.get_critical_path_for_sprint(snapshot.sprint)
+        if len(critical.chain) > 0:
+            self.wgCritical.value = "{:.1f} hours left along {} tasks, next {}".format(
+                    critical.length, len(critical.chain), critical.chain[0])
+        else:
+            self.wgCritical.value = "N/A"
+        days_left = snapshot.days_left
+        start,end = snapshot.start,snapshot.end
 
 
         self.wgStart.value = start
         self.wgEnd.value = end
         self.wgDaysLeft.value = "{:.1f} days ({:.1f} hours)".format(days_left, days_left*8.)   
 
-        daily_gain = self.parentApp.taskGraph.get_daily_gain_in_sprint(self.value)
+        forecast = self.parentApp.taskGraph.get_completion_forecast_for_sprint(snapshot.sprint,n_sims=SCREEN_SIMS)
+        if forecast is not None:
+            self.wgForecast.value = "P50 {} P85 {} P95 {} ({:.0%} on time)".format(
+                    *['{:%Y-%m-%d}'.format(d) if d is not None else 'never' for d in forecast[:3]],
+                    forecast.on_time)
+        else:
+            self.wgForecast.value = "N/A"
+
+        daily_gain = snapshot.daily_gain
         if daily_gain is not None:
             self.wgEfficiency.value = "{:.1f} hours / day".format(daily_gain)
         else:
@@ -323,8 +332,9 @@ class EditSprint(npyscreen.ActionForm):
         self.update()
 
     def on_ok(self):
-        self.parentApp.taskGraph.update_sprint_start_date(self.value, self.wgStart.value)
-        self.parentApp.taskGraph.update_sprint_end_date(self.value, self.wgEnd.value)
+        with self.parentApp.taskGraph.transaction():
+            self.parentApp.taskGraph.update_sprint_start_date(self.value, self.wgStart.value)
+            self.parentApp.taskGraph.update_sprint_end_date(self.value, self.wgEnd.value)
         
         self.update()
         self.parentApp.switchFormPrevious()
@@ -557,36 +567,7 @@ class ManageTasks(npyscreen.ActionForm):
         self.update()
 
     def update(self):
-        bl = []
-        new = []
-        ip = []
-        f = []
-        for t in self.parentApp.taskGraph.tasks:
-            stat = self.parentApp.taskGraph.get_task_stat(t)
-            if stat == 'backlog':
-                bl.append(t)
-            elif stat == 'new':
-                new.append(t)
-            elif stat == 'inprogress':
-                ip.append(t)
-            elif stat == 'finished':
-                f.append(t)
-        max_size = max(len(bl),len(new),len(ip),len(f))
-        bl_ = ['']*max_size
-        for i,a in enumerate(bl):
-            bl_[i] = a
-        new_ = ['']*max_size
-        for i,a in enumerate(new):
-            new_[i] = a
-        ip_ = ['']*max_size
-        for i,a in enumerate(ip):
-            ip_[i] = a
-        f_ = ['']*max_size
-        for i,a in enumerate(f):
-            f_[i] = a
-        values = []
-        for r,(a,b,c,d) in enumerate(zip(bl_,new_,ip_,f_)):
-            values.append([a,b,c,d])
+        values = self.parentApp.taskGraph.get_board(('backlog','new','inprogress','finished'))
         self.wgGrid.values = values
         self.wgGrid.update()
         
@@ -817,16 +798,21 @@ class EditTask(npyscreen.ActionForm):
             npyscreen.notify_confirm("Must select at least one worker")
             return
         possible_workers = self.parentApp.taskGraph.workers
-        self.parentApp.taskGraph.update_task_workers(
-                self.value,
-                [self.wgWorkers.values[w] for w in self.wgWorkers.value])
-        self.parentApp.taskGraph.update_task_deps(
-                self.value,
-                [self.wgDeps.values[w] for w in self.wgDeps.value])
         times = [0., 1.,2.,4.,8.,8*2.,8*4.,8*5.,10*8.,20*8.,40*8., 80*8., 160*8.]
-        self.parentApp.taskGraph.update_task_length(
-                self.value,
-                times[self.wgLen.value[0]])
+        try:
+            with self.parentApp.taskGraph.transaction():
+                self.parentApp.taskGraph.update_task_deps(
+                        self.value,
+                        [self.wgDeps.values[w] for w in self.wgDeps.value])
+                self.parentApp.taskGraph.update_task_workers(
+                        self.value,
+                        [self.wgWorkers.values[w] for w in self.wgWorkers.value])
+                self.parentApp.taskGraph.update_task_length(
+                        self.value,
+                        times[self.wgLen.value[0]])
+        except CycleError as e:
+            npyscreen.notify_confirm("{}".format(e), title="Invalid dependencies")
+            return
 #        self.parentApp.taskGraph.update_task_stat(
 #                self.value,
 #                self.wgStat.values[self.wgStat.value],
@@ -953,11 +939,36 @@ class ScrumApplication(npyscreen.NPSAppManaged):
         self.addForm("MANAGETASKS",ManageTasks)
         self.addForm("MANAGEWORKERS",ManageWorkers)
         self.addForm("MANAGESPRINTS",ManageSprints)
+        #hidden key: first press starts profiling, later presses dump the current screen's stats
+        self.profiler = None
+        for form in ("MAIN","ADDTASK","EDITTASK","ADDSPRINT","EDITSPRINT","ADDWORKER","EDITWORKER",
+                "LOGHOURS","MANAGETASKS","MANAGEWORKERS","MANAGESPRINTS"):
+            self.getForm(form).add_handlers({"^P": self.when_profile})
+
+    def onInMainLoop(self):
+        #stats cover one screen at a time
+        if self.profiler is not None:
+            self.profiler.reset()
+
+    def when_profile(self, *args, **kwargs):
+        if self.profiler is None:
+            self.profiler = self.taskGraph.profile()
+            npyscreen.notify_confirm("Profiling on, press ^P again to dump this screen's stats")
+            return
+        report = self.profiler.report()
+        filename = os.path.join(os.path.dirname(self.taskGraph.filename), 'scrum_tool_profile.txt')
+        with open(filename, 'a') as f:
+            f.write("{:%Y-%m-%d %H:%M:%S} {}\n{}\n\n".format(datetime.today(), self.ACTIVE_FORM_NAME, report))
+        npyscreen.notify_confirm(report + "\n\nAppended to {}".format(filename), wide=True)
+
     def run(self):
         try:
             super(ScrumApplication,self).run()
         except KeyboardInterrupt:
             print("Goodbye!")
+        finally:
+            if hasattr(self,'taskGraph'):
+                self.taskGraph.close()
 
  
 if __name__ == '__main__':
@@ -0,0 +1,145 @@
+'''
+Deterministic synthetic projects for benchmarks, see scrum_tool.bench.
+
+    python -m scrum_tool.synthetic out.db --tasks 5000 --hours 2000000
+
+Tasks are laid out in depth layers along the project timeline, each
+depending on up to max_deps tasks of earlier layers (mostly the previous
+one). Layer widths are drawn from a Dirichlet distribution: a small
+width_alpha gives very uneven layers, a large one even layers. Tasks
+before the progress point are finished, the ones around it in progress,
+later ones new or still in the backlog. Sprints tile the timeline and take
+their goals from the tasks ending inside them, and hour entries are
+spread over the started tasks, weighted by length. The same spec always
+gives the same file; start pins the first day of the timeline, an empty
+start puts the progress point on today instead.
+'''
+import argparse
+import numpy as np
+import sqlite3 as sql
+from collections import namedtuple
+from datetime import datetime, timedelta
+from scrum_tool.dates import to_day, to_epoch
+
+ProjectSpec = namedtuple('ProjectSpec', ['workers', 'tasks', 'sprints', 'hours', 'depth',
+    'width_alpha', 'max_deps', 'sprint_days', 'goals', 'progress', 'seed', 'start'])
+DEFAULT_SPEC = ProjectSpec(workers=20, tasks=2000, sprints=40, hours=200000, depth=40,
+        width_alpha=2., max_deps=3, sprint_days=14, goals=5, progress=0.7, seed=0,
+        start='2024-01-01')
+LENGTHS = np.array([1., 2., 4., 8., 16., 32., 40.])
+HOURS = np.array([0.5, 1., 2., 4., 8.])
+BATCH_SIZE = 50000
+
+def generate(filename, spec=DEFAULT_SPEC, start=None, batch_size=BATCH_SIZE):
+    '''
+    Write a fresh project for spec into filename (replacing the file).
+    start (datetime) overrides spec.start as the first day of the timeline.
+    Returns the number of rows per table.
+    '''
+    from scrum_tool.task_graph import TaskGraph
+    if spec.tasks < 1 or spec.workers < 1 or spec.depth < 1:
+        raise ValueError("Need at least one task, worker and layer")
+    rng = np.random.default_rng(spec.seed)
+    span = max(spec.sprints, 1)*spec.sprint_days
+    if start is None and spec.start:
+        start = datetime.strptime(spec.start, '%Y-%m-%d')
+    if start is None:
+        start = datetime.today() - timedelta(days=int(spec.progress*span))
+    first_day = to_day(start)
+    today = int(spec.progress*span)
+
+    #layers and timeline, task i is task_id i+1
+    p = rng.dirichlet(np.full(spec.depth, spec.width_alpha))
+    layer = np.sort(rng.choice(spec.depth, spec.tasks, p=p))
+    begin = (layer*span)//spec.depth
+    end = np.maximum(((layer + 1)*span)//spec.depth - 1, begin)
+    stat = np.where(end < today, 'finished', np.where(begin <= today, 'inprogress',
+        np.where(begin <= today + spec.sprint_days, 'new', 'backlog')))
+    lengths = rng.choice(LENGTHS, spec.tasks)
+
+    #dependencies on earlier layers, biased towards the previous layer
+    layer_start = np.searchsorted(layer, layer)
+    window = 2*max(spec.tasks//spec.depth, 1)
+    n_deps = np.where(layer_start > 0, rng.integers(0, spec.max_deps + 1, spec.tasks), 0)
+    deps = []
+    for i in np.nonzero(n_deps)[0]:
+        lo = max(0, layer_start[i] - window)
+        for d in np.unique(rng.integers(lo, layer_start[i], n_deps[i])):
+            deps.append((int(i) + 1, int(d) + 1))
+
+    #one or two workers per task
+    w1 = rng.integers(0, spec.workers, spec.tasks)
+    w2 = np.where(rng.random(spec.tasks) < 0.3, rng.integers(0, spec.workers, spec.tasks), w1)
+    assignments = sorted(set([(i + 1, int(w) + 1) for i, w in enumerate(w1)]
+        + [(i + 1, int(w) + 1) for i, w in enumerate(w2)]))
+
+    def _epoch(days):
+        return to_epoch(start) + int(days)*86400
+    tasks = []
+    for i in range(spec.tasks):
+        s = stat[i]
+        tasks.append((i + 1, "task-{:06d}".format(i + 1), s, float(lengths[i]), _epoch(0),
+            None if s == 'backlog' else _epoch(max(begin[i] - 1, 0)),
+            _epoch(begin[i]) if s in ('inprogress', 'finished') else None,
+            _epoch(end[i] + 1) if s == 'finished' else None, ''))
+
+    #sprints tile the timeline, goals are tasks ending inside them
+    sprints = []
+    sprint_tasks = []
+    for k in range(spec.sprints):
+        lo, hi = k*spec.sprint_days, (k + 1)*spec.sprint_days - 1
+        sprints.append((k + 1, "sprint-{:04d}".format(k + 1), first_day + lo, first_day + hi))
+        ending = np.nonzero((end >= lo) & (end <= hi))[0]
+        if len(ending) > 0:
+            for g in np.sort(rng.choice(ending, min(spec.goals, len(ending)), replace=False)):
+                sprint_tasks.append((k + 1, int(g) + 1))
+
+    #hour entries on started tasks, up to the progress point
+    started = np.nonzero(stat != 'backlog')[0]
+    n_hours = spec.hours if len(started) > 0 else 0
+    if n_hours > 0:
+        weights = lengths[started]/lengths[started].sum()
+    def _hours(n):
+        t = rng.choice(started, n, p=weights)
+        last = np.maximum(np.minimum(end[t], today), begin[t])
+        days = begin[t] + (rng.random(n)*(last - begin[t] + 1)).astype(np.int64)
+        worker = np.where(rng.random(n) < 0.5, w1[t], w2[t]) + 1
+        amount = rng.choice(HOURS, n)
+        return zip((t + 1).tolist(), (days + first_day).tolist(), worker.tolist(), amount.tolist())
+
+    TaskGraph(filename, new=True, allow_same_name=True).close()
+    db = sql.connect(filename)
+    c = db.cursor()
+    c.execute('BEGIN')
+    c.executemany('INSERT INTO workers(worker_id, name) VALUES(?,?)',
+            [(w + 1, "worker-{:03d}".format(w + 1)) for w in range(spec.workers)])
+    c.executemany('INSERT INTO tasks(task_id, name, stat, length, backlog_date, new_date, \
+            inprogress_date, finished_date, description) VALUES(?,?,?,?,?,?,?,?,?)', tasks)
+    c.executemany('INSERT INTO task_deps(task_id, dep_id) VALUES(?,?)', deps)
+    c.executemany('INSERT INTO task_workers(task_id, worker_id) VALUES(?,?)', assignments)
+    c.executemany('INSERT INTO sprints(sprint_id, name, start_date, end_date) VALUES(?,?,?,?)', sprints)
+    c.executemany('INSERT INTO sprint_tasks(sprint_id, task_id) VALUES(?,?)', sprint_tasks)
+    #drawn and written batch by batch, memory stays flat in spec.hours
+    for lo in range(0, n_hours, batch_size):
+        c.executemany('INSERT INTO hours(task_id, date, worker_id, hours) VALUES(?,?,?,?)',
+                _hours(min(batch_size, n_hours - lo)))
+    db.commit()
+    c.close()
+    db.close()
+    return {'workers': spec.workers, 'tasks': len(tasks), 'task_deps': len(deps),
+            'task_workers': len(assignments), 'sprints': len(sprints),
+            'sprint_tasks': len(sprint_tasks), 'hours': n_hours}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic scrum_tool project')
+    parser.add_argument('filename')
+    for field in ProjectSpec._fields:
+        default = getattr(DEFAULT_SPEC, field)
+        parser.add_argument('--' + field.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args(argv)
+    spec = ProjectSpec(*[getattr(args, field) for field in ProjectSpec._fields])
+    for table, rows in generate(args.filename, spec).items():
+        print("{:15s} {}".format(table, rows))
+
+if __name__ == '__main__':
+    main()
@@ -1,75 +1,527 @@
 import numpy as np
-import pylab as plt
-plt.style.use('ggplot')
 import os
-from datetime import datetime
+import io
+from datetime import datetime, timedelta
 import sqlite3 as sql
-import pickle
+import threading
+from scrum_tool.migrations import migrate, get_schema_version, rebuild_rollups
+from scrum_tool.graph import TaskDAG, CycleError
+from scrum_tool.forecast import forecast_sprint, N_SIMS, SEED
+from scrum_tool.identity import IdentityMap
+from scrum_tool.records import Task, Worker, Sprint, HourEntry
+from scrum_tool.dates import to_datetime, to_day, from_day, to_epoch, day_text
+from scrum_tool.frame import load_frame
+from scrum_tool.instrument import Profiler, SLOW_MS
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import groupby
+
+#ids bound per IN list, well below SQLite's variable limit
+MAX_BOUND_IDS = 500
+#task stats in board order
+BOARD_STATS = ('backlog','new','inprogress','finished')
+#column recording when a task last entered each stat
+STAT_DATES = {'backlog':'backlog_date','new':'new_date','inprogress':'inprogress_date','finished':'finished_date'}
+
+def _board_rows(columns):
+    '''
+    Transpose columns of labels into grid rows, padding short columns with ''.
+    '''
+    rows = max([len(col) for col in columns] + [0])
+    return [[col[i] if i < len(col) else '' for col in columns] for i in range(rows)]
+
+class SprintSnapshot(namedtuple('SprintSnapshot', ['sprint', 'start', 'end', 'today',
+        'goals', 'tasks', 'stats', 'lengths', 'hours', 'workers', 'daily'])):
+    '''
+    Read-only state of a sprint at one instant, see TaskGraph.sprint_snapshot.
+    tasks are in order of execution with stats, lengths and all-time logged
+    hours aligned to them. daily are the (day, hours) rows of hours_daily
+    inside the sprint, days as integers since 1970-01-01.
+    '''
+    __slots__ = ()
+
+    @staticmethod
+    def _day(date):
+        return datetime(date.year,date.month,date.day)
+
+    @property
+    def expected_hours(self):
+        return np.sum(self.lengths)
+
+    @property
+    def expected_hours_of_remaining_tasks(self):
+        return np.sum([l for l,s in zip(self.lengths,self.stats) if s != 'finished'])
+
+    @property
+    def completed_hours(self):
+        return np.sum(self.hours)
+
+    @property
+    def remaining_tasks(self):
+        return [t for t,s in zip(self.tasks,self.stats) if s != 'finished']
+
+    @property
+    def suggested_task(self):
+        for t,s in zip(self.tasks,self.stats):
+            if s != 'finished':
+                return t
+        return None
+
+    def board(self, stats=BOARD_STATS[1:]):
+        '''
+        Sprint tasks as grid rows with one column per stat, in order of
+        execution.
+        '''
+        columns = dict((stat,[]) for stat in stats)
+        for t,s in zip(self.tasks,self.stats):
+            if s in columns:
+                columns[s].append(t)
+        return _board_rows([columns[stat] for stat in stats])
+
+    @property
+    def num_days(self):
+        return (self.end.timestamp() - self.start.timestamp())/86400. + 1.
+
+    @property
+    def days_left(self):
+        return (self._day(self.end).timestamp() - self._day(self.today).timestamp())/86400. #you have the whole last day to finish
+
+    @property
+    def days_burned(self):
+        return (self._day(self.today).timestamp() - self._day(self.start).timestamp())/86400. + 1.
+
+    @property
+    def daily_hours(self):
+        '''
+        (days, hours): every day of the sprint as datetime64[D] and the
+        hours logged on it.
+        '''
+        start = np.datetime64(self.start,'D')
+        days = np.arange(start, np.datetime64(self.end,'D') + 1)
+        if len(self.daily) == 0:
+            return days, np.zeros(len(days))
+        idx = np.array([d[0] for d in self.daily]) - start.astype(int)
+        return days, np.bincount(idx,weights=[d[1] for d in self.daily],minlength=len(days)).astype(float)
+
+    @property
+    def hours_burned(self):
+        days,hours = self.daily_hours
+        return float(hours[days <= np.datetime64(self.today,'D')].sum())
+
+    @property
+    def ideal_burn(self):
+        return self.expected_hours/self.num_days
+
+    @property
+    def actual_burn(self):
+        days = self.days_burned
+        if days <= 0.:
+            return 0.#not started yet
+        return self.hours_burned/days
+
+    @property
+    def required_burn(self):
+        return (self.expected_hours - self.hours_burned)/self.days_left
+
+    @property
+    def projected_completion(self):
+        '''
+        Epoch seconds the work is done at the actual burn, nan while nothing
+        is burned.
+        '''
+        burn = self.actual_burn
+        if not burn > 0.:
+            return np.nan
+        return self.start.timestamp() + 86400*self.expected_hours/burn
+
+    @property
+    def daily_gain(self):
+        desired_end = self.end.timestamp() + 86400.#end of last day
+        projected_end = self.projected_completion
+        if not np.isfinite(projected_end):
+            return None
+        return (desired_end - projected_end)/self.num_days/86400.
+
+#plotting style applied the first time a chart is drawn
+PLOT_STYLE = 'ggplot'
+_styled = False
+
+def _use_plot_style():
+    '''
+    Import matplotlib on first use and apply PLOT_STYLE once, so importing
+    this module stays free of matplotlib.
+    '''
+    global _styled
+    import matplotlib.style
+    if not _styled:
+        matplotlib.style.use(PLOT_STYLE)
+        _styled = True
+
+BurndownSeries = namedtuple('BurndownSeries', ['name', 'dates', 'hours_left', 'daily_hours',
+    'expected_hours', 'ideal_burn', 'actual_burn', 'required_burn', 'projected_completion',
+    'daily_gain', 'forecast', 'days_left', 'x_max', 'today'])
+
+def draw_burndown(fig, series):
+    '''
+    Draw the burndown (top) and hours per day (bottom) of a BurndownSeries
+    onto fig, any matplotlib Figure.
+    '''
+    _use_plot_style()
+    import matplotlib.dates as mdates
+    fmt = mdates.DateFormatter('%Y-%m-%d')
+    days = mdates.DayLocator()
+
+    dates = series.dates
+    length = series.expected_hours
+    last = dates[-1] + timedelta(days=1)
+    ax,ax2 = fig.subplots(nrows=2,ncols=1,sharex=True)
+    ax.bar(dates, series.hours_left,align='edge',alpha=0.5)
+    ax.plot([dates[0],last],[length, 0.],ls='--',lw=3,c='black',label='ideal burn {:.1f} hr/day'.format(series.ideal_burn))
+    if np.isfinite(series.projected_completion):
+        ax.plot([dates[0],datetime.fromtimestamp(series.projected_completion)],[length,0.],ls='--',lw=3,c='blue',label='actual burn {:.1f} hr/day'.format(series.actual_burn))
+    ax.vlines(series.today,0.,length,color='green',lw=3,label='today')
+    if series.forecast is not None:
+        for q,d,ls in zip((50,85,95),series.forecast[:3],(':','-.','--')):
+            if d is not None:
+                ax.vlines(d,0.,length,color='purple',lw=2,ls=ls,label='P{} completion {:%Y-%m-%d}'.format(q,d))
+    ax.legend()
+    ax.set_title("Burndown for {}\nRunning {} to {}".format(series.name,
+        dates[0].date(),dates[-1].date()))
+    ax.xaxis.set_major_formatter(fmt)
+    ax.xaxis.set_major_locator(days)
+    ax.grid(True)
+    ax.set_xlim(dates[0],series.x_max)
+    ax.set_ylabel('hours')
+
+    days_left = series.days_left
+    ax2.bar(dates, series.daily_hours,align='edge',alpha=0.5)
+    if len(days_left) > 0:
+        ax2.bar(days_left, series.required_burn*np.ones(len(days_left)),alpha=0.5,align='edge',label='goal {:.1f} hr/day'.format(series.required_burn))
+    ax2.vlines(series.today,0.,length,color='green',lw=3)
+    ax2.set_title("Hours per day\nDaily hourly gain {}".format(
+        'N/A' if series.daily_gain is None else '{:.1f}'.format(series.daily_gain)))
+    ax2.xaxis.set_major_formatter(fmt)
+    ax2.xaxis.set_major_locator(days)
+    ax2.grid(True)
+    ax2.set_xlim(dates[0],series.x_max)
+    ax2.set_ylabel('hours')
+    ax2.set_xlabel('date')
+    if len(days_left) > 0:
+        ax2.legend()
+
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+#hour rows as returned to callers, dates as YYYY-MM-DD
+HOUR_COLUMNS = 'entry_id, task_id, {}, worker_id, hours, params'.format(day_text('date'))
+
+#goal tasks of sprint ? and everything they depend on, as table members
+SPRINT_MEMBERS = 'WITH RECURSIVE members(task_id) AS ( \
+        SELECT st.task_id FROM sprint_tasks st JOIN tasks t ON t.task_id=st.task_id \
+        WHERE st.sprint_id=? \
+        UNION SELECT td.dep_id FROM task_deps td JOIN members m ON td.task_id=m.task_id) '
 
 class TaskGraph(object):
+    #number of prepared statements kept per connection
+    cached_statements = 256
+
     def __init__(self, filename="project.db",new=False,allow_same_name=False):
-        self.filename = os.path.abspath(filename)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+        self._filename = None
+        self._task_graph = None
+        self._identity = {}
+        #data_version the task graph and identity maps were loaded at
+        self._cache_version = None
+        #(sprint_id, format) -> (snapshot the chart was drawn from, bytes)
+        self._renders = {}
+        #(sprint_id, n_sims, seed) -> (data version and day, Forecast)
+        self._forecasts = {}
+        self._profiler = None
+        self.filename = filename
         if new:
             try:
-                os.unlink(filename)
+                os.unlink(self.filename)
             except:
                 pass
         self.allow_same_name = allow_same_name
         self.setup()
-        
-        
-    def setup(self):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute(
-                "CREATE TABLE IF NOT EXISTS workers\
-                        ( worker_id INTEGER PRIMARY KEY,\
-                        name TEXT)")
-        c.execute(
-                "CREATE TABLE IF NOT EXISTS tasks\
-                        ( task_id INTEGER PRIMARY KEY,\
-                        name TEXT, \
-                        stat TEXT, \
-                        workers TEXT, \
-                        deps TEXT, \
-                        length REAL, \
-                        backlog_date TEXT, \
-                        new_date TEXT, \
-                        inprogress_date TEXT, \
-                        finished_date TEXT, \
-                        description TEXT, \
-                        category TEXT)")
-
-        c.execute(
-                "CREATE TABLE IF NOT EXISTS hours\
-                        (entry_id INTEGER PRIMARY KEY,\
-                        task_id INTEGER, \
-                        date TEXT, \
-                        worker_id INTEGER, \
-                        hours REAL, \
-                        params TEXT)")
-
-        c.execute(
-                "CREATE TABLE IF NOT EXISTS sprints\
-                        (sprint_id INTEGER PRIMARY KEY,\
-                        name TEXT, \
-                        tasks TEXT, \
-                        start_date TEXT, \
-                        end_date TEXT, \
-                        scrum_master INTEGER)")
-
-        db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self,filename):
+        '''
+        Re-targeting closes every open connection, the next access reconnects
+        to the new file.
+        '''
+        self.close()
+        self._filename = os.path.abspath(filename)
+
+    @property
+    def db(self):
+        '''
+        Long-lived connection owned by the calling thread.
+        '''
+        local = self._local
+        if getattr(local,'generation',None) != self._generation:
+            local.db = sql.connect(self.filename,
+                    cached_statements=self.cached_statements,
+                    check_same_thread=False)
+            local.generation = self._generation
+            with self._lock:
+                self._connections.append(local.db)
+            if self._profiler is not None:
+                self._profiler.connection_opened()
+        return local.db
+
+    def cursor(self):
+        if self._profiler is not None:
+            return self._profiler.cursor(self.db)
+        return self.db.cursor()
+
+    def _execute(self,statement):
+        '''
+        Run a transaction control statement where a profiler counts it.
+        '''
+        c = self.cursor()
+        c.execute(statement)
         c.close()
 
+    def _sync_caches(self):
+        '''
+        Drop the task graph and identity maps if another connection changed
+        the file since they were loaded, returns True if they were dropped.
+        Runs once per transaction, get_task_graph and get_identity_map call,
+        and before a resolver gives up on a name it does not know.
+        '''
+        c = self.cursor()
+        c.execute('PRAGMA data_version')
+        version = (self._generation, id(self.db), c.fetchall()[0][0])
+        c.close()
+        if self._cache_version == version:
+            return False
+        self._task_graph = None
+        self._identity = {}
+        self._cache_version = version
+        return True
 
-    def to_datetime(self,datetime_str):
+    def profile(self, slow_ms=SLOW_MS):
+        '''
+        Start a Profiler (see scrum_tool.instrument) on this TaskGraph, it
+        stops when used as a context manager or on detach().
+        '''
+        return Profiler(slow_ms=slow_ms).attach(self)
+
+    def commit(self):
+        '''
+        Commit the calling thread's writes, deferred to the end of the
+        outermost transaction() block when inside one.
+        '''
+        if getattr(self._local,'transactions',0) == 0 and self.db.in_transaction:
+            self._execute('COMMIT')
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Unit of work: every write of the calling thread inside the block is
+        committed once, at the end of the outermost block. An exception
+        rolls the block back (a nested block back to its own start, through
+        a savepoint) and drops the in-process caches the undone writes had
+        already updated.
+        '''
+        local = self._local
+        depth = getattr(local,'transactions',0)
+        if depth == 0:
+            self.commit()
+            self._sync_caches()
+            self._execute('BEGIN')
+        else:
+            self._execute('SAVEPOINT tx{}'.format(depth))
+        local.transactions = depth + 1
         try:
-            return datetime.strptime(datetime_str,'%Y-%m-%d %H:%M:%S.%f')
+            yield self
+            local.transactions = depth
+            if depth == 0:
+                self._execute('COMMIT')
+            else:
+                self._execute('RELEASE tx{}'.format(depth))
         except:
+            local.transactions = depth
+            if depth == 0:
+                self._execute('ROLLBACK')
+            else:
+                self._execute('ROLLBACK TO tx{}'.format(depth))
+                self._execute('RELEASE tx{}'.format(depth))
+            self.invalidate_caches()
+            raise
+
+    def invalidate_caches(self):
+        '''
+        Drop the in-process task graph, identity maps and rendered charts,
+        for when the file was written behind this TaskGraph's back on its
+        own connection (see scrum_tool.transfer).
+        '''
+        self._task_graph = None
+        self._identity = {}
+        self._renders = {}
+        self._forecasts = {}
+
+    def close(self):
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+            self._generation += 1
+            self._task_graph = None
+            self._identity = {}
+            self._renders = {}
+            self._forecasts = {}
+        for db in connections:
+            db.close()
+
+    def setup(self, dry_run=False):
+        '''
+        Create or migrate the schema of the file, returns the migration report.
+        '''
+        self._task_graph = None
+        self._identity = {}
+        report = migrate(self.db, dry_run=dry_run, cursor=self.cursor)
+        if not dry_run:
+            self._setup_name_constraint()
+        return report
+
+    def _setup_name_constraint(self):
+        '''
+        Unique task names are enforced by an index unless allow_same_name.
+        If the file already holds duplicates the index cannot be built and
+        add_task falls back to an indexed lookup.
+        '''
+        c = self.cursor()
+        if self.allow_same_name:
+            c.execute('DROP INDEX IF EXISTS tasks_unique_name')
+            self._unique_task_names = False
+        else:
             try:
-                return datetime.strptime(datetime_str,'%Y-%m-%d')
-            except:
-                return datetime.strptime(datetime_str,'%Y-%m-%d %H:%M:%S')
+                c.execute('CREATE UNIQUE INDEX IF NOT EXISTS tasks_unique_name ON tasks(name)')
+                self._unique_task_names = True
+            except sql.IntegrityError:
+                self._unique_task_names = False
+        self.commit()
+        c.close()
+
+    @property
+    def schema_version(self):
+        return get_schema_version(self.db, self.cursor)
+
+    @property
+    def data_version(self):
+        '''
+        Changes whenever another connection commits to the file.
+        '''
+        self._sync_caches()
+        return self._cache_version
+
+    def rebuild_rollups(self):
+        '''
+        Recompute the hours_daily rollup from the hour entries, returns the
+        number of rollup rows.
+        '''
+        c = self.cursor()
+        rows = rebuild_rollups(c)
+        self.commit()
+        c.close()
+        return rows
+
+    def snapshot(self):
+        '''
+        The whole project as a columnar ProjectFrame (see scrum_tool.frame),
+        read in one transaction, for the functions in scrum_tool.metrics.
+        '''
+        return load_frame(self.db, self.cursor)
+
+    def _select_by_ids(self,query,key,ids,suffix='',args=()):
+        '''
+        Rows of query (without WHERE) whose key is in ids, all rows when ids
+        is None; suffix (AND conditions, GROUP BY, ORDER BY) is appended with
+        its args bound after the ids. Ids are bound in IN lists of at most
+        MAX_BOUND_IDS, so suffix may group by key but only orders within a
+        chunk.
+        '''
+        c = self.cursor()
+        if ids is None:
+            c.execute(query + suffix, list(args))
+            rows = c.fetchall()
+        else:
+            ids = list(set(ids))
+            rows = []
+            for i in range(0,len(ids),MAX_BOUND_IDS):
+                chunk = ids[i:i+MAX_BOUND_IDS]
+                c.execute(query + ' WHERE {} IN ({})'.format(key,','.join('?'*len(chunk))) + suffix, chunk + list(args))
+                rows.extend(c.fetchall())
+        c.close()
+        return rows
+
+    def _records(self,cls,query,key,ids,resolve_id):
+        if ids is None:
+            return [cls.from_row(r) for r in self._select_by_ids(query,key,None,' ORDER BY {}'.format(key))]
+        ids = [resolve_id(x) for x in ids]
+        rows = dict((r[0],r) for r in self._select_by_ids(query,key,ids))
+        return [cls.from_row(rows[i]) for i in ids]
+
+    def get_identity_map(self,table):
+        '''
+        IdentityMap of 'tasks', 'workers' or 'sprints', loaded with one query
+        and kept coherent with writes made through this TaskGraph. All maps
+        are dropped when another connection changes the file.
+        '''
+        self._sync_caches()
+        return self._identity_map(table)
+
+    def _identity_map(self,table):
+        '''
+        get_identity_map without checking the file for outside writes,
+        resolvers check only when a lookup misses.
+        '''
+        identity = self._identity.get(table)
+        if identity is None:
+            if self._cache_version is None:
+                self._sync_caches()
+            key = {'tasks':'task_id','workers':'worker_id','sprints':'sprint_id'}[table]
+            c = self.cursor()
+            c.execute('SELECT {0},name FROM {1} ORDER BY {0}'.format(key,table))
+            identity = IdentityMap(c.fetchall())
+            c.close()
+            self._identity[table] = identity
+        return identity
+
+    def _identity_add(self,table,id,name):
+        identity = self._identity.get(table)
+        if identity is not None:
+            identity.add(id,name)
+
+    def _identity_remove(self,table,id):
+        identity = self._identity.get(table)
+        if identity is not None:
+            identity.remove(id)
+
+    def to_datetime(self,datetime_str):
+        return to_datetime(datetime_str)
 
 
 
@@ -78,39 +530,30 @@ class TaskGraph(object):
 
     @property
     def sprints(self):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT sprint_id,name from sprints')
-        sprints = c.fetchall()
-        c.close()
-        if len(sprints) == 0:
-            return []
-        else:
-            return ["{:03d}:{}".format(id,name) for id,name in sprints]
+        return self.get_identity_map('sprints').all_labels()
+
+    def get_sprint_records(self,sprints=None):
+        '''
+        Sprint records of the given sprints (all when None) in one query.
+        '''
+        return self._records(Sprint,'SELECT sprint_id, name, start_date, end_date FROM sprints',
+                'sprint_id',sprints,lambda s: self.get_sprint_id_from_sprint(self.resolve_sprint(s)))
 
     def get_sprint_id_from_sprint(self,sprint):
-        return int(sprint.split(":")[0].strip())
+        if isinstance(sprint,Sprint):
+            return sprint.id
+        return int(sprint.split(":",1)[0].strip())
 
     def get_sprint_name_from_sprint(self,sprint):
-        return sprint.split(":")[1].strip()
+        if isinstance(sprint,Sprint):
+            return sprint.name
+        return sprint.split(":",1)[1].strip()
 
     def get_sprint_from_sprint_id(self,sprint_id):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT sprint_id,name from sprints where sprint_id=?',(sprint_id,))
-        res = c.fetchall()
-        c.close()
-        if len(res) == 0:
-            return None
-        else:
-            return "{:03d}:{}".format(res[0][0],res[0][1])
+        return self._identity_map('sprints').get_label(sprint_id)
 
     def get_sprint_from_sprint_name(self,name):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT sprint_id,name from sprints where name=?',(name,))
-        res = c.fetchall()
-        c.close()
+        res = self._identity_map('sprints').find(name)
         if len(res) == 0:
             return None
         elif len(res) == 1:
@@ -119,14 +562,24 @@ class TaskGraph(object):
             raise ValueError("Invalid sprint {}".format(res))
 
     def resolve_sprint(self,sprint):
-        if sprint in self.sprints:
+        res = self._find_sprint(sprint)
+        if res is None and self._sync_caches():
+            #written by another connection since the maps were loaded
+            res = self._find_sprint(sprint)
+        if res is None:
+            raise ValueError("Invalid sprint {}".format(sprint))
+        return res
+
+    def _find_sprint(self,sprint):
+        if isinstance(sprint,str) and sprint in self._identity_map('sprints'):
             return sprint
-        if isinstance(sprint,int):
+        res = None
+        if isinstance(sprint,Sprint):
+            res = self.get_sprint_from_sprint_id(sprint.id)
+        elif isinstance(sprint,int):
             res = self.get_sprint_from_sprint_id(sprint)
         elif isinstance(sprint,str):
             res = self.get_sprint_from_sprint_name(sprint)
-        if res is None:
-            raise ValueError("Invalid sprint {}".format(sprint))
         return res
 
 
@@ -140,8 +593,7 @@ class TaskGraph(object):
 
     @property
     def next_sprint_id(self):
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT max(sprint_id) from sprints')
         sprint_id = c.fetchall()
         c.close()
@@ -154,114 +606,174 @@ class TaskGraph(object):
 
         tasks = [self.resolve_task(t) for t in tasks]
         task_ids = [self.get_task_id_from_task(t) for t in tasks]
-        def _day(date):
-            return datetime(date.year,date.month,date.day)
-        start_date = _day(start_date)
-        end_date = _day(end_date)
+        start_date = to_day(start_date)
+        end_date = to_day(end_date)
+
+        with self.transaction():
+            c = self.cursor()
+            c.execute('insert into sprints(name, start_date, end_date) values(?,?,?)',(name, start_date, end_date))
+            sprint_id = c.lastrowid
+            c.executemany('INSERT OR IGNORE INTO sprint_tasks(sprint_id, task_id) VALUES(?,?)',
+                    [(sprint_id, t) for t in task_ids])
+            c.close()
+            self._identity_add('sprints',sprint_id,name)
 
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('insert into sprints(name, tasks, start_date, end_date) values(?,?,?,?)',(name,pickle.dumps(task_ids), start_date, end_date))
-        db.commit()
-        c.close()
-        
-        task_order = self.get_order_of_execution(tasks)
-        stats = [self.get_task_stat(t) for t in task_order]
-        for t,s in zip(task_order,stats):
-            if s == 'backlog':
-                self.update_task_stat(t,'new')
+            task_order = self.get_order_of_execution(tasks)
+            stats = self.get_stats(task_order)
+            self.update_stats_many([(t,'new') for t,s in zip(task_order,stats) if s == 'backlog'])
 
 
 
     def rm_sprint(self,sprint):
         sprint = self.resolve_sprint(sprint)
         sprint_id = self.get_sprint_id_from_sprint(sprint)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('DELETE FROM sprints WHERE sprint_id=?',(sprint_id,))
-        db.commit()
+        c.execute('DELETE FROM sprint_tasks WHERE sprint_id=?',(sprint_id,))
+        self.commit()
         c.close()
+        self._identity_remove('sprints',sprint_id)
 
     def update_sprint_end_date(self,sprint,date):
         sprint = self.resolve_sprint(sprint)
         sprint_id = self.get_sprint_id_from_sprint(sprint)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('UPDATE sprints set end_date=? \
-                    WHERE sprint_id=?', (date, sprint_id))
-        db.commit()
+                    WHERE sprint_id=?', (to_day(date), sprint_id))
+        self.commit()
         c.close()
 
     def update_sprint_start_date(self,sprint,date):
         sprint = self.resolve_sprint(sprint)
         sprint_id = self.get_sprint_id_from_sprint(sprint)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('UPDATE sprints set start_date=? \
-                    WHERE sprint_id=?', (date, sprint_id))
-        db.commit()
+                    WHERE sprint_id=?', (to_day(date), sprint_id))
+        self.commit()
         c.close()
 
     def get_all_sprints_with_task(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT sprint_id,tasks from sprints',(task_id,))
+        c = self.cursor()
+        c.execute('SELECT s.sprint_id, s.name FROM sprint_tasks st \
+                    JOIN sprints s ON s.sprint_id=st.sprint_id \
+                    WHERE st.task_id=? ORDER BY s.sprint_id',(task_id,))
         res = c.fetchall()
-        if len(res) == 0:
-            return []
-        has_task = []
-        for r in res:
-            if task_id in pickle.loads(r[1]):
-                has_task.append(r[0])
         c.close()
-        return [self.get_sprint_from_sprint_id(s) for s in has_task]
+        return ["{:03d}:{}".format(id,name) for id,name in res]
     
     def get_goal_tasks_from_sprint(self,sprint):
         sprint = self.resolve_sprint(sprint)
         sprint_id = self.get_sprint_id_from_sprint(sprint)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT tasks from sprints where sprint_id=?',(sprint_id,))
+        c = self.cursor()
+        c.execute('SELECT t.task_id, t.name FROM sprint_tasks st \
+                    JOIN tasks t ON t.task_id=st.task_id \
+                    WHERE st.sprint_id=? ORDER BY st.rowid',(sprint_id,))
         res = c.fetchall()
         c.close()
-        if len(res) == 0:
-            return []
-        return [self.get_task_from_task_id(t) for t in pickle.loads(res[0][0])]
+        return ["{:03d}:{}".format(id,name) for id,name in res]
+
+    def _get_sprint_goal_ids(self,sprint,dag):
+        sprint = self.resolve_sprint(sprint)
+        sprint_id = self.get_sprint_id_from_sprint(sprint)
+        c = self.cursor()
+        c.execute('SELECT task_id FROM sprint_tasks WHERE sprint_id=? ORDER BY rowid',(sprint_id,))
+        goals = [r[0] for r in c.fetchall() if r[0] in dag]
+        c.close()
+        return goals
+
+    def _get_sprint_task_ids(self,sprint,dag):
+        '''
+        Goal tasks of the sprint expanded to everything they depend on, in
+        order of execution.
+        '''
+        return self._order_task_ids(dag, self._get_sprint_goal_ids(sprint,dag))
+
+    def sprint_snapshot(self,sprint):
+        '''
+        Everything the sprint screen and burndown chart need, loaded with a
+        handful of set-based queries into an immutable SprintSnapshot.
+        '''
+        sprint = self.resolve_sprint(sprint)
+        sprint_id = self.get_sprint_id_from_sprint(sprint)
+        today = datetime.today()
+        dag = self.get_task_graph()
+        c = self.cursor()
+        c.execute('SELECT start_date,end_date FROM sprints WHERE sprint_id=?',(sprint_id,))
+        start,end = c.fetchall()[0]
+        c.execute('SELECT task_id FROM sprint_tasks WHERE sprint_id=? ORDER BY rowid',(sprint_id,))
+        goals = [r[0] for r in c.fetchall() if r[0] in dag]
+        task_ids = self._order_task_ids(dag, goals)
+        c.execute(SPRINT_MEMBERS + 'SELECT DISTINCT w.worker_id, w.name FROM task_workers tw \
+                JOIN members m ON m.task_id=tw.task_id \
+                JOIN workers w ON w.worker_id=tw.worker_id',(sprint_id,))
+        workers = c.fetchall()
+        c.execute(SPRINT_MEMBERS + 'SELECT date, sum(hours) FROM hours_daily JOIN members USING(task_id) \
+                WHERE date BETWEEN ? AND ? GROUP BY date',(sprint_id, start, end))
+        daily = tuple(c.fetchall())
+        c.close()
+        hours = self.get_hours_for_tasks(task_ids)
+        return SprintSnapshot(sprint, from_day(start), from_day(end), today,
+                tuple(dag.labels[t] for t in goals),
+                tuple(dag.labels[t] for t in task_ids),
+                tuple(dag.stats[t] for t in task_ids),
+                tuple(dag.lengths[t] for t in task_ids),
+                tuple(hours.tolist()),
+                tuple(sorted(set("{:03d}:{}".format(id,name) for id,name in workers))),
+                daily)
 
     def get_tasks_from_sprint(self,sprint):
-        goals = self.get_goal_tasks_from_sprint(sprint)
-        return self.get_order_of_execution(goals)
+        dag = self.get_task_graph()
+        return [dag.labels[t] for t in self._get_sprint_task_ids(sprint,dag)]
 
     def get_workers_from_sprint(self,sprint):
-        tasks = self.get_tasks_from_sprint(sprint)
-        workers = []
-        for t in tasks:
-            workers.append(self.get_workers_from_task(t))
-        return list(np.unique(workers))
+        sprint_id = self.get_sprint_id_from_sprint(self.resolve_sprint(sprint))
+        c = self.cursor()
+        c.execute(SPRINT_MEMBERS + 'SELECT DISTINCT w.worker_id, w.name FROM task_workers tw \
+                JOIN members m ON m.task_id=tw.task_id \
+                JOIN workers w ON w.worker_id=tw.worker_id',(sprint_id,))
+        workers = c.fetchall()
+        c.close()
+        return sorted(set("{:03d}:{}".format(id,name) for id,name in workers))
+
+    def _sprint_calendar(self,sprint,expected_hours=False):
+        '''
+        SprintSnapshot holding only the dates (and with expected_hours the
+        total length of the sprint's tasks), read in one query, for the
+        getters of a single date metric.
+        '''
+        sprint = self.resolve_sprint(sprint)
+        sprint_id = self.get_sprint_id_from_sprint(sprint)
+        c = self.cursor()
+        if expected_hours:
+            c.execute(SPRINT_MEMBERS + 'SELECT start_date, end_date, \
+                    (SELECT IFNULL(sum(t.length),0.) FROM tasks t JOIN members m ON m.task_id=t.task_id) \
+                    FROM sprints WHERE sprint_id=?',(sprint_id,sprint_id))
+        else:
+            c.execute('SELECT start_date, end_date, 0. FROM sprints WHERE sprint_id=?',(sprint_id,))
+        start,end,length = c.fetchall()[0]
+        c.close()
+        return SprintSnapshot(sprint, from_day(start), from_day(end), datetime.today(),
+                (), (), (), (length,), (), (), ())
         
     def get_expected_hours_for_sprint(self,sprint):
-        tasks = self.get_tasks_from_sprint(sprint)
-        return np.sum([self.get_task_length(t) for t in tasks])
+        task_ids = self._get_sprint_task_ids(sprint,self.get_task_graph())
+        return np.sum(self.get_task_lengths(task_ids))
 
     def get_expected_hours_of_remaining_tasks_for_sprint(self,sprint):
-        tasks = self.get_remaining_tasks_from_sprint(sprint)
-        return np.sum([self.get_task_length(t) for t in tasks])
+        task_ids = self._get_sprint_task_ids(sprint,self.get_task_graph())
+        return np.sum(self.get_task_lengths(task_ids)[self.get_stats(task_ids) != 'finished'])
 
 
     def get_completed_hours_for_sprint(self,sprint):
-        tasks = self.get_tasks_from_sprint(sprint)
-        return np.sum([self.get_hours_for_task(t) for t in tasks])
+        task_ids = self._get_sprint_task_ids(sprint,self.get_task_graph())
+        return np.sum(self.get_hours_for_tasks(task_ids))
 
     def get_remaining_tasks_from_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        tasks = self.get_tasks_from_sprint(sprint)
-        tasks_ = []
-        for t in tasks:
-            if self.get_task_stat(t) != 'finished':
-                tasks_.append(t)
-        return tasks_
+        dag = self.get_task_graph()
+        return [dag.labels[t] for t in self._get_sprint_task_ids(sprint,dag)
+                if dag.stats[t] != 'finished']
 
     def is_sprint_finished(self,sprint,date=None):
         if date is None:
@@ -278,182 +790,173 @@ class TaskGraph(object):
         return (end.timestamp() - date.timestamp()) >= 0 and (start.timestamp() - date.timestamp()) <= 0
 
     def get_days_left_from_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        sprint_id = self.get_sprint_id_from_sprint(sprint)
-        start,end = self.get_dates_from_sprint(sprint)
-        def _day(date):
-            return datetime(date.year,date.month,date.day)
-        return (_day(end).timestamp() - _day(datetime.today()).timestamp())/86400. #you have the whole last day to finish
+        return self._sprint_calendar(sprint).days_left
 
     def get_days_burned_from_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        sprint_id = self.get_sprint_id_from_sprint(sprint)
-        start,end = self.get_dates_from_sprint(sprint)
-        def _day(date):
-            return datetime(date.year,date.month,date.day)
-        return (_day(datetime.today()).timestamp()- _day(start).timestamp())/86400. + 1.#you have the whole last day to finish
+        return self._sprint_calendar(sprint).days_burned
         
     def get_dates_from_sprint(self,sprint):
         sprint = self.resolve_sprint(sprint)
         sprint_id = self.get_sprint_id_from_sprint(sprint)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT start_date,end_date from sprints where sprint_id=?',(sprint_id,))
         res = c.fetchall()
         c.close()
         if len(res) == 0:
             return None
-        return (self.to_datetime(res[0][0]),  self.to_datetime(res[0][1]))
+        return (from_day(res[0][0]),  from_day(res[0][1]))
 
     def get_num_days_in_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        sprint_id = self.get_sprint_id_from_sprint(sprint)
-        start,end = self.get_dates_from_sprint(sprint)
-        return (end.timestamp() - start.timestamp())/86400. + 1.
+        return self._sprint_calendar(sprint).num_days
 
     def suggest_next_task_for_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        tasks = self.get_goal_tasks_from_sprint(sprint)
-        tasks = self.get_order_of_execution(tasks)
-        for t in tasks:
-            stat = self.get_task_stat(t)
-            if stat != 'finished':
-                return t
-        return None
+        return self.sprint_snapshot(sprint).suggested_task
 
     def is_date_in_sprint(self,sprint,date):
         return self.is_sprint_active(sprint,date)
         
     def get_entries_in_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        tasks = self.get_tasks_from_sprint(sprint)
-        entries = []
-        for t in tasks:
-            entries_ = self.get_hour_entries_for_task(t)
-            for e in entries_:
-                if self.is_date_in_sprint(sprint,self.to_datetime(e[2])):
-                    entries.append(e)
+        sprint_id = self.get_sprint_id_from_sprint(self.resolve_sprint(sprint))
+        c = self.cursor()
+        c.execute(SPRINT_MEMBERS + 'SELECT {} FROM hours JOIN members USING(task_id) \
+                WHERE date BETWEEN (SELECT start_date FROM sprints WHERE sprint_id=?) \
+                AND (SELECT end_date FROM sprints WHERE sprint_id=?) ORDER BY entry_id'.format(HOUR_COLUMNS),
+                (sprint_id, sprint_id, sprint_id))
+        entries = c.fetchall()
+        c.close()
         return entries
 
+    def get_daily_hours_in_sprint(self,sprint):
+        return self.sprint_snapshot(sprint).daily_hours
+
     def get_hours_burned_in_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        entries = self.get_entries_in_sprint(sprint)
-        hours = 0.
-        for e in entries:
-            d = self.to_datetime(e[2]).timestamp()
-            if d <= datetime.today().timestamp():
-                hours += e[4]
-        return hours
+        return self.sprint_snapshot(sprint).hours_burned
 
     def get_ideal_burn(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        length = self.get_expected_hours_for_sprint(sprint)
-        days = self.get_num_days_in_sprint(sprint)
-        return length/days
+        return self._sprint_calendar(sprint,expected_hours=True).ideal_burn
 
     def get_actual_burn(self,sprint):
-        hours = self.get_hours_burned_in_sprint(sprint)
-        days = self.get_days_burned_from_sprint(sprint)
-        return hours/days
+        return self.sprint_snapshot(sprint).actual_burn
 
     def get_required_burn(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-#        length = self.get_expected_hours_of_remaining_tasks_for_sprint(sprint)
-        length = self.get_expected_hours_for_sprint(sprint)
-        hours = self.get_hours_burned_in_sprint(sprint)
-        days = self.get_days_left_from_sprint(sprint)
-        return (length - hours)/days
+        return self.sprint_snapshot(sprint).required_burn
 
     def get_projected_completion_of_sprint(self,sprint):
-        sprint = self.resolve_sprint(sprint)
-        length = self.get_expected_hours_for_sprint(sprint)
-        actual_burn = self.get_actual_burn(sprint)
-        start,end = self.get_dates_from_sprint(sprint)
-        return start.timestamp() + 86400*length/actual_burn
+        return self.sprint_snapshot(sprint).projected_completion
         
-    def get_daily_gain_in_sprint(self,sprint):
+    def get_completion_forecast_for_sprint(self,sprint,n_sims=N_SIMS,seed=SEED):
+        '''
+        Monte Carlo completion dates (P50/P85/P95) of the sprint, see
+        scrum_tool.forecast. None without any logged hours. Seeded forecasts
+        are cached until the file is written (by any connection) or the day
+        changes; seed=None draws a fresh one every call.
+        '''
+        if seed is None:
+            return forecast_sprint(self,sprint,n_sims=n_sims)
         sprint = self.resolve_sprint(sprint)
-        start,end = self.get_dates_from_sprint(sprint)
-        days = self.get_num_days_in_sprint(sprint)
-        desired_end = end.timestamp() + 86400.#end of last day
-        projected_end = self.get_projected_completion_of_sprint(sprint)
-        if not np.isfinite(projected_end):
-            return None
-        return (desired_end - projected_end)/days/86400.
+        key = (self.get_sprint_id_from_sprint(sprint),n_sims,seed)
+        version = (self.data_version,self.db.total_changes,datetime.today().date())
+        cached = self._forecasts.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        forecast = forecast_sprint(self,sprint,n_sims=n_sims,seed=seed)
+        self._forecasts[key] = (version,forecast)
+        return forecast
 
-    def burndown_chart_for_sprint(self,sprint):
+    def get_daily_gain_in_sprint(self,sprint):
+        return self.sprint_snapshot(sprint).daily_gain
 
+    def burndown_series_for_sprint(self,sprint,snapshot=None):
+        '''
+        The data behind the burndown chart as a BurndownSeries, None without
+        any logged hours.
+        '''
         def _day(date):
             return datetime(date.year,date.month,date.day)
 
-        import matplotlib.dates as mdates
-        fmt = mdates.DateFormatter('%Y-%m-%d')
-        days = mdates.DayLocator()
+        if snapshot is None:
+            snapshot = self.sprint_snapshot(sprint)
+        if len(snapshot.daily) == 0:
+            return None
+        sprint = snapshot.sprint
+        length = snapshot.expected_hours
+        start,end = snapshot.start,snapshot.end
 
-        sprint = self.resolve_sprint(sprint)
-        entries = self.get_entries_in_sprint(sprint)
-        if len(entries) == 0:
-            return False
-        length = self.get_expected_hours_for_sprint(sprint)
-        start,end = self.get_dates_from_sprint(sprint)
-        
         time_array = np.arange(_day(start).timestamp(),_day(end).timestamp()+86400., 86400.)
-        hours_left = np.ones(len(time_array))*length
-        hours = np.zeros(len(time_array))
-        for e in entries:
-            d = self.to_datetime(e[2])
-            idx = np.searchsorted(time_array,d.timestamp())
-            hours_left[idx:] -= e[4]
-            hours[idx] += e[4]
-                
-        ideal_burn = self.get_ideal_burn(sprint)
-        actual_burn = self.get_actual_burn(sprint)
-        projected_completion = start.timestamp() + 86400*length/actual_burn if actual_burn != 0. else np.nan
-        required_burn = self.get_required_burn(sprint)
+        hours = snapshot.daily_hours[1]
+        hours_left = length - np.cumsum(hours)
+
+        actual_burn = snapshot.actual_burn
+        projected_completion = snapshot.projected_completion
+        forecast = self.get_completion_forecast_for_sprint(sprint)
 
         dates = [datetime.fromtimestamp(t) for t in time_array]
         last = datetime.fromtimestamp(_day(end).timestamp()+86400.)
-        x_max = datetime.fromtimestamp(min(max(projected_completion,_day(end).timestamp()+86400.), _day(end).timestamp()+5*86400.))
+        if np.isfinite(projected_completion):
+            x_max = datetime.fromtimestamp(min(max(projected_completion,_day(end).timestamp()+86400.), _day(end).timestamp()+5*86400.))
+        else:
+            x_max = last
+        if forecast is not None and forecast.p95 is not None:
+            x_max = max(x_max, min(forecast.p95 + timedelta(days=1), last + timedelta(days=30)))
         days_left = []
         for i,d in enumerate(dates):
-            if d.timestamp() > datetime.today().timestamp():
+            if d.timestamp() > snapshot.today.timestamp():
                 days_left.append(d)
                 hours_left[i:] = 0.
+        return BurndownSeries(self.get_sprint_name_from_sprint(sprint), dates, hours_left, hours,
+                length, snapshot.ideal_burn, actual_burn, snapshot.required_burn,
+                projected_completion, snapshot.daily_gain, forecast, days_left, x_max, snapshot.today)
 
-        fig,(ax,ax2) = plt.subplots(nrows=2,ncols=1,sharex=True,figsize=(12,12))
-        ax.bar(dates, hours_left,align='edge',alpha=0.5)
-        ax.plot([dates[0],last],[length, 0.],ls='--',lw=3,c='black',label='ideal burn {:.1f} hr/day'.format(ideal_burn))
-#        ax.scatter([datetime.fromtimestamp(projected_completion)],[0.],s=100,c='blue',label='projected completion')
-        ax.plot([dates[0],datetime.fromtimestamp(projected_completion)],[length,0.],ls='--',lw=3,c='blue',label='actual burn {:.1f} hr/day'.format(actual_burn))
-        ax.vlines(datetime.today(),0.,length,color='green',lw=3,label='today')
-        ax.legend()
-        ax.set_title("Burndown for {}\nRunning {} to {}".format(self.get_sprint_name_from_sprint(sprint),
-            dates[0].date(),dates[-1].date()))
-        ax.xaxis.set_major_formatter(fmt)
-        ax.xaxis.set_major_locator(days)
-        ax.grid(True)
-        ax.set_xlim(dates[0],x_max)
-        ax.set_ylabel('hours')
-
-        ax2.bar(dates, hours,align='edge',alpha=0.5)
-        if len(days_left) > 0:
-            ax2.bar(days_left, required_burn*np.ones(len(days_left)),alpha=0.5,align='edge',label='goal {:.1f} hr/day'.format(required_burn))
-        ax2.vlines(datetime.today(),0.,length,color='green',lw=3)
-        ax2.set_title("Hours per day\nDaily hourly gain {:.1f}".format(self.get_daily_gain_in_sprint(sprint)))
-        ax2.xaxis.set_major_formatter(fmt)
-        ax2.xaxis.set_major_locator(days)
-        ax2.grid(True)
-        ax2.set_xlim(dates[0],x_max)
-        ax2.set_ylabel('hours')
-        ax2.set_xlabel('date')
-        if len(days_left) > 0:
-            ax2.legend()
-
-        fig.autofmt_xdate()
-        plt.tight_layout()
+    def burndown_chart_for_sprint(self,sprint,filename=None):
+        '''
+        Show the burndown chart, or write it to filename (format from the
+        extension) without touching the interactive backend. False without
+        any logged hours.
+        '''
+        if filename is not None:
+            fmt = os.path.splitext(filename)[1][1:].lower() or 'png'
+            data = self.render_burndown_for_sprint(sprint,fmt)
+            if data is None:
+                return False
+            with open(filename,'wb') as f:
+                f.write(data)
+            return True
+        series = self.burndown_series_for_sprint(sprint)
+        if series is None:
+            return False
+        _use_plot_style()
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(12,12))
+        draw_burndown(fig,series)
         plt.show()
         return True
 
+    def render_burndown_for_sprint(self,sprint,fmt='png'):
+        '''
+        The burndown chart as png/svg/pdf bytes, rendered off-screen. Renders
+        are cached per sprint and reused until the sprint's snapshot (tasks,
+        stats, hours per day) or the day changes. None without any logged
+        hours.
+        '''
+        snapshot = self.sprint_snapshot(sprint)
+        sprint_id = self.get_sprint_id_from_sprint(snapshot.sprint)
+        key = snapshot._replace(today=snapshot.today.date())
+        cached = self._renders.get((sprint_id,fmt))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        series = self.burndown_series_for_sprint(sprint,snapshot)
+        if series is None:
+            return None
+        _use_plot_style()
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(12,12))
+        draw_burndown(fig,series)
+        buf = io.BytesIO()
+        fig.savefig(buf,format=fmt)
+        data = buf.getvalue()
+        self._renders[(sprint_id,fmt)] = (key,data)
+        return data
+
 
         
         
@@ -463,31 +966,59 @@ class TaskGraph(object):
 
     @property
     def tasks(self):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT task_id,name from tasks')
-        tasks = c.fetchall()
-        c.close()
-        if len(tasks) == 0:
-            return []
-        else:
-            return ["{:03d}:{}".format(id,name) for id,name in tasks]
+        return self.get_identity_map('tasks').all_labels()
     
+    def get_board(self, stats=BOARD_STATS):
+        '''
+        All tasks as grid rows with one column per stat, by task id, loaded
+        in a single query.
+        '''
+        c = self.cursor()
+        c.execute('SELECT task_id, name, stat FROM tasks WHERE stat IN ({}) ORDER BY task_id'.format(
+            ','.join('?'*len(stats))), list(stats))
+        columns = dict((stat,[]) for stat in stats)
+        for id,name,stat in c.fetchall():
+            columns[stat].append("{:03d}:{}".format(id,name))
+        c.close()
+        return _board_rows([columns[stat] for stat in stats])
+
+    def get_task_records(self,tasks=None):
+        '''
+        Task records of the given tasks (all when None) in one query.
+        '''
+        return self._records(Task,'SELECT task_id, name, stat, length, backlog_date, new_date, \
+                inprogress_date, finished_date, description FROM tasks',
+                'task_id',tasks,lambda t: self.get_task_id_from_task(self.resolve_task(t)))
+
     def get_task_id_from_task(self,task):
-        return int(task.split(":")[0].strip())
+        if isinstance(task,Task):
+            return task.id
+        return int(task.split(":",1)[0].strip())
 
     def get_task_name_from_task(self,task):
-        return task.split(":")[1].strip()
+        if isinstance(task,Task):
+            return task.name
+        return task.split(":",1)[1].strip()
 
     def resolve_task(self,task):
-        if task in self.tasks:
+        res = self._find_task(task)
+        if res is None and self._sync_caches():
+            #written by another connection since the maps were loaded
+            res = self._find_task(task)
+        if res is None:
+            raise ValueError("Invalid task {}".format(task))
+        return res
+
+    def _find_task(self,task):
+        if isinstance(task,str) and task in self._identity_map('tasks'):
             return task
-        if isinstance(task,int):
+        res = None
+        if isinstance(task,Task):
+            res = self.get_task_from_task_id(task.id)
+        elif isinstance(task,int):
             res = self.get_task_from_task_id(task)
         elif isinstance(task,str):
             res = self.get_task_from_task_name(task)
-        if res is None:
-            raise ValueError("Invalid task {}".format(task))
         return res
 
     @property
@@ -499,22 +1030,10 @@ class TaskGraph(object):
         return [self.get_task_name_from_task(t) for t in self.tasks]
 
     def get_task_from_task_id(self,task_id):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT task_id,name from tasks where task_id=?',(task_id,))
-        res = c.fetchall()
-        c.close()
-        if len(res) == 0:
-            return None
-        else:
-            return "{:03d}:{}".format(res[0][0],res[0][1])
+        return self._identity_map('tasks').get_label(task_id)
 
     def get_task_from_task_name(self,name):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT task_id,name from tasks where name=?',(name,))
-        res = c.fetchall()
-        c.close()
+        res = self._identity_map('tasks').find(name)
         if len(res) == 0:
             return None
         elif len(res) == 1:
@@ -525,38 +1044,29 @@ class TaskGraph(object):
     def get_workers_from_task(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT workers from tasks WHERE task_id=?',(task_id,))
+        c = self.cursor()
+        c.execute('SELECT w.worker_id, w.name FROM task_workers tw \
+                    JOIN workers w ON w.worker_id=tw.worker_id \
+                    WHERE tw.task_id=? ORDER BY tw.rowid',(task_id,))
         workers = c.fetchall()
-        c.close()        
-        if len(workers) == 0:
-            return []
-        elif len(workers) == 1:
-            return [self.get_worker_from_worker_id(w) for w in pickle.loads(workers[0][0])]
-        else:
-            raise ValueError("Duplicate task {}".format(task))
+        c.close()
+        return ["{:03d}:{}".format(id,name) for id,name in workers]
 
     def get_deps_from_task(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT deps from tasks WHERE task_id=?',(task_id,))
+        c = self.cursor()
+        c.execute('SELECT t.task_id, t.name FROM task_deps td \
+                    JOIN tasks t ON t.task_id=td.dep_id \
+                    WHERE td.task_id=? ORDER BY td.rowid',(task_id,))
         res = c.fetchall()
-        c.close()        
-        if len(res) == 0:
-            return []
-        elif len(res) == 1:
-            return [self.get_task_from_task_id(t) for t in pickle.loads(res[0][0])]
-        else:
-            raise ValueError("Duplicate task {}".format(task))
+        c.close()
+        return ["{:03d}:{}".format(id,name) for id,name in res]
 
     def get_description_from_task(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT description from tasks WHERE task_id=?',(task_id,))
         res = c.fetchall()
         c.close()        
@@ -569,8 +1079,8 @@ class TaskGraph(object):
 
 
     def add_task(self,name, length, workers, deps=None, date=None, description=None):
-        if not self.allow_same_name:
-            if name in self.task_names:
+        if not self.allow_same_name and not self._unique_task_names:
+            if self.get_task_from_task_name(name) is not None:
                 raise ValueError("Task {} already exists".format(name))
         if date is None:
             date = datetime.today()
@@ -594,39 +1104,138 @@ class TaskGraph(object):
         deps = [self.resolve_task(t) for t in deps]
         deps = [self.get_task_id_from_task(t) for t in deps]
 
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('INSERT INTO tasks(name, length, workers, deps, stat, backlog_date, description) VALUES(?,?,?,?,?,?,?)',
-                (name, float(length), pickle.dumps(workers), pickle.dumps(deps), 'backlog', date, description))
-        db.commit()
+        c = self.cursor()
+        try:
+            c.execute('INSERT INTO tasks(name, length, stat, backlog_date, description) VALUES(?,?,?,?,?)',
+                    (name, float(length), 'backlog', to_epoch(date), description))
+        except sql.IntegrityError:
+            c.close()
+            if getattr(self._local,'transactions',0) == 0 and self.db.in_transaction:
+                self._execute('ROLLBACK')
+            raise ValueError("Task {} already exists".format(name))
+        task_id = c.lastrowid
+        c.executemany('INSERT OR IGNORE INTO task_workers(task_id, worker_id) VALUES(?,?)',
+                [(task_id, w) for w in workers])
+        c.executemany('INSERT OR IGNORE INTO task_deps(task_id, dep_id) VALUES(?,?)',
+                [(task_id, d) for d in deps])
+        self.commit()
         c.close()
+        self._identity_add('tasks',task_id,name)
+
+        dag = self._task_graph
+        if dag is not None:
+            dag.add_node(task_id)
+            dag.labels[task_id] = "{:03d}:{}".format(task_id,name)
+            dag.stats[task_id] = 'backlog'
+            dag.lengths[task_id] = float(length)
+            for d in deps:
+                dag.add_edge(task_id, d)
+
+    def add_tasks(self,tasks):
+        '''
+        add_task for many rows (name, length, workers, deps=None, date=None,
+        description=None) in one transaction, deps may name tasks of earlier
+        rows. Returns the labels of the new tasks; on error none are added.
+        '''
+        rows = [tuple(r) + (None,)*(6 - len(r)) for r in tasks]
+        today = datetime.today()
+        with self.transaction():
+            c = self.cursor()
+            c.execute('SELECT IFNULL(max(task_id),0) FROM tasks')
+            first = c.fetchall()[0][0] + 1
+            identity = self._identity_map('tasks')
+            names = set()
+            inserts = []
+            workers = []
+            for i,(name,length,task_workers,deps,date,description) in enumerate(rows):
+                if not self.allow_same_name:
+                    if name in names or len(identity.find(name)) > 0:
+                        raise ValueError("Task {} already exists".format(name))
+                    names.add(name)
+                if not isinstance(task_workers,(tuple,list)):
+                    task_workers = [task_workers]
+                for w in task_workers:
+                    workers.append((first + i, self.get_worker_id_from_worker(self.resolve_worker(w))))
+                inserts.append((first + i, name, float(length), 'backlog',
+                    to_epoch(today if date is None else date), '' if description is None else description))
+            try:
+                c.executemany('INSERT INTO tasks(task_id, name, length, stat, backlog_date, description) \
+                        VALUES(?,?,?,?,?,?)', inserts)
+            except sql.IntegrityError:
+                raise ValueError("Task names already exist")
+            for task_id,name,_,_,_,_ in inserts:
+                self._identity_add('tasks',task_id,name)
+            deps = []
+            for i,row in enumerate(rows):
+                task_deps = row[3]
+                if task_deps is None:
+                    task_deps = []
+                if not isinstance(task_deps,(tuple,list)):
+                    task_deps = [task_deps]
+                for d in task_deps:
+                    dep_id = self.get_task_id_from_task(self.resolve_task(d))
+                    if dep_id >= first + i:
+                        raise ValueError("Task {} depends on a later task {}".format(row[0],d))
+                    deps.append((first + i, dep_id))
+            c.executemany('INSERT OR IGNORE INTO task_workers(task_id, worker_id) VALUES(?,?)', workers)
+            c.executemany('INSERT OR IGNORE INTO task_deps(task_id, dep_id) VALUES(?,?)', deps)
+            c.close()
+
+            dag = self._task_graph
+            if dag is not None:
+                for task_id,name,length,_,_,_ in inserts:
+                    dag.add_node(task_id)
+                    dag.labels[task_id] = "{:03d}:{}".format(task_id,name)
+                    dag.stats[task_id] = 'backlog'
+                    dag.lengths[task_id] = length
+                for task_id,dep_id in deps:
+                    dag.add_edge(task_id, dep_id)
+        return ["{:03d}:{}".format(r[0],r[1]) for r in inserts]
 
     def rm_task(self,task):
         task = self.resolve_task(task)
-        
-        tasks = self.tasks
-        for t in tasks:
-            deps = self.get_deps_from_task(t)
-            deps_ = []
-            for d in deps:
-                if d != task:
-                    deps_.append(d)
-            self.update_task_deps(t,deps_)
-
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
+        c.execute('DELETE from task_deps where task_id=? OR dep_id=?',(task_id,task_id))
+        c.execute('DELETE from task_workers where task_id=?',(task_id,))
+        c.execute('DELETE from sprint_tasks where task_id=?',(task_id,))
         c.execute('DELETE from tasks where task_id=?',(task_id,))
-        db.commit()
+        self.commit()
         c.close()
+        self._identity_remove('tasks',task_id)
+        if self._task_graph is not None:
+            self._task_graph.remove_node(task_id)
 
 
 
+    def _task_id_list(self,tasks):
+        return [int(t) if isinstance(t,(int,np.integer)) else self.get_task_id_from_task(self.resolve_task(t))
+                for t in tasks]
+
+    def get_task_lengths(self,tasks):
+        '''
+        Lengths of the tasks (ids, labels or records) as a float array
+        aligned to them, nan for unknown ids.
+        '''
+        ids = self._task_id_list(tasks)
+        rows = dict(self._select_by_ids('SELECT task_id, length FROM tasks','task_id',ids))
+        return np.array([rows.get(t,np.nan) for t in ids],dtype=float)
+
+    def get_stats(self,tasks):
+        '''
+        Stats of the tasks as an object array aligned to them, None for
+        unknown ids.
+        '''
+        ids = self._task_id_list(tasks)
+        rows = dict(self._select_by_ids('SELECT task_id, stat FROM tasks','task_id',ids))
+        res = np.empty(len(ids),dtype=object)
+        res[:] = [rows.get(t) for t in ids]
+        return res
+
     def get_task_length(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT length from tasks where task_id=?',(task_id,))
         res = c.fetchall()
         c.close()
@@ -639,8 +1248,7 @@ class TaskGraph(object):
     def get_task_stat(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT stat from tasks where task_id=?',(task_id,))
         res = c.fetchall()
         c.close()
@@ -655,11 +1263,11 @@ class TaskGraph(object):
         task_id = self.get_task_id_from_task(task)
         workers = [self.resolve_worker(w) for w in workers]
         workers = [self.get_worker_id_from_worker(w) for w in workers]
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('UPDATE tasks set workers=? \
-                    WHERE task_id=?', (pickle.dumps(workers),task_id))
-        db.commit()
+        c = self.cursor()
+        c.execute('DELETE FROM task_workers WHERE task_id=?', (task_id,))
+        c.executemany('INSERT OR IGNORE INTO task_workers(task_id, worker_id) VALUES(?,?)',
+                [(task_id, w) for w in workers])
+        self.commit()
         c.close()
 
 
@@ -672,31 +1280,42 @@ class TaskGraph(object):
             if d != task:
                 deps_.append(d)
         deps = [self.get_task_id_from_task(t) for t in deps_]
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('UPDATE tasks set deps=? \
-                    WHERE task_id=?', (pickle.dumps(deps),task_id))
-        db.commit()
-        c.close()
+        #rejects cycles before anything is written
+        dag = self.get_task_graph()
+        try:
+            dag.set_deps(task_id, deps)
+        except CycleError as e:
+            raise CycleError([dag.labels[t] for t in e.path])
+        c = self.cursor()
+        try:
+            c.execute('DELETE FROM task_deps WHERE task_id=?', (task_id,))
+            c.executemany('INSERT OR IGNORE INTO task_deps(task_id, dep_id) VALUES(?,?)',
+                    [(task_id, d) for d in deps])
+            self.commit()
+        except:
+            self._task_graph = None
+            raise
+        finally:
+            c.close()
 
     def update_task_length(self,task,length):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('UPDATE tasks set length=? \
                     WHERE task_id=?', (length,task_id))
-        db.commit()
+        self.commit()
         c.close()
+        if self._task_graph is not None:
+            self._task_graph.lengths[task_id] = length
 
     def update_task_description(self,task,description):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('UPDATE tasks set description=? \
                     WHERE task_id=?', (description,task_id))
-        db.commit()
+        self.commit()
         c.close()
 
     def update_task_stat(self,task,stat,date=None):
@@ -707,88 +1326,183 @@ class TaskGraph(object):
             date = datetime.today()
 
         if stat  == 'backlog':
-            db = sql.connect(self.filename)
-            c = db.cursor()
+            c = self.cursor()
             c.execute('UPDATE tasks set stat=?, backlog_date=? \
-                        WHERE task_id=?', (stat,date,task_id))
-            db.commit()
+                        WHERE task_id=?', (stat,to_epoch(date),task_id))
+            self.commit()
             c.close()
 
         if stat  == 'new':
-            db = sql.connect(self.filename)
-            c = db.cursor()
+            c = self.cursor()
             c.execute('UPDATE tasks set stat=?, new_date=? \
-                        WHERE task_id=?', (stat,date,task_id))
-            db.commit()
+                        WHERE task_id=?', (stat,to_epoch(date),task_id))
+            self.commit()
             c.close()
 
         if stat  == 'inprogress':
-            db = sql.connect(self.filename)
-            c = db.cursor()
+            c = self.cursor()
             c.execute('UPDATE tasks set stat=?, inprogress_date=? \
-                        WHERE task_id=?', (stat,date,task_id))
-            db.commit()
+                        WHERE task_id=?', (stat,to_epoch(date),task_id))
+            self.commit()
             c.close()
         if stat  == 'finished':
-            db = sql.connect(self.filename)
-            c = db.cursor()
+            c = self.cursor()
             c.execute('UPDATE tasks set stat=?, finished_date=? \
-                        WHERE task_id=?', (stat,date,task_id))
-            db.commit()
+                        WHERE task_id=?', (stat,to_epoch(date),task_id))
+            self.commit()
             c.close()
 
-    def get_task_dsk(self):
-        tasks = self.tasks
-        task_ids = [self.get_task_id_from_task(t) for t in tasks]
-        dsk = {}
-        for task_id,task in zip(task_ids,tasks):
-            db = sql.connect(self.filename)
-            c = db.cursor()
-            c.execute('SELECT deps FROM tasks WHERE task_id=?',(task_id, ))
-            res = c.fetchall()
+        if self._task_graph is not None and stat in ('backlog','new','inprogress','finished'):
+            self._task_graph.stats[task_id] = stat
+
+    def update_stats_many(self,updates):
+        '''
+        update_task_stat for many rows (task, stat, date=None) in one
+        transaction, applied in order. Tasks may also be given by id.
+        '''
+        today = datetime.today()
+        updates = list(updates)
+        task_ids = self._task_id_list([row[0] for row in updates])
+        rows = []
+        for row,task_id in zip(updates,task_ids):
+            stat = row[1]
+            if stat not in STAT_DATES:
+                raise ValueError("Invalid stat {}".format(stat))
+            date = row[2] if len(row) > 2 and row[2] is not None else today
+            rows.append((stat, to_epoch(date), task_id))
+        with self.transaction():
+            c = self.cursor()
+            for stat,group in groupby(rows, key=lambda r: r[0]):
+                c.executemany('UPDATE tasks SET stat=?, {}=? WHERE task_id=?'.format(STAT_DATES[stat]), list(group))
             c.close()
-            if len(res) == 0:
-                dsk[task] = []
-            else:
-                dsk[task] = [self.get_task_from_task_id(t) for t in pickle.loads(res[0][0])]
-        return dsk
+            if self._task_graph is not None:
+                for stat,_,task_id in rows:
+                    self._task_graph.stats[task_id] = stat
 
-    def get_order_of_execution(self, tasks):
-        from dask.callbacks import Callback
-        from dask import get
+    def get_task_dsk(self):
+        dag = self.get_task_graph()
+        return {dag.labels[t]:[dag.labels[d] for d in dag.deps[t]] for t in dag.deps}
+
+    def get_task_graph(self):
+        '''
+        The whole dependency graph as a TaskDAG, with labels, stats and
+        lengths of every task.
 
+        The graph is loaded with a single query and then kept in memory,
+        writes made through this TaskGraph update it (including its
+        topological index) in place. It is reloaded when another connection
+        changes the file. Treat it as read-only.
+        '''
+        self._sync_caches()
+        if self._task_graph is None:
+            self._task_graph = self._load_task_graph()
+        return self._task_graph
+
+    def _load_task_graph(self):
+        c = self.cursor()
+        c.execute('SELECT t.task_id, t.name, t.stat, t.length, td.dep_id FROM tasks t \
+                    LEFT JOIN task_deps td ON td.task_id=t.task_id \
+                    ORDER BY t.task_id, td.rowid')
+        res = c.fetchall()
+        c.close()
+        dag = TaskDAG()
+        edges = []
+        for task_id, name, stat, length, dep_id in res:
+            if task_id not in dag:
+                dag.add_node(task_id)
+                dag.labels[task_id] = "{:03d}:{}".format(task_id,name)
+                dag.stats[task_id] = stat
+                dag.lengths[task_id] = length
+            if dep_id is not None:
+                edges.append((task_id, dep_id))
+        for task_id, dep_id in edges:
+            dag.add_edge(task_id, dep_id)
+        return dag
+
+    def _order_task_ids(self, dag, task_ids):
+        try:
+            return dag.order(task_ids)
+        except CycleError as e:
+            raise CycleError([dag.labels[t] for t in e.path])
+
+    def get_order_of_execution(self, tasks):
         if not isinstance(tasks,(tuple,list)):
             tasks = [tasks]
 
         tasks = [self.resolve_task(t) for t in tasks]
+        dag = self.get_task_graph()
+        order = self._order_task_ids(dag, [self.get_task_id_from_task(t) for t in tasks])
+        return [dag.labels[t] for t in order]
 
-        task_dsk = self.get_task_dsk()
+    def _sorted_labels(self, dag, task_ids):
+        return [dag.labels[t] for t in dag.topological_sort(task_ids)]
 
-        def _op(*args):
-            return args
-        dsk = {}
-        for key in task_dsk.keys():
-            if len(task_dsk[key]) == 0:
-                dsk[key] = (_op,)
-            else:
-                dsk[key] = (_op,task_dsk[key])
-                
-        order = []
-        class PrintKeys(Callback):
-            def __init__(self):
-                pass
-            def _start(self,dsk):
-                pass
-            def _pretask(self, key, dask, state):
-                pass
-            def _posttask(self,key,result,dsk,state,id):
-                order.append("{}".format(repr(key)[1:-1]))
-                assert order[-1] in dsk.keys(), "Formatting error occured"
-            def _finish(self,dsk,state,errored):
-                pass
-        with PrintKeys():
-            get(dsk,tasks)
-        return order
+    def get_ancestors_from_task(self,task):
+        '''
+        Every task that task (transitively) depends on, in order of execution.
+        '''
+        task = self.resolve_task(task)
+        dag = self.get_task_graph()
+        return self._sorted_labels(dag, dag.ancestors([self.get_task_id_from_task(task)],include_self=False))
+
+    def get_descendants_from_task(self,task):
+        '''
+        Every task that (transitively) depends on task, in order of execution.
+        '''
+        task = self.resolve_task(task)
+        dag = self.get_task_graph()
+        return self._sorted_labels(dag, dag.descendants([self.get_task_id_from_task(task)],include_self=False))
+
+    def is_task_reachable(self,task,other):
+        '''
+        True if other (transitively) depends on task.
+        '''
+        task = self.resolve_task(task)
+        other = self.resolve_task(other)
+        return self.get_task_graph().is_reachable(self.get_task_id_from_task(task),self.get_task_id_from_task(other))
+
+    def get_goals_blocked_by_task(self,task):
+        '''
+        Unfinished sprint goal tasks that cannot be finished before task.
+        '''
+        task = self.resolve_task(task)
+        task_id = self.get_task_id_from_task(task)
+        dag = self.get_task_graph()
+        blocked = dag.descendants([task_id])
+        c = self.cursor()
+        c.execute('SELECT DISTINCT task_id FROM sprint_tasks')
+        goals = [r[0] for r in c.fetchall()]
+        c.close()
+        return self._sorted_labels(dag, [g for g in goals if g in blocked and dag.stats[g] != 'finished'])
+
+
+    def _critical_path(self,dag,goals):
+        nodes = list(dag.ancestors(goals))
+        todo = self.get_stats(nodes) != 'finished'
+        left = np.clip(np.nan_to_num(self.get_task_lengths(nodes)) - self.get_hours_for_tasks(nodes), 0., None)
+        remaining = dict((t,l) for t,l,d in zip(nodes,left.tolist(),todo) if d)
+        try:
+            cp = dag.critical_path(goals, remaining)
+        except CycleError as e:
+            raise CycleError([dag.labels[t] for t in e.path])
+        return cp._replace(task_ids=[dag.labels[t] for t in cp.task_ids],
+                chain=[dag.labels[t] for t in cp.chain])
+
+    def get_critical_path(self,tasks):
+        '''
+        Critical path towards the goal tasks, each task weighted by the hours
+        it still needs (length minus logged hours, nothing once finished).
+        Returns a CriticalPath (see scrum_tool.graph) holding task labels,
+        with earliest/latest start and slack in hours from now.
+        '''
+        if not isinstance(tasks,(tuple,list)):
+            tasks = [tasks]
+        tasks = [self.resolve_task(t) for t in tasks]
+        return self._critical_path(self.get_task_graph(), [self.get_task_id_from_task(t) for t in tasks])
+
+    def get_critical_path_for_sprint(self,sprint):
+        dag = self.get_task_graph()
+        return self._critical_path(dag, self._get_sprint_goal_ids(sprint,dag))
 
 
     ###
@@ -796,39 +1510,30 @@ class TaskGraph(object):
         
     @property
     def workers(self):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT worker_id,name from workers')
-        workers = c.fetchall()
-        c.close()
-        if len(workers) == 0:
-            return []
-        else:
-            return ["{:03d}:{}".format(id,name) for id,name in workers]
+        return self.get_identity_map('workers').all_labels()
+
+    def get_worker_records(self,workers=None):
+        '''
+        Worker records of the given workers (all when None) in one query.
+        '''
+        return self._records(Worker,'SELECT worker_id, name FROM workers',
+                'worker_id',workers,lambda w: self.get_worker_id_from_worker(self.resolve_worker(w)))
 
     def get_worker_id_from_worker(self,worker):
-        return int(worker.split(":")[0].strip())
+        if isinstance(worker,Worker):
+            return worker.id
+        return int(worker.split(":",1)[0].strip())
 
     def get_worker_name_from_worker(self,worker):
-        return worker.split(":")[1].strip()
+        if isinstance(worker,Worker):
+            return worker.name
+        return worker.split(":",1)[1].strip()
 
     def get_worker_from_worker_id(self,worker_id):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT worker_id,name from workers where worker_id=?',(worker_id,))
-        res = c.fetchall()
-        c.close()
-        if len(res) == 0:
-            return None
-        else:
-            return "{:03d}:{}".format(res[0][0],res[0][1])
+        return self._identity_map('workers').get_label(worker_id)
 
     def get_worker_from_worker_name(self,name):
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT worker_id,name from workers where name=?',(name,))
-        res = c.fetchall()
-        c.close()
+        res = self._identity_map('workers').find(name)
         if len(res) == 0:
             return None
         elif len(res) == 1:
@@ -837,14 +1542,24 @@ class TaskGraph(object):
             raise ValueError("Invalid worker {}".format(res))
 
     def resolve_worker(self,worker):
-        if worker in self.workers:
+        res = self._find_worker(worker)
+        if res is None and self._sync_caches():
+            #written by another connection since the maps were loaded
+            res = self._find_worker(worker)
+        if res is None:
+            raise ValueError("Invalid worker {}".format(worker))
+        return res
+
+    def _find_worker(self,worker):
+        if isinstance(worker,str) and worker in self._identity_map('workers'):
             return worker
-        if isinstance(worker,int):
+        res = None
+        if isinstance(worker,Worker):
+            res = self.get_worker_from_worker_id(worker.id)
+        elif isinstance(worker,int):
             res = self.get_worker_from_worker_id(worker)
         elif isinstance(worker,str):
             res = self.get_worker_from_worker_name(worker)
-        if res is None:
-            raise ValueError("Invalid worker {}".format(worker))
         return res
 
 
@@ -858,8 +1573,7 @@ class TaskGraph(object):
 
     @property
     def next_worker_id(self):
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT max(worker_id) from workers')
         worker_id = c.fetchall()
         c.close()
@@ -869,57 +1583,59 @@ class TaskGraph(object):
             return worker_id[0][0] + 1
 
     def add_worker(self,name):
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('insert into workers(name) values(?)',(name,))
-        db.commit()
+        worker_id = c.lastrowid
+        self.commit()
         c.close()
+        self._identity_add('workers',worker_id,name)
 
 
     def rm_worker(self,worker):
         worker = self.resolve_worker(worker)
         worker_id = self.get_worker_id_from_worker(worker)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('DELETE FROM workers WHERE worker_id=?',(worker_id,))
-        db.commit()
+        c.execute('DELETE FROM task_workers WHERE worker_id=?',(worker_id,))
+        self.commit()
         c.close()
+        self._identity_remove('workers',worker_id)
 
     def get_tasks_from_worker(self,worker):
         worker = self.resolve_worker(worker)
         worker_id = self.get_worker_id_from_worker(worker)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT task_id,workers from tasks')
+        c = self.cursor()
+        c.execute('SELECT t.task_id, t.name FROM task_workers tw \
+                    JOIN tasks t ON t.task_id=tw.task_id \
+                    WHERE tw.worker_id=? ORDER BY t.task_id',(worker_id,))
         res = c.fetchall()
-        c.close()  
-        if len(res) == 0:
-            return []
-        has_worker = []
-        for r in res:
-            if worker_id in pickle.loads(r[1]):
-                has_worker.append(r[0])
-        return [self.get_task_from_task_id(h) for h in has_worker]
+        c.close()
+        return ["{:03d}:{}".format(id,name) for id,name in res]
 
     def get_sprints_from_worker(self,worker):
         worker = self.resolve_worker(worker)
         worker_id = self.get_worker_id_from_worker(worker)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT sprint_id from sprints')
+        c = self.cursor()
+        c.execute('SELECT sprint_id from sprints ORDER BY sprint_id')
         res = c.fetchall()
+        c.execute('SELECT task_id from task_workers WHERE worker_id=?',(worker_id,))
+        worker_tasks = set(r[0] for r in c.fetchall())
         c.close()  
         if len(res) == 0:
             return []
+        dag = self.get_task_graph()
         has_worker = []
         for r in res:
-            if worker_id in self.get_workers_from_sprint(r[0]):
+            if not worker_tasks.isdisjoint(self._get_sprint_task_ids(r[0],dag)):
                 has_worker.append(r[0])
         return [self.get_sprint_from_sprint_id(h) for h in has_worker]
 
     def get_expected_hours_for_worker(self,worker):
-        sprints = self.get_sprints_from_worker(worker)
-        return np.sum([self.get_expected_hours_for_sprint(s) for s in sprints])
+        dag = self.get_task_graph()
+        task_ids = []
+        for s in self.get_sprints_from_worker(worker):
+            task_ids.extend(self._get_sprint_task_ids(s,dag))
+        return np.sum(self.get_task_lengths(task_ids))
 
     ###
     # Hours
@@ -934,44 +1650,100 @@ class TaskGraph(object):
         task_id = self.get_task_id_from_task(task)
         worker_id = self.get_worker_id_from_worker(worker)
         
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('INSERT INTO hours(task_id, date, worker_id, hours) VALUES(?,?,?,?)',(task_id, date.date(), worker_id, hours))
-        db.commit()
-        c.close()
-        stat = self.get_task_stat(task)
-        if stat != 'inprogress':
-            self.update_task_stat(task,'inprogress',date)
+        with self.transaction():
+            c = self.cursor()
+            c.execute('INSERT INTO hours(task_id, date, worker_id, hours) VALUES(?,?,?,?)',(task_id, to_day(date), worker_id, hours))
+            c.close()
+            stat = self.get_task_stat(task)
+            if stat != 'inprogress':
+                self.update_task_stat(task,'inprogress',date)
+
+    def add_hours_many(self, entries):
+        '''
+        add_hours for many rows (task, date, worker, hours) in one
+        transaction. Returns the number of entries added.
+        '''
+        rows = []
+        first = {}
+        #timesheets repeat the same few tasks and workers
+        task_ids = {}
+        worker_ids = {}
+        for task,date,worker,hours in entries:
+            task_id = task_ids.get(task)
+            if task_id is None:
+                task_id = task_ids[task] = self.get_task_id_from_task(self.resolve_task(task))
+            worker_id = worker_ids.get(worker)
+            if worker_id is None:
+                worker_id = worker_ids[worker] = self.get_worker_id_from_worker(self.resolve_worker(worker))
+            rows.append((task_id, to_day(date), worker_id, hours))
+            if task_id not in first:
+                first[task_id] = date
+        with self.transaction():
+            c = self.cursor()
+            c.executemany('INSERT INTO hours(task_id, date, worker_id, hours) VALUES(?,?,?,?)', rows)
+            c.close()
+            task_ids = list(first)
+            stats = self.get_stats(task_ids)
+            self.update_stats_many([(t,'inprogress',first[t]) for t,s in zip(task_ids,stats) if s != 'inprogress'])
+        return len(rows)
 
     def rm_hours(self, entry_id):#task, date, worker):
+        if isinstance(entry_id,HourEntry):
+            entry_id = entry_id.id
 #        task = self.resolve_task(task)
 #        worker = self.resolve_worker(worker)
 #
 #        task_id = self.get_task_id_from_task(task)
 #        worker_id = self.get_worker_id_from_worker(worker)
 
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('DELETE FROM hours WHERE entry_id=?',(entry_id,))#task_id=? AND date=? AND worker_id=?',(task_id, date.date(), worker_id))
-        db.commit()
+        self.commit()
         c.close()
 
+    def get_hour_records(self,task=None,worker=None):
+        '''
+        HourEntry records, optionally of one task and/or worker, by entry id.
+        '''
+        cond = []
+        args = []
+        if task is not None:
+            cond.append('task_id=?')
+            args.append(self.get_task_id_from_task(self.resolve_task(task)))
+        if worker is not None:
+            cond.append('worker_id=?')
+            args.append(self.get_worker_id_from_worker(self.resolve_worker(worker)))
+        query = 'SELECT entry_id, task_id, date, worker_id, hours FROM hours'
+        if len(cond) > 0:
+            query += ' WHERE ' + ' AND '.join(cond)
+        c = self.cursor()
+        c.execute(query + ' ORDER BY entry_id', args)
+        res = [HourEntry.from_row(r) for r in c.fetchall()]
+        c.close()
+        return res
+
     def get_hour_entries_for_task(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
 #        c.execute('SELECT date,worker_id,hours FROM hours WHERE task_id=?',(task_id, ))
-        c.execute('SELECT * FROM hours WHERE task_id=?',(task_id, ))
+        c.execute('SELECT {} FROM hours WHERE task_id=? ORDER BY entry_id'.format(HOUR_COLUMNS),(task_id, ))
         res = c.fetchall()
         c.close()
         return res
 
+    def get_hours_for_tasks(self,tasks):
+        '''
+        Total logged hours of each task as a float array aligned to them.
+        '''
+        ids = self._task_id_list(tasks)
+        rows = dict(self._select_by_ids('SELECT task_id, sum(hours) FROM hours_daily','task_id',ids,' GROUP BY task_id'))
+        return np.array([rows.get(t,0.) for t in ids],dtype=float)
+
     def get_hours_for_task(self,task):
         task = self.resolve_task(task)
         task_id = self.get_task_id_from_task(task)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT hours FROM hours WHERE task_id=?',(task_id, ))
         res = c.fetchall()
         c.close()
@@ -980,8 +1752,7 @@ class TaskGraph(object):
     def get_hours_for_worker(self,worker):
         worker = self.resolve_worker(worker)
         worker_id = self.get_worker_id_from_worker(worker)
-        db = sql.connect(self.filename)
-        c = db.cursor()
+        c = self.cursor()
         c.execute('SELECT hours FROM hours WHERE worker_id=?',(worker_id, ))
         res = c.fetchall()
         c.close()
@@ -991,9 +1762,8 @@ class TaskGraph(object):
     def get_entries_for_worker(self,worker):
         worker = self.resolve_worker(worker)
         worker_id = self.get_worker_id_from_worker(worker)
-        db = sql.connect(self.filename)
-        c = db.cursor()
-        c.execute('SELECT date,hours,task_id FROM hours WHERE worker_id=?',(worker_id, ))
+        c = self.cursor()
+        c.execute('SELECT {},hours,task_id FROM hours WHERE worker_id=? ORDER BY entry_id'.format(day_text('date')),(worker_id, ))
         res = c.fetchall()
         c.close()
         return [[r[0], r[1], self.get_task_from_task_id(r[2])] for r in res]
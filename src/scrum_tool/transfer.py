@@ -0,0 +1,670 @@
+'''
+Streaming CSV/JSONL import and export of the workers, tasks, sprints and
+hours of a TaskGraph.
+
+    python -m scrum_tool.transfer export project.db out_dir [--format csv]
+    python -m scrum_tool.transfer import project.db in_dir
+    python -m scrum_tool.transfer export project.db hours.csv --table hours
+
+One record per row, columns as in COLUMNS. Tasks and workers are referred to
+by "003:name" label, which stays unambiguous when names repeat (plain names
+and ids are accepted on import too). List columns (a task's workers and
+deps, a sprint's goal tasks) are JSON arrays, in CSV either JSON text or
+';'-separated references. Days are YYYY-MM-DD, task
+stat dates YYYY-MM-DD HH:MM:SS.
+
+Exports read with fetchmany inside one read transaction and leave out
+references to rows deleted without them. Imports validate every row,
+report the bad ones by line and load the rest in transactions of
+batch_size rows. Names and ids are resolved through lookup
+dictionaries loaded once, so memory stays flat in the number of hour
+entries. Imported tasks, workers and sprints keep their ids when free,
+hour entries always get new ids. Importing hours does not change task
+stats, unlike add_hours.
+'''
+import argparse
+import csv
+import json
+import math
+import os
+import sqlite3 as sql
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from scrum_tool.dates import to_datetime, to_day, to_epoch, day_text
+from scrum_tool.graph import CycleError
+from scrum_tool.identity import make_label
+
+BATCH_SIZE = 50000
+#page cache (KiB) while importing, hour inserts are bound by index updates
+IMPORT_CACHE_KB = 65536
+#errors kept in an ImportReport, later ones are only counted
+MAX_ERRORS = 1000
+TABLES = ('workers', 'tasks', 'sprints', 'hours')
+COLUMNS = {
+        'workers': ('id', 'name'),
+        'tasks': ('id', 'name', 'stat', 'length', 'backlog_date', 'new_date', 'inprogress_date',
+            'finished_date', 'description', 'workers', 'deps'),
+        'sprints': ('id', 'name', 'start_date', 'end_date', 'tasks'),
+        'hours': ('id', 'task', 'date', 'worker', 'hours'),
+        }
+STATS = ('backlog', 'new', 'inprogress', 'finished')
+
+#rows read, imported and rejected (read == imported + failed), task deps
+#rejected after their task was imported, (line, message) of both
+ImportReport = namedtuple('ImportReport', ['table', 'read', 'imported', 'failed', 'failed_deps', 'errors'])
+
+###
+# Files
+
+def _format(target, fmt):
+    if fmt is not None:
+        if fmt not in ('csv', 'jsonl'):
+            raise ValueError("Invalid format {}".format(fmt))
+        return fmt
+    if isinstance(target, str):
+        ext = os.path.splitext(target)[1].lower()
+        if ext == '.csv':
+            return 'csv'
+        if ext in ('.jsonl', '.json', '.ndjson'):
+            return 'jsonl'
+    raise ValueError("Cannot tell the format of {}, give csv or jsonl".format(target))
+
+@contextmanager
+def _open(target, mode, fmt):
+    '''
+    (file, format) of a path or an already open text file.
+    '''
+    fmt = _format(target, fmt)
+    if not isinstance(target, str):
+        yield target, fmt
+        return
+    with open(target, mode, newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+        yield f, fmt
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return json.dumps(value)
+    return value
+
+def _writer(f, fmt, columns):
+    '''
+    Function writing a batch of row tuples.
+    '''
+    if fmt == 'csv':
+        w = csv.writer(f)
+        w.writerow(columns)
+        return lambda rows: w.writerows([[_cell(v) for v in row] for row in rows])
+    return lambda rows: f.write(''.join([json.dumps(dict(zip(columns, row))) + '\n' for row in rows]))
+
+def _records(f, fmt):
+    '''
+    (line, dict) of every record, (line, ValueError) for unreadable ones.
+    '''
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(f, 1):
+        if len(text.strip()) == 0:
+            continue
+        try:
+            row = json.loads(text)
+            if not isinstance(row, dict):
+                raise ValueError("not a JSON object")
+            yield line, row
+        except ValueError as e:
+            yield line, ValueError("invalid JSON: {}".format(e))
+
+###
+# Export
+
+def _stream(c, query, args=(), batch_size=BATCH_SIZE):
+    c.execute(query, args)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if len(rows) == 0:
+            return
+        for row in rows:
+            yield row
+
+class _Lists(object):
+    '''
+    Lists of values per key from (key, value) rows sorted by key, looked up
+    with ascending keys.
+    '''
+    def __init__(self, rows):
+        self._groups = groupby(rows, key=itemgetter(0))
+        self._next = None
+        self._advance()
+
+    def _advance(self):
+        try:
+            key, group = next(self._groups)
+            self._next = (key, [r[1] for r in group])
+        except StopIteration:
+            self._next = None
+
+    def get(self, key):
+        while self._next is not None and self._next[0] < key:
+            self._advance()
+        if self._next is not None and self._next[0] == key:
+            return self._next[1]
+        return []
+
+def _labels(tg, table):
+    '''
+    id -> "003:name" label of every row of table.
+    '''
+    return dict((id, make_label(id, name)) for id, name in tg.get_identity_map(table).names.items())
+
+def _refs(labels, ids):
+    '''
+    Labels of ids, leaving out rows deleted without their references.
+    '''
+    return [labels[i] for i in ids if i in labels]
+
+def _export_rows(tg, table, batch_size):
+    c = tg.cursor()
+    try:
+        if table == 'workers':
+            for row in _stream(c, 'SELECT worker_id, name FROM workers ORDER BY worker_id', (), batch_size):
+                yield row
+        elif table == 'tasks':
+            tasks = _labels(tg, 'tasks')
+            workers = _labels(tg, 'workers')
+            c_workers = tg.cursor()
+            c_deps = tg.cursor()
+            task_workers = _Lists(_stream(c_workers,
+                'SELECT task_id, worker_id FROM task_workers ORDER BY task_id, rowid', (), batch_size))
+            task_deps = _Lists(_stream(c_deps,
+                'SELECT task_id, dep_id FROM task_deps ORDER BY task_id, rowid', (), batch_size))
+            query = 'SELECT task_id, name, stat, length, {}, {}, {}, {}, description FROM tasks ORDER BY task_id'.format(
+                    *["datetime({}, 'unixepoch')".format(col) for col in
+                        ('backlog_date', 'new_date', 'inprogress_date', 'finished_date')])
+            for row in _stream(c, query, (), batch_size):
+                yield row + (_refs(workers, task_workers.get(row[0])), _refs(tasks, task_deps.get(row[0])))
+            c_workers.close()
+            c_deps.close()
+        elif table == 'sprints':
+            tasks = _labels(tg, 'tasks')
+            c_goals = tg.cursor()
+            goals = _Lists(_stream(c_goals,
+                'SELECT sprint_id, task_id FROM sprint_tasks ORDER BY sprint_id, rowid', (), batch_size))
+            query = 'SELECT sprint_id, name, {}, {} FROM sprints ORDER BY sprint_id'.format(
+                    day_text('start_date'), day_text('end_date'))
+            for row in _stream(c, query, (), batch_size):
+                yield row + (_refs(tasks, goals.get(row[0])),)
+            c_goals.close()
+        elif table == 'hours':
+            tasks = _labels(tg, 'tasks')
+            workers = _labels(tg, 'workers')
+            query = 'SELECT entry_id, task_id, {}, worker_id, hours FROM hours ORDER BY entry_id'.format(day_text('date'))
+            for entry_id, task_id, date, worker_id, hours in _stream(c, query, (), batch_size):
+                yield entry_id, tasks.get(task_id), date, workers.get(worker_id), hours
+        else:
+            raise ValueError("Invalid table {}".format(table))
+    finally:
+        c.close()
+
+def export_table(tg, table, target, fmt=None, batch_size=BATCH_SIZE):
+    '''
+    Write every row of table to target (path or text file), returns the
+    number of rows written.
+    '''
+    if table not in COLUMNS:
+        raise ValueError("Invalid table {}".format(table))
+    rows = 0
+    with _open(target, 'w', fmt) as (f, fmt):
+        write = _writer(f, fmt, COLUMNS[table])
+        with tg.transaction():
+            batch = []
+            for row in _export_rows(tg, table, batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    write(batch)
+                    rows += len(batch)
+                    batch = []
+            write(batch)
+            rows += len(batch)
+    return rows
+
+def export_project(tg, directory, fmt='jsonl', batch_size=BATCH_SIZE):
+    '''
+    Export every table to directory/<table>.<fmt>, returns {table: rows}.
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return dict((table, export_table(tg, table, os.path.join(directory, '{}.{}'.format(table, fmt)), fmt, batch_size))
+            for table in TABLES)
+
+###
+# Import
+
+def _value(row, column):
+    value = row.get(column)
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) == 0:
+            return None
+    return value
+
+def _required(row, column):
+    value = _value(row, column)
+    if value is None:
+        raise ValueError("missing {}".format(column))
+    return value
+
+def _id(row):
+    value = _value(row, 'id')
+    if value is None:
+        return None
+    value = int(value)
+    if value < 1:
+        raise ValueError("invalid id {}".format(value))
+    return value
+
+def _number(row, column, default=None):
+    value = _value(row, column)
+    if value is None:
+        if default is None:
+            raise ValueError("missing {}".format(column))
+        return default
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("invalid {} {}".format(column, value))
+    return value
+
+def _list(row, column):
+    value = _value(row, column)
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        if value.startswith('['):
+            value = json.loads(value)
+            if isinstance(value, list):
+                return value
+        else:
+            return [v.strip() for v in value.split(';') if len(v.strip()) > 0]
+    raise ValueError("{} must be a list".format(column))
+
+def _resolve(identity, ref, kind):
+    '''
+    Id of a name, "003:name" label or id in an IdentityMap.
+    '''
+    if isinstance(ref, int):
+        if ref in identity.names:
+            return ref
+    else:
+        ref = str(ref).strip()
+        id = identity.labels.get(ref)
+        if id is not None:
+            return id
+        ids = identity.ids.get(ref)
+        if ids is not None:
+            if len(ids) > 1:
+                raise ValueError("ambiguous {} {}".format(kind, ref))
+            return ids[0]
+        if ref.isdigit() and int(ref) in identity.names:
+            return int(ref)
+    raise ValueError("unknown {} {}".format(kind, ref))
+
+class _Dates(object):
+    '''
+    Parsed dates by text, imports repeat the same few days.
+    '''
+    def __init__(self, convert):
+        self.convert = convert
+        self.cache = {}
+
+    def __call__(self, text):
+        if text is None:
+            return None
+        value = self.cache.get(text)
+        if value is None:
+            try:
+                value = self.convert(to_datetime(str(text)))
+            except ValueError:
+                raise ValueError("invalid date {}".format(text))
+            if len(self.cache) > 100000:
+                self.cache.clear()
+            self.cache[text] = value
+        return value
+
+class _Import(object):
+    '''
+    convert() checks a row against the ids and names already in the file
+    plus the rows of the batch being built (pending), written() publishes
+    a batch's rows to the identity map once they are committed.
+    '''
+    def __init__(self, tg):
+        self.tg = tg
+        self.pending = {}
+
+    def written(self, rows):
+        pass
+
+    def clear_pending(self):
+        self.pending.clear()
+
+    def finish(self, report):
+        pass
+
+class _WorkerImport(_Import):
+    def __init__(self, tg):
+        _Import.__init__(self, tg)
+        self.workers = tg.get_identity_map('workers')
+        self.next_id = max(self.workers.names or [0]) + 1
+
+    def convert(self, line, row):
+        name = str(_required(row, 'name'))
+        worker_id = _id(row)
+        if worker_id is None:
+            worker_id = self.next_id
+        elif worker_id in self.workers.names or worker_id in self.pending:
+            raise ValueError("worker id {} already exists".format(worker_id))
+        self.next_id = max(self.next_id, worker_id + 1)
+        self.pending[worker_id] = name
+        return worker_id, name
+
+    def flush(self, c, rows):
+        c.executemany('INSERT INTO workers(worker_id, name) VALUES(?,?)', rows)
+
+    def written(self, rows):
+        for worker_id, name in rows:
+            self.workers.add(worker_id, name)
+
+class _TaskImport(_Import):
+    def __init__(self, tg):
+        _Import.__init__(self, tg)
+        #names of the pending rows
+        self.pending_names = set()
+        self.tasks = tg.get_identity_map('tasks')
+        self.workers = tg.get_identity_map('workers')
+        self.next_id = max(self.tasks.names or [0]) + 1
+        self.instant = _Dates(to_epoch)
+        self.now = to_epoch(datetime.today())
+        c = tg.cursor()
+        c.execute('CREATE TEMP TABLE IF NOT EXISTS import_deps(line INTEGER, task_id INTEGER, dep TEXT)')
+        c.execute('DELETE FROM import_deps')
+        tg.commit()
+        c.close()
+
+    def convert(self, line, row):
+        name = str(_required(row, 'name'))
+        if not self.tg.allow_same_name and (name in self.tasks.ids or name in self.pending_names):
+            raise ValueError("task {} already exists".format(name))
+        task_id = _id(row)
+        if task_id is None:
+            task_id = self.next_id
+        elif task_id in self.tasks.names or task_id in self.pending:
+            raise ValueError("task id {} already exists".format(task_id))
+        length = _number(row, 'length')
+        if length < 0.:
+            raise ValueError("invalid length {}".format(length))
+        stat = _value(row, 'stat') or 'backlog'
+        if stat not in STATS:
+            raise ValueError("invalid stat {}".format(stat))
+        dates = [self.instant(_value(row, column)) for column in
+                ('backlog_date', 'new_date', 'inprogress_date', 'finished_date')]
+        if dates[0] is None:
+            dates[0] = self.now
+        description = _value(row, 'description') or ''
+        workers = [_resolve(self.workers, w, 'worker') for w in _list(row, 'workers')]
+        deps = [json.dumps(d) for d in _list(row, 'deps')]
+        self.next_id = max(self.next_id, task_id + 1)
+        self.pending[task_id] = name
+        self.pending_names.add(name)
+        return (task_id, name, stat, length) + tuple(dates) + (str(description),), workers, deps, line
+
+    def flush(self, c, rows):
+        c.executemany('INSERT INTO tasks(task_id, name, stat, length, backlog_date, new_date, \
+                inprogress_date, finished_date, description) VALUES(?,?,?,?,?,?,?,?,?)', [r[0] for r in rows])
+        c.executemany('INSERT OR IGNORE INTO task_workers(task_id, worker_id) VALUES(?,?)',
+                [(r[0][0], w) for r in rows for w in r[1]])
+        c.executemany('INSERT INTO import_deps(line, task_id, dep) VALUES(?,?,?)',
+                [(r[3], r[0][0], d) for r in rows for d in r[2]])
+
+    def written(self, rows):
+        for r in rows:
+            self.tasks.add(r[0][0], r[0][1])
+
+    def clear_pending(self):
+        _Import.clear_pending(self)
+        self.pending_names.clear()
+
+    def finish(self, report):
+        '''
+        Dependencies once every task exists. Deps that are unknown or would
+        close a cycle are rejected as failed_deps, their task stays imported.
+        '''
+        tg = self.tg
+        tg.invalidate_caches()
+        with tg.transaction():
+            dag = tg.get_task_graph()
+            c = tg.cursor()
+            w = tg.cursor()
+            batch = []
+            for line, task_id, dep in _stream(c, 'SELECT line, task_id, dep FROM import_deps ORDER BY rowid'):
+                try:
+                    dep_id = _resolve(self.tasks, json.loads(dep), 'task')
+                    dag.insert_edge(task_id, dep_id)
+                except CycleError as e:
+                    report.dep_error(line, "{}".format(CycleError([dag.labels[t] for t in e.path])))
+                    continue
+                except ValueError as e:
+                    report.dep_error(line, "{}".format(e))
+                    continue
+                batch.append((task_id, dep_id))
+                if len(batch) >= BATCH_SIZE:
+                    w.executemany('INSERT OR IGNORE INTO task_deps(task_id, dep_id) VALUES(?,?)', batch)
+                    batch = []
+            w.executemany('INSERT OR IGNORE INTO task_deps(task_id, dep_id) VALUES(?,?)', batch)
+            w.execute('DELETE FROM import_deps')
+            c.close()
+            w.close()
+
+class _SprintImport(_Import):
+    def __init__(self, tg):
+        _Import.__init__(self, tg)
+        self.sprints = tg.get_identity_map('sprints')
+        self.tasks = tg.get_identity_map('tasks')
+        self.next_id = max(self.sprints.names or [0]) + 1
+        self.day = _Dates(to_day)
+
+    def convert(self, line, row):
+        name = str(_required(row, 'name'))
+        sprint_id = _id(row)
+        if sprint_id is None:
+            sprint_id = self.next_id
+        elif sprint_id in self.sprints.names or sprint_id in self.pending:
+            raise ValueError("sprint id {} already exists".format(sprint_id))
+        start = self.day(_required(row, 'start_date'))
+        end = self.day(_required(row, 'end_date'))
+        if end < start:
+            raise ValueError("sprint ends before it starts")
+        goals = [_resolve(self.tasks, t, 'task') for t in _list(row, 'tasks')]
+        self.next_id = max(self.next_id, sprint_id + 1)
+        self.pending[sprint_id] = name
+        return (sprint_id, name, start, end), goals
+
+    def flush(self, c, rows):
+        c.executemany('INSERT INTO sprints(sprint_id, name, start_date, end_date) VALUES(?,?,?,?)',
+                [r[0] for r in rows])
+        c.executemany('INSERT OR IGNORE INTO sprint_tasks(sprint_id, task_id) VALUES(?,?)',
+                [(r[0][0], t) for r in rows for t in r[1]])
+
+    def written(self, rows):
+        for r in rows:
+            self.sprints.add(r[0][0], r[0][1])
+
+class _HourImport(_Import):
+    def __init__(self, tg):
+        _Import.__init__(self, tg)
+        self.tasks = tg.get_identity_map('tasks')
+        self.workers = tg.get_identity_map('workers')
+        self.day = _Dates(to_day)
+        #hour files repeat the same few references
+        self.task_ids = {}
+        self.worker_ids = {}
+
+    def _lookup(self, cache, identity, ref, kind):
+        key = (type(ref), ref)
+        id = cache.get(key)
+        if id is None:
+            id = _resolve(identity, ref, kind)
+            if len(cache) > 100000:
+                cache.clear()
+            cache[key] = id
+        return id
+
+    def convert(self, line, row):
+        task_id = self._lookup(self.task_ids, self.tasks, _required(row, 'task'), 'task')
+        worker_id = self._lookup(self.worker_ids, self.workers, _required(row, 'worker'), 'worker')
+        return task_id, self.day(_required(row, 'date')), worker_id, _number(row, 'hours')
+
+    def flush(self, c, rows):
+        #in (task, date) order the index and rollup updates hit neighbouring pages
+        rows.sort()
+        c.executemany('INSERT INTO hours(task_id, date, worker_id, hours) VALUES(?,?,?,?)', rows)
+
+IMPORTERS = {'workers': _WorkerImport, 'tasks': _TaskImport, 'sprints': _SprintImport, 'hours': _HourImport}
+
+class _Report(object):
+    def __init__(self, table):
+        self.table = table
+        self.read = 0
+        self.imported = 0
+        self.failed = 0
+        self.failed_deps = 0
+        self.errors = []
+
+    def _message(self, line, message):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def error(self, line, message):
+        self.failed += 1
+        self._message(line, message)
+
+    def dep_error(self, line, message):
+        self.failed_deps += 1
+        self._message(line, message)
+
+    def result(self):
+        return ImportReport(self.table, self.read, self.imported, self.failed, self.failed_deps, self.errors)
+
+@contextmanager
+def _cache_size(tg, kib):
+    c = tg.cursor()
+    previous = c.execute('PRAGMA cache_size').fetchone()[0]
+    c.execute('PRAGMA cache_size=-{:d}'.format(kib))
+    try:
+        yield
+    finally:
+        c.execute('PRAGMA cache_size={:d}'.format(previous))
+        c.close()
+
+def import_table(tg, table, source, fmt=None, batch_size=BATCH_SIZE):
+    '''
+    Load the rows of source (path or text file) into table, returns an
+    ImportReport with the (line, message) of rejected rows. Valid rows are
+    committed batch by batch; a batch the database refuses (a constraint)
+    is retried row by row and only the refused rows are reported.
+    '''
+    if table not in IMPORTERS:
+        raise ValueError("Invalid table {}".format(table))
+    report = _Report(table)
+    try:
+        importer = IMPORTERS[table](tg)
+        with _cache_size(tg, IMPORT_CACHE_KB), _open(source, 'r', fmt) as (f, fmt):
+            def _write(batch):
+                rows = [r for _, r in batch]
+                with tg.transaction():
+                    c = tg.cursor()
+                    importer.flush(c, rows)
+                    c.close()
+                importer.written(rows)
+                report.imported += len(rows)
+            def _flush(batch):
+                try:
+                    _write(batch)
+                except sql.IntegrityError:
+                    #find the rows the file refuses, one at a time
+                    for line, row in batch:
+                        try:
+                            _write([(line, row)])
+                        except sql.IntegrityError as e:
+                            report.error(line, "{}".format(e))
+                importer.clear_pending()
+            batch = []
+            for line, row in _records(f, fmt):
+                report.read += 1
+                try:
+                    if isinstance(row, ValueError):
+                        raise row
+                    batch.append((line, importer.convert(line, row)))
+                except (ValueError, TypeError) as e:
+                    report.error(line, "{}".format(e))
+                    continue
+                if len(batch) >= batch_size:
+                    _flush(batch)
+                    batch = []
+            _flush(batch)
+        importer.finish(report)
+    finally:
+        tg.invalidate_caches()
+    return report.result()
+
+def import_project(tg, directory, fmt='jsonl', batch_size=BATCH_SIZE):
+    '''
+    Import directory/<table>.<fmt> of every table present, in dependency
+    order, returns [ImportReport].
+    '''
+    reports = []
+    for table in TABLES:
+        filename = os.path.join(directory, '{}.{}'.format(table, fmt))
+        if os.path.exists(filename):
+            reports.append(import_table(tg, table, filename, fmt, batch_size))
+    return reports
+
+def main(argv=None):
+    from scrum_tool.task_graph import TaskGraph
+    parser = argparse.ArgumentParser(description='CSV/JSONL import and export of a scrum_tool project')
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('filename', help='project file')
+    parser.add_argument('path', help='file with --table, otherwise a directory of <table>.<format> files')
+    parser.add_argument('--table', choices=TABLES, default=None)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+    with TaskGraph(args.filename) as tg:
+        if args.command == 'export':
+            if args.table is not None:
+                counts = {args.table: export_table(tg, args.table, args.path, args.format, args.batch_size)}
+            else:
+                counts = export_project(tg, args.path, args.format or 'jsonl', args.batch_size)
+            for table, rows in counts.items():
+                print("{:10s} {} rows".format(table, rows))
+            return 0
+        if args.table is not None:
+            reports = [import_table(tg, args.table, args.path, args.format, args.batch_size)]
+        else:
+            reports = import_project(tg, args.path, args.format or 'jsonl', args.batch_size)
+    for r in reports:
+        print("{:10s} {} read, {} imported, {} rejected{}".format(r.table, r.read, r.imported, r.failed,
+            ", {} deps rejected".format(r.failed_deps) if r.failed_deps > 0 else ''))
+        for line, message in r.errors:
+            print("  line {}: {}".format(line, message))
+    return 1 if any(r.failed > 0 or r.failed_deps > 0 for r in reports) else 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
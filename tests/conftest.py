@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from scrum_tool.synthetic import DEFAULT_SPEC, generate
+
+#small enough to generate per test, large enough for every code path
+SMALL_SPEC = DEFAULT_SPEC._replace(workers=5, tasks=60, sprints=6, hours=2000, depth=8, goals=3)
+
+@pytest.fixture
+def project(tmp_path):
+    filename = str(tmp_path / 'project.db')
+    generate(filename, SMALL_SPEC)
+    return filename
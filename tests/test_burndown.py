@@ -0,0 +1,43 @@
+import numpy as np
+from datetime import datetime, timedelta
+from scrum_tool.task_graph import TaskGraph
+
+def _sprint(tg, start_days, end_days):
+    today = datetime.today()
+    tg.add_sprint('s', [tg.tasks[0]], today + timedelta(days=start_days), today + timedelta(days=end_days))
+    return tg.sprints[-1]
+
+def _project(tmp_path):
+    tg = TaskGraph(str(tmp_path / 'burndown.db'), new=True)
+    tg.add_worker('w')
+    tg.add_task('a', 4., 1)
+    return tg
+
+def test_burndown_without_burned_hours(tmp_path):
+    tg = _project(tmp_path)
+    sprint = _sprint(tg, -3, 3)
+    tg.add_hours('a', datetime.today(), 1, 0.)
+    snapshot = tg.sprint_snapshot(sprint)
+    assert np.isnan(snapshot.projected_completion)
+    assert snapshot.daily_gain is None
+    series = tg.burndown_series_for_sprint(sprint)
+    assert series.x_max == series.dates[-1] + timedelta(days=1)
+    assert tg.render_burndown_for_sprint(sprint, 'svg').startswith(b'<?xml')
+    tg.close()
+
+def test_burndown_of_future_sprint(tmp_path):
+    tg = _project(tmp_path)
+    sprint = _sprint(tg, 2, 8)
+    tg.add_hours('a', datetime.today() + timedelta(days=3), 1, 2.)
+    snapshot = tg.sprint_snapshot(sprint)
+    assert snapshot.actual_burn == 0.
+    assert np.isnan(snapshot.projected_completion)
+    assert tg.render_burndown_for_sprint(sprint, 'svg') is not None
+    tg.close()
+
+def test_burndown_of_every_sprint(project):
+    with TaskGraph(project) as tg:
+        for sprint in tg.sprints:
+            series = tg.burndown_series_for_sprint(sprint)
+            if series is not None:
+                assert series.x_max >= series.dates[-1]
@@ -0,0 +1,148 @@
+import random
+import numpy as np
+import pytest
+from scrum_tool.graph import TaskDAG, CycleError
+
+SEEDS = range(20)
+
+def _random_dag(seed, n=25, p=0.15):
+    '''
+    Edges only run from lower to higher ids so the graph is acyclic, node
+    ids are shuffled so the ids are not already a topological order.
+    '''
+    rng = random.Random(seed)
+    ids = list(range(1, n + 1))
+    rng.shuffle(ids)
+    edges = [(ids[j], ids[i]) for j in range(n) for i in range(j) if rng.random() < p]
+    return TaskDAG(ids, edges), rng
+
+def _closure(dag):
+    '''
+    {task: everything it transitively depends on}, by plain DFS.
+    '''
+    closure = {}
+    for t in dag.deps:
+        seen = set()
+        stack = list(dag.deps[t])
+        while stack:
+            d = stack.pop()
+            if d not in seen:
+                seen.add(d)
+                stack.extend(dag.deps[d])
+        closure[t] = seen
+    return closure
+
+def _check_order(dag):
+    order = dag.topological_sort(dag.deps)
+    pos = dict(zip(order, range(len(order))))
+    for t, deps in dag.deps.items():
+        for d in deps:
+            assert pos[d] < pos[t]
+
+def _check_reach(dag):
+    closure = _closure(dag)
+    for t in dag.deps:
+        assert dag.ancestors([t], include_self=False) == closure[t]
+        assert dag.descendants([t], include_self=False) == set(s for s in dag.deps if t in closure[s])
+        for s in dag.deps:
+            assert dag.is_reachable(t, s) == (t in closure[s])
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_insert_edge_rejects_cycles_unchanged(seed):
+    dag, rng = _random_dag(seed)
+    _check_order(dag)
+    closure = _closure(dag)
+    pairs = [(t, d) for t in dag.deps for d in closure[t]]
+    for t, d in rng.sample(pairs, min(10, len(pairs))):
+        rank = dict(dag.rank)
+        deps = dict((k, list(v)) for k, v in dag.deps.items())
+        with pytest.raises(CycleError) as e:
+            dag.insert_edge(d, t)
+        assert e.value.path[0] == e.value.path[-1] == d
+        assert dag.rank == rank
+        assert dag.deps == deps
+    _check_reach(dag)
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_set_deps_rejects_cycles_unchanged(seed):
+    dag, rng = _random_dag(seed)
+    _check_order(dag)
+    closure = _closure(dag)
+    roots = [t for t in dag.deps if closure[t]]
+    for t in rng.sample(roots, min(5, len(roots))):
+        descendants = [s for s in dag.deps if t in closure[s]]
+        if not descendants:
+            continue
+        #valid deps first so a partial update would have to be undone
+        others = [s for s in dag.deps if s != t and t not in closure[s]]
+        new = rng.sample(others, min(3, len(others))) + [rng.choice(descendants)]
+        rank = dict(dag.rank)
+        deps = dict((k, list(v)) for k, v in dag.deps.items())
+        with pytest.raises(CycleError):
+            dag.set_deps(t, new)
+        assert dag.rank == rank
+        assert dict((k, sorted(v)) for k, v in dag.deps.items()) == dict((k, sorted(v)) for k, v in deps.items())
+    _check_reach(dag)
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_edits_keep_order_and_reach(seed):
+    dag, rng = _random_dag(seed)
+    _check_reach(dag)
+    for step in range(30):
+        ids = list(dag.deps)
+        t, d = rng.sample(ids, 2)
+        action = rng.random()
+        if action < 0.5:
+            try:
+                dag.insert_edge(t, d)
+            except CycleError:
+                assert t in _closure(dag)[d]
+        elif action < 0.8 and dag.deps[t]:
+            dag.remove_edge(t, rng.choice(dag.deps[t]))
+        elif action < 0.9:
+            dag.remove_node(t)
+        else:
+            dag.add_node(100 + step)
+        _check_order(dag)
+    _check_reach(dag)
+
+@pytest.mark.parametrize('seed', SEEDS[:5])
+def test_reach_without_index(seed):
+    dag, rng = _random_dag(seed)
+    dag.max_reach_bytes = 0
+    _check_reach(dag)
+    assert dag.reach is None
+
+def _brute_cpm(dag, goals, durations):
+    nodes = set(goals)
+    for g in goals:
+        nodes |= _closure(dag)[g]
+    es = {}
+    def earliest(t):
+        if t not in es:
+            es[t] = max([earliest(d) + durations.get(d, 0.) for d in dag.deps[t]] + [0.])
+        return es[t]
+    length = max([earliest(g) + durations.get(g, 0.) for g in goals] + [0.])
+    lf = {}
+    def latest(t):
+        if t not in lf:
+            lf[t] = min([latest(s) - durations.get(s, 0.) for s in dag.dependents[t] if s in nodes] + [length])
+        return lf[t]
+    slack = dict((t, latest(t) - durations.get(t, 0.) - earliest(t)) for t in nodes)
+    return es, slack, length
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_critical_path_matches_brute_force(seed):
+    dag, rng = _random_dag(seed)
+    durations = dict((t, float(rng.choice([0, 1, 2, 4, 8]))) for t in dag.deps)
+    goals = rng.sample(list(dag.deps), 3)
+    es, slack, length = _brute_cpm(dag, goals, durations)
+    cp = dag.critical_path(goals, durations)
+    assert set(cp.task_ids) == set(es)
+    assert cp.length == pytest.approx(length)
+    pos = dict(zip(cp.task_ids, range(len(cp.task_ids))))
+    for t in es:
+        assert cp.earliest_start[pos[t]] == pytest.approx(es[t])
+        assert cp.slack[pos[t]] == pytest.approx(slack[t])
+    assert set(cp.chain) == set(t for t in es if slack[t] <= 1e-9)
+    assert np.all(np.diff([es[t] for t in cp.chain]) >= 0)
@@ -0,0 +1,28 @@
+import pytest
+from scrum_tool.task_graph import TaskGraph
+
+def test_resolvers_see_other_connections(tmp_path):
+    filename = str(tmp_path / 'shared.db')
+    a = TaskGraph(filename, new=True)
+    a.add_worker('w')
+    a.add_task('t1', 1., 1)
+    b = TaskGraph(filename)
+    assert a.resolve_task('001:t1') == '001:t1'
+    b.add_task('t2', 1., 1)
+    b.add_worker('v')
+    assert a.resolve_task('002:t2') == '002:t2'
+    assert a.resolve_task('t2') == '002:t2'
+    assert a.resolve_worker('v') == '002:v'
+    with pytest.raises(ValueError):
+        a.resolve_task('t3')
+    a.close()
+    b.close()
+
+def test_resolve_hit_issues_no_sql(project):
+    with TaskGraph(project) as tg:
+        labels = tg.tasks
+        names = [tg.get_task_name_from_task(t) for t in labels]
+        with tg.profile() as prof:
+            for label, name in zip(labels, names):
+                assert tg.resolve_task(name) == label
+        assert prof.statements == 0
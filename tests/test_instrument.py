@@ -0,0 +1,39 @@
+from scrum_tool.task_graph import TaskGraph
+
+#snapshot() reads its 7 tables inside one read transaction: BEGIN, one
+#SELECT per table and COMMIT, plus a cache check at most
+SNAPSHOT_STATEMENTS = 10
+SNAPSHOT_TABLES = ('tasks', 'task_deps', 'workers', 'task_workers', 'sprints', 'sprint_tasks', 'hours')
+
+def test_snapshot_statements_are_counted(project):
+    with TaskGraph(project) as tg:
+        c = tg.cursor()
+        rows = 0
+        for table in SNAPSHOT_TABLES:
+            c.execute('SELECT count(*) FROM {}'.format(table))
+            rows += c.fetchall()[0][0]
+        c.close()
+        with tg.profile() as prof:
+            tg.snapshot()
+    assert len(SNAPSHOT_TABLES) <= prof.statements <= SNAPSHOT_STATEMENTS, prof.report()
+    assert prof.methods['snapshot'].rows >= rows
+
+def test_transaction_statements_are_counted(project):
+    with TaskGraph(project) as tg:
+        with tg.profile() as prof:
+            with tg.transaction():
+                tg.add_worker('profiled')
+    #BEGIN, INSERT, COMMIT
+    assert prof.statements >= 3, prof.report()
+    assert prof.methods['add_worker'].statements >= 1
+
+def test_add_hours_commits_once(project):
+    with TaskGraph(project) as tg:
+        task = [t for t in tg.tasks if tg.get_task_stat(t) != 'inprogress'][0]
+        statements = []
+        tg.db.set_trace_callback(statements.append)
+        tg.add_hours(task, tg.to_datetime('2024-01-02'), tg.workers[0], 1.)
+        tg.db.set_trace_callback(None)
+        assert tg.get_task_stat(task) == 'inprogress'
+    #the hour entry and the stat change land together
+    assert sum(s.startswith('COMMIT') for s in statements) == 1, statements
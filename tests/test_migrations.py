@@ -0,0 +1,109 @@
+import pickle
+import sqlite3 as sql
+from scrum_tool import migrations
+from scrum_tool.dates import from_day, from_epoch
+from scrum_tool.task_graph import TaskGraph
+
+#the text forms the old TaskGraph wrote dates in
+FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+def _text(date, i, formats=FORMATS):
+    return None if date is None else date.strftime(formats[i % len(formats)])
+
+def _legacy_copy(src, dst):
+    '''
+    Write the project in src into dst the way the old TaskGraph kept it:
+    no schema_version, pickled workers/deps/tasks lists and text dates.
+    '''
+    new = sql.connect(src)
+    old = sql.connect(dst)
+    c = old.cursor()
+    migrations._base_tables(c, 0)
+
+    def _lists(query):
+        lists = {}
+        for key, value in new.execute(query):
+            lists.setdefault(key, []).append(value)
+        return lists
+    workers = _lists('SELECT task_id, worker_id FROM task_workers ORDER BY rowid')
+    deps = _lists('SELECT task_id, dep_id FROM task_deps ORDER BY rowid')
+    sprint_tasks = _lists('SELECT sprint_id, task_id FROM sprint_tasks ORDER BY rowid')
+
+    c.executemany('INSERT INTO workers(worker_id, name) VALUES(?,?)', new.execute('SELECT worker_id, name FROM workers'))
+    tasks = []
+    for i, row in enumerate(new.execute('SELECT task_id, name, stat, length, backlog_date, new_date, \
+            inprogress_date, finished_date, description, category FROM tasks')):
+        #stat changes have a time of day, keep it
+        dates = [_text(from_epoch(d), i, FORMATS[:2]) for d in row[4:8]]
+        tasks.append(row[:3] + (pickle.dumps(workers.get(row[0], [])), pickle.dumps(deps.get(row[0], [])),
+            row[3]) + tuple(dates) + row[8:])
+    c.executemany('INSERT INTO tasks(task_id, name, stat, workers, deps, length, backlog_date, new_date, \
+            inprogress_date, finished_date, description, category) VALUES(?,?,?,?,?,?,?,?,?,?,?,?)', tasks)
+    c.executemany('INSERT INTO sprints(sprint_id, name, tasks, start_date, end_date, scrum_master) VALUES(?,?,?,?,?,?)',
+            [(s, name, pickle.dumps(sprint_tasks.get(s, [])), _text(from_day(start), s), _text(from_day(end), s), master)
+                for s, name, start, end, master in new.execute('SELECT sprint_id, name, start_date, end_date, scrum_master FROM sprints')])
+    c.executemany('INSERT INTO hours(entry_id, task_id, date, worker_id, hours, params) VALUES(?,?,?,?,?,?)',
+            [(e, t, _text(from_day(d), e), w, h, p)
+                for e, t, d, w, h, p in new.execute('SELECT entry_id, task_id, date, worker_id, hours, params FROM hours')])
+    old.commit()
+    old.close()
+    new.close()
+
+def _records(records):
+    return [tuple(getattr(r, s) for s in r.__slots__) for r in records]
+
+def _metrics(tg):
+    tasks = tg.tasks
+    c = tg.cursor()
+    #v4 indexes and v6 rollup triggers
+    c.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') ORDER BY 1, 2")
+    schema = c.fetchall()
+    c.close()
+    metrics = {
+            'schema': schema,
+            'tasks': _records(tg.get_task_records()),
+            'workers': _records(tg.get_worker_records()),
+            'sprints': _records(tg.get_sprint_records()),
+            'hours': _records(tg.get_hour_records()),
+            'deps': [sorted(tg.get_deps_from_task(t)) for t in tasks],
+            'task_workers': [sorted(tg.get_workers_from_task(t)) for t in tasks],
+            'task_hours': tg.get_hours_for_tasks(tg.task_ids).tolist(),
+            }
+    for s in tg.sprints:
+        snapshot = tg.sprint_snapshot(s)._replace(today=None)
+        metrics[s] = (snapshot, tg.get_critical_path_for_sprint(s).length)
+    return metrics
+
+def test_legacy_file_migrates_with_same_metrics(project, tmp_path):
+    legacy = str(tmp_path / 'legacy.db')
+    _legacy_copy(project, legacy)
+    db = sql.connect(legacy)
+    assert migrations.get_schema_version(db) == 0
+    db.close()
+
+    with TaskGraph(project) as tg:
+        expected = _metrics(tg)
+    with TaskGraph(legacy) as tg:
+        assert tg.schema_version == migrations.MIGRATIONS[-1][0]
+        assert _metrics(tg) == expected
+        c = tg.cursor()
+        c.execute('SELECT count(*) FROM tasks WHERE workers IS NOT NULL OR deps IS NOT NULL')
+        assert c.fetchall()[0][0] == 0
+        c.execute('SELECT task_id, worker_id, date, hours, entries FROM hours_daily ORDER BY 1, 2, 3')
+        daily = c.fetchall()
+        c.close()
+    with TaskGraph(project) as tg:
+        c = tg.cursor()
+        c.execute('SELECT task_id, worker_id, date, hours, entries FROM hours_daily ORDER BY 1, 2, 3')
+        assert c.fetchall() == daily
+        c.close()
+
+def test_dry_run_leaves_legacy_file(project, tmp_path):
+    legacy = str(tmp_path / 'legacy.db')
+    _legacy_copy(project, legacy)
+    db = sql.connect(legacy)
+    report = migrations.migrate(db, dry_run=True, batch_size=7)
+    assert [r['version'] for r in report] == [v for v, _, _ in migrations.MIGRATIONS]
+    assert migrations.get_schema_version(db) == 0
+    assert db.execute('SELECT count(*) FROM tasks WHERE deps IS NOT NULL').fetchall()[0][0] > 0
+    db.close()
@@ -0,0 +1,18 @@
+from scrum_tool.task_graph import TaskGraph
+
+GETTERS = (('get_days_left_from_sprint', 'days_left'), ('get_days_burned_from_sprint', 'days_burned'),
+        ('get_num_days_in_sprint', 'num_days'), ('get_ideal_burn', 'ideal_burn'),
+        ('get_workers_from_sprint', 'workers'))
+
+def test_single_field_getters_match_snapshot(project):
+    with TaskGraph(project) as tg:
+        tg.get_identity_map('sprints')
+        for sprint in tg.sprints:
+            snapshot = tg.sprint_snapshot(sprint)
+            with tg.profile() as prof:
+                for getter, field in GETTERS:
+                    value = getattr(tg, getter)(sprint)
+                    expected = getattr(snapshot, field)
+                    assert value == (list(expected) if field == 'workers' else expected), getter
+            for getter, _ in GETTERS:
+                assert prof.methods[getter].statements == 1, getter
@@ -0,0 +1,54 @@
+import io
+import os
+from scrum_tool.task_graph import TaskGraph
+from scrum_tool import transfer
+
+def _export(tg, directory, fmt):
+    transfer.export_project(tg, str(directory), fmt)
+    return dict((name, open(os.path.join(str(directory), name)).read()) for name in os.listdir(str(directory)))
+
+def test_round_trip(project, tmp_path):
+    for fmt in ('jsonl', 'csv'):
+        with TaskGraph(project) as tg:
+            first = _export(tg, tmp_path / (fmt + '1'), fmt)
+        with TaskGraph(str(tmp_path / (fmt + '.db')), new=True) as tg:
+            for r in transfer.import_project(tg, str(tmp_path / (fmt + '1')), fmt):
+                assert r.failed == 0 and r.failed_deps == 0, r
+                assert r.read == r.imported
+            second = _export(tg, tmp_path / (fmt + '2'), fmt)
+        assert sorted(first) == sorted(second)
+        for name in ('workers', 'tasks', 'sprints'):
+            assert first['{}.{}'.format(name, fmt)] == second['{}.{}'.format(name, fmt)]
+
+def test_round_trip_with_repeated_names(tmp_path):
+    with TaskGraph(str(tmp_path / 'dup.db'), new=True, allow_same_name=True) as tg:
+        tg.add_worker('w')
+        tg.add_task('dup', 1., 1)
+        tg.add_task('dup', 2., 1)
+        tg.add_task('c', 1., 1, deps=['002:dup'])
+        transfer.export_project(tg, str(tmp_path / 'out'))
+    with TaskGraph(str(tmp_path / 'copy.db'), new=True, allow_same_name=True) as tg:
+        reports = transfer.import_project(tg, str(tmp_path / 'out'))
+        assert all(r.failed == 0 and r.failed_deps == 0 for r in reports), reports
+        assert tg.get_deps_from_task('003:c') == ['002:dup']
+
+def test_rejected_deps_are_counted_apart(tmp_path):
+    with TaskGraph(str(tmp_path / 'deps.db'), new=True) as tg:
+        tg.add_worker('w')
+        r = transfer.import_table(tg, 'tasks', io.StringIO(
+            'name,length,workers,deps\na,1,w,b\nb,1,w,a\nc,1,w,missing\n,1,w,\n'), 'csv')
+        assert (r.read, r.imported, r.failed, r.failed_deps) == (4, 3, 1, 2), r
+        assert r.read == r.imported + r.failed
+        assert [line for line, _ in r.errors] == [5, 3, 4]
+
+def test_refused_batch_is_retried_by_row(tmp_path):
+    with TaskGraph(str(tmp_path / 'refuse.db'), new=True) as tg:
+        c = tg.cursor()
+        c.execute("CREATE TRIGGER no_bad BEFORE INSERT ON workers WHEN NEW.name='bad' \
+                BEGIN SELECT RAISE(ABORT, 'bad worker'); END")
+        tg.commit()
+        c.close()
+        r = transfer.import_table(tg, 'workers', io.StringIO('id,name\n,ann\n,bad\n,bob\n'), 'csv')
+        assert (r.imported, r.failed, r.errors) == (2, 1, [(3, 'bad worker')])
+        assert tg.worker_names == ['ann', 'bob']
+        assert 'bad' not in tg.get_identity_map('workers').ids